@@ -0,0 +1,116 @@
+import asyncio, os
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.concurrency import run_in_threadpool
+from .metrics import instrument, timed_pool
+from .sharding import plan
+from .store import DB, DB_URL, READ_POOL_SIZE, SHARDS, WRITER_TIMEOUT, configure_sqlite, is_file_sqlite, shard_url
+
+# "sync": store.DB on Starlette's threadpool. "async": the same operations on an asyncio engine
+# (aiosqlite), so request concurrency is no longer bounded by the threadpool size.
+DB_MODE = os.getenv("DB_MODE", "sync")
+ASYNC_DB_URL = os.getenv("ASYNC_DB_URL") or DB_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+
+if DB_MODE == "async":
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+
+    class AsyncShard:
+        # Async engines for one store.Shard, laid out the same way
+        def __init__(self, url):
+            if is_file_sqlite(url):
+                self.engine = create_async_engine(url, poolclass=timed_pool(AsyncAdaptedQueuePool, "writer"), pool_size=1, max_overflow=0, pool_timeout=WRITER_TIMEOUT)
+                self.read_engine = create_async_engine(url, poolclass=timed_pool(AsyncAdaptedQueuePool, "reader"), pool_size=READ_POOL_SIZE, max_overflow=0)
+                configure_sqlite(self.engine.sync_engine)
+                configure_sqlite(self.read_engine.sync_engine, readonly=True)
+            else:
+                self.engine = self.read_engine = create_async_engine(url)
+            for e in {self.engine, self.read_engine}:
+                instrument(e.sync_engine)
+            self.SessionLocal = sessionmaker(self.engine, class_=AsyncSession, autocommit=False, autoflush=False,
+                                             expire_on_commit=False)
+            self.ReadSessionLocal = sessionmaker(self.read_engine, class_=AsyncSession, autocommit=False,
+                                                 autoflush=False, expire_on_commit=False)
+
+    ASYNC_SHARDS = [AsyncShard(shard_url(ASYNC_DB_URL, shard.index)) for shard in SHARDS]
+    async_engine, async_read_engine = ASYNC_SHARDS[0].engine, ASYNC_SHARDS[0].read_engine
+elif DB_MODE != "sync":
+    raise RuntimeError(f"DB_MODE must be 'sync' or 'async', got {DB_MODE!r}")
+
+def _run(op, session, args, kwargs):
+    # Every operation ends its transaction, so no request keeps the writer (or a reader)
+    # checked out while it awaits something else.
+    try:
+        return op(DB(session), *args, **kwargs)
+    finally:
+        session.rollback()
+
+class AsyncDB:
+    """Awaitable facade over every store.DB operation.
+
+    Operations run through AsyncSession.run_sync, which drives the sync DB code on the async
+    driver inside a greenlet, so there is one implementation of each query for both modes.
+    DB.READ_OPS go to the read-only pool, everything else to the single writer connection of the
+    shard owning the creator; operations spanning shards run on each of them concurrently.
+    """
+
+    def __init__(self):
+        self._sessions = {}
+
+    def __getattr__(self, name):
+        op = getattr(DB, name)
+        async def call(*args, **kwargs):
+            planned = plan(name, args, kwargs)
+            if planned is None:
+                return await self._call(op, 0, name in DB.READ_OPS, args, kwargs)
+            calls, merge = planned
+            return merge(await asyncio.gather(*(self._call(getattr(DB, m), i, m in DB.READ_OPS, (), p)
+                                                for i, m, p in calls)))
+        return call
+
+    def _session(self, shard, readonly):
+        key = (shard, readonly)
+        if key not in self._sessions:
+            self._sessions[key] = self._new_session(shard, readonly)
+        return self._sessions[key]
+
+    def _new_session(self, shard, readonly):
+        shard = ASYNC_SHARDS[shard]
+        return (shard.ReadSessionLocal if readonly else shard.SessionLocal)()
+
+    async def _call(self, op, shard, readonly, args, kwargs):
+        return await self._session(shard, readonly).run_sync(lambda session: _run(op, session, args, kwargs))
+
+    async def close(self):
+        for session in self._sessions.values():
+            await session.close()
+
+class ThreadedDB(AsyncDB):
+    """DB_MODE=sync: the same awaitable interface, with each call on the threadpool."""
+
+    def _new_session(self, shard, readonly):
+        shard = SHARDS[shard]
+        return (shard.ReadSessionLocal if readonly else shard.SessionLocal)()
+
+    async def _call(self, op, shard, readonly, args, kwargs):
+        return await run_in_threadpool(_run, op, self._session(shard, readonly), args, kwargs)
+
+    async def close(self):
+        for session in self._sessions.values():
+            await run_in_threadpool(session.close)
+
+async def dispose():
+    # aiosqlite runs each connection on a non-daemon thread; pooled ones must be closed to exit
+    if DB_MODE == "async":
+        for shard in ASYNC_SHARDS:
+            await shard.engine.dispose()
+            await shard.read_engine.dispose()
+
+def open_db():
+    return AsyncDB() if DB_MODE == "async" else ThreadedDB()
+
+async def get_db():
+    db = open_db()
+    try:
+        yield db
+    finally:
+        await db.close()
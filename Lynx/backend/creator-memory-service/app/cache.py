@@ -0,0 +1,66 @@
+import os, threading, time
+from collections import OrderedDict
+
+CACHE_SIZE = int(os.getenv("PERSONALIZE_CACHE_SIZE", "10000"))
+CACHE_TTL = float(os.getenv("PERSONALIZE_CACHE_TTL", "30"))
+
+class CreatorCache:
+    """Bounded LRU+TTL cache of per-creator read payloads.
+
+    Every creator has a version stamp that `invalidate` bumps. Readers take the stamp before
+    querying and pass it to `put`, which drops the value if a writer invalidated in between.
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.maxsize, self.ttl = maxsize, ttl
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._clock = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.stale = 0
+
+    def version(self, cid):
+        with self._lock:
+            return self._versions.get(cid, 0)
+
+    def get(self, cid, key):
+        with self._lock:
+            entry = self._entries.get((cid, key))
+            if entry is not None:
+                value, version, expires = entry
+                if version == self._versions.get(cid, 0) and expires > time.monotonic():
+                    self._entries.move_to_end((cid, key))
+                    self.hits += 1
+                    return value
+                del self._entries[(cid, key)]
+                self.stale += 1
+            self.misses += 1
+            return None
+
+    def put(self, cid, key, value, version):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if version != self._versions.get(cid, 0):
+                return
+            self._entries[(cid, key)] = (value, version, time.monotonic() + self.ttl)
+            self._entries.move_to_end((cid, key))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, cid):
+        # Stale entries are dropped lazily on the next get; the stamp bump is what matters.
+        with self._lock:
+            self._clock += 1
+            self._versions[cid] = self._clock
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries), "maxsize": self.maxsize, "ttl": self.ttl,
+                "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "stale": self.stale,
+            }
+
+cache = CreatorCache()
@@ -0,0 +1,185 @@
+import asyncio, itertools, os, threading, time
+from collections import OrderedDict, deque
+from .responses import dumps
+
+# Server-sent events for suggestion and memory changes, fanned out in-process: each worker only
+# sees the writes it (or its write-behind thread) commits.
+EVENTS_REPLAY = int(os.getenv("EVENTS_REPLAY", "256"))            # events kept per creator for Last-Event-ID
+EVENTS_CHANNELS = int(os.getenv("EVENTS_CHANNELS", "10000"))      # creators with a replay buffer
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", "15"))     # seconds between keepalive comments
+EVENTS_MAX_PENDING = int(os.getenv("EVENTS_MAX_PENDING", "1000"))  # undelivered events before a client is dropped
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "10000"))
+RETRY_MS = 3000
+
+KEEPALIVE = b": keepalive\n\n"
+RESET = b'event: reset\ndata: {"reason":"replay unavailable"}\n\n'
+
+class Subscriber:
+    __slots__ = ("pending", "wakeup", "closed")
+
+    def __init__(self):
+        self.pending, self.wakeup, self.closed = [], asyncio.Event(), False
+
+class _Channel:
+    __slots__ = ("replay", "subscribers", "complete_after")
+
+    def __init__(self, size, complete_after):
+        self.replay = deque(maxlen=size)  # (seq, frame)
+        self.subscribers = set()
+        self.complete_after = complete_after  # replay holds every event of this creator after this seq
+
+class EventHub:
+    """Per-creator pub/sub for SSE streams, owned by the event loop.
+
+    Frames are encoded once at publish time and shared by every subscriber. Event ids are
+    "<process epoch>-<seq>", so a Last-Event-ID from an earlier process (or one older than the
+    replay buffer) gets a `reset` event telling the client to refetch instead of a silent gap.
+    A subscriber with more than `max_pending` undelivered frames is disconnected; its client
+    reconnects and resumes from the replay buffer.
+    """
+
+    def __init__(self, replay=EVENTS_REPLAY, channels=EVENTS_CHANNELS, heartbeat=EVENTS_HEARTBEAT,
+                 max_pending=EVENTS_MAX_PENDING, max_subscribers=EVENTS_MAX_SUBSCRIBERS):
+        self.replay, self.channels, self.heartbeat = replay, channels, heartbeat
+        self.max_pending, self.max_subscribers = max_pending, max_subscribers
+        self._epoch = format(time.time_ns() // 1000, "x")
+        self._seq = itertools.count(1)
+        self._last = 0
+        self._channels = OrderedDict()
+        self._loop = self._thread = self._ticker = None
+        self.subscribers = self.published = self.evicted = self.resets = 0
+
+    def start(self):
+        # Called on the event loop at startup
+        self._loop, self._thread = asyncio.get_running_loop(), threading.get_ident()
+        if self._ticker is None:
+            self._ticker = self._loop.create_task(self._heartbeats())
+
+    def stop(self):
+        # Ends every open stream, so shutdown does not wait on idle clients
+        if self._ticker is not None:
+            self._ticker.cancel()
+            self._ticker = None
+        for channel in self._channels.values():
+            for sub in channel.subscribers:
+                self._close(sub)
+
+    def full(self):
+        return self.subscribers >= self.max_subscribers
+
+    # ---- publishing (any thread) ----
+    def suggestion_logged(self, cid, sid, caption, hashtags, model):
+        self.publish(cid, "suggestion-logged", {"suggestion_id": sid, "suggested_caption": caption,
+                                                "suggested_hashtags": list(hashtags or []), "model": model})
+
+    def feedback_recorded(self, cid, sid, action, final_caption, final_hashtags):
+        self.publish(cid, "feedback-recorded", {"suggestion_id": sid, "status": action, "final_caption": final_caption,
+                                                "final_hashtags": list(final_hashtags or [])})
+
+    def memory_added(self, cid, mid, caption, hashtags):
+        self.publish(cid, "memory-added", {"id": mid, "caption": caption, "hashtags": list(hashtags or [])})
+
+    def publish(self, cid, event, data):
+        loop = self._loop
+        if loop is None:
+            return  # not serving: there is nobody to deliver to
+        payload = dumps(data)
+        if threading.get_ident() == self._thread:
+            self._deliver(cid, event, payload)
+            return
+        try:
+            loop.call_soon_threadsafe(self._deliver, cid, event, payload)
+        except RuntimeError:
+            pass  # loop closed during shutdown
+
+    def _deliver(self, cid, event, payload):
+        seq = self._last = next(self._seq)
+        frame = b"id: %s-%d\nevent: %s\ndata: %s\n\n" % (self._epoch.encode(), seq, event.encode(), payload)
+        channel = self._channel(cid)
+        if len(channel.replay) == channel.replay.maxlen:
+            channel.complete_after = channel.replay[0][0]
+        channel.replay.append((seq, frame))
+        self.published += 1
+        for sub in list(channel.subscribers):
+            if len(sub.pending) >= self.max_pending:
+                self.evicted += 1
+                self._close(sub)
+                channel.subscribers.discard(sub)
+                self.subscribers -= 1
+            else:
+                sub.pending.append(frame)
+                sub.wakeup.set()
+
+    def _channel(self, cid):
+        channel = self._channels.get(cid)
+        if channel is not None:
+            self._channels.move_to_end(cid)
+            return channel
+        channel = self._channels[cid] = _Channel(self.replay, self._last)
+        # Drop the least recently used idle channels; ones with live subscribers are kept
+        for _ in range(len(self._channels)):
+            if len(self._channels) <= self.channels:
+                break
+            oldest, c = next(iter(self._channels.items()))
+            if c.subscribers:
+                self._channels.move_to_end(oldest)
+            else:
+                del self._channels[oldest]
+        return channel
+
+    # ---- subscribing (event loop) ----
+    def _subscribe(self, cid, last_event_id):
+        sub, channel = Subscriber(), self._channel(cid)
+        channel.subscribers.add(sub)
+        self.subscribers += 1
+        if last_event_id:
+            epoch, _, seq = last_event_id.strip().rpartition("-")
+            if epoch == self._epoch and seq.isdigit() and int(seq) >= channel.complete_after:
+                sub.pending.extend(frame for s, frame in channel.replay if s > int(seq))
+            else:
+                self.resets += 1
+                sub.pending.append(RESET)
+        return channel, sub
+
+    async def stream(self, cid, last_event_id=None):
+        # Subscribes on first iteration, so a response that is never sent leaves nothing behind
+        channel, sub = self._subscribe(cid, last_event_id)
+        try:
+            yield b"retry: %d\n\n" % RETRY_MS
+            while not sub.closed:
+                if not sub.pending:
+                    sub.wakeup.clear()
+                    await sub.wakeup.wait()
+                    if sub.closed:
+                        break
+                    if not sub.pending:
+                        yield KEEPALIVE
+                        continue
+                frames, sub.pending = sub.pending, []
+                yield b"".join(frames)
+        finally:
+            if sub in channel.subscribers:
+                channel.subscribers.discard(sub)
+                self.subscribers -= 1
+
+    async def _heartbeats(self):
+        # One timer for every stream instead of one per connection; a woken stream with nothing
+        # pending writes a keepalive comment
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            for channel in self._channels.values():
+                for sub in channel.subscribers:
+                    sub.wakeup.set()
+
+    @staticmethod
+    def _close(sub):
+        sub.closed = True
+        sub.pending = []
+        sub.wakeup.set()
+
+    def stats(self):
+        return {"subscribers": self.subscribers, "max_subscribers": self.max_subscribers,
+                "channels": len(self._channels), "published": self.published,
+                "evicted": self.evicted, "resets": self.resets}
+
+hub = EventHub()
@@ -0,0 +1,226 @@
+# Run with: python -m app.generate_data --creators 10000 --memories-per-creator 100 --seed 7
+#
+# Synthetic load-test data. Each batch is drawn with numpy and written with one executemany per
+# shard on a connection with relaxed pragmas; secondary indexes and the full-text triggers are dropped
+# for the load and the derived tables are rebuilt set-based afterwards. The same arguments always
+# produce the same rows (timestamps are relative to the time of the run).
+
+import argparse, json, random, re, sys, time
+from contextlib import ExitStack
+from dataclasses import dataclass
+import numpy as np
+
+# app.store is imported inside generate(): it reads DB_URL on import, and callers such as the
+# benchmark harness only set it after importing the vocabulary below.
+
+FEEDBACK_STATUSES = ("approved", "edited", "rejected")
+WORDS = ("ramen laksa budget hack singapore noodle soup gym fitness morning coffee street food hawker "
+         "chicken rice spicy sweet thrift fashion outfit travel hidden gem review tutorial quick easy "
+         "best worst try viral challenge night market bubble tea dessert workout routine").split()
+NICHES = ["food", "fitness", "fashion", "travel", "lifestyle", None]
+TONES = ["playful", "informative", "inspirational", "edgy", "friendly"]
+POOL_SIZE = 8192  # distinct captions / hashtag lists; rows sample from these pools
+
+MEMORY_COLUMNS = ("creator_id", "caption", "hashtags", "performance", "created_at",
+                  "views", "likes", "comments", "shares", "engagement", "score")
+SUGGESTION_COLUMNS = ("suggestion_id", "creator_id", "suggested_caption", "suggested_hashtags", "model", "meta",
+                      "status", "final_caption", "final_hashtags", "created_at", "updated_at")
+
+@dataclass
+class GenerateConfig:
+    creators: int = 1000
+    memories_per_creator: float = 100   # mean; sizes follow a Zipf distribution around it
+    zipf: float = 1.1                   # 0 gives every creator the same size
+    hashtags: int = 500                 # vocabulary size; tag popularity is Zipf too
+    suggestion_ratio: float = 0.3       # share of memories that also get a logged suggestion
+    feedback_ratio: float = 0.7         # share of suggestions with approved/edited/rejected feedback
+    days: int = 90                      # created_at spread over the last N days
+    seed: int = 42
+    prefix: str = "creator_"
+    batch: int = 100_000
+    clear: bool = False
+
+def hashtag_vocabulary(n):
+    return [f"#{w}" for w in WORDS][:n] + [f"#tag{i}" for i in range(max(0, n - len(WORDS)))]
+
+def zipf_sizes(total, n, skew, rng):
+    # Sizes proportional to 1/rank^skew summing to `total`, shuffled so ids do not encode size
+    weights = [1.0 / (r ** skew) for r in range(1, n + 1)]
+    scale = total / sum(weights)
+    sizes = [int(w * scale) for w in weights]
+    for i in range(total - sum(sizes)):
+        sizes[i % n] += 1
+    rng.shuffle(sizes)
+    return sizes
+
+def _bulk_tables(store):
+    return store.MemoryORM.__table__, store.SuggestionLogORM.__table__, store.MemoryHashtagORM.__table__
+
+def _relax(c, store):
+    # Load mode: no fsync, big page cache, and no per-row index or FTS trigger maintenance
+    c.exec_driver_sql("PRAGMA synchronous=OFF")
+    c.exec_driver_sql("PRAGMA cache_size=-262144")
+    for name in re.findall(r"CREATE TRIGGER IF NOT EXISTS (\w+)", " ".join(store._SEARCH_DDL)):
+        c.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+    for t in _bulk_tables(store):
+        for idx in t.indexes:
+            idx.drop(bind=c, checkfirst=True)
+
+def _restore(c, store):
+    for t in _bulk_tables(store):
+        for idx in t.indexes:
+            idx.create(bind=c, checkfirst=True)
+    for ddl in store._SEARCH_DDL:
+        c.exec_driver_sql(ddl)
+    c.exec_driver_sql(f"PRAGMA synchronous={store.STORAGE_PROFILE.synchronous}")
+    c.exec_driver_sql(f"PRAGMA cache_size={store.STORAGE_PROFILE.cache_size}")
+
+def _insert_sql(table, columns, verb="INSERT"):
+    return f"{verb} INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+def _creators(cfg, rng):
+    ids = [f"{cfg.prefix}{i:06d}" for i in range(cfg.creators)]
+    creators = [{"id": cid, "username": f"@{cid}", "locale": "en", "timezone": "Asia/Singapore"} for cid in ids]
+    prefs = [{"creator_id": cid, "tone": rng.choice(TONES), "caption_length": rng.choice(["short", "medium", "long"]),
+              "niche": rng.choice(NICHES), "banned_words": json.dumps(rng.sample(WORDS, rng.randint(0, 2)))}
+             for cid in ids]
+    return ids, creators, prefs
+
+def _pools(cfg, rng):
+    tags = hashtag_vocabulary(cfg.hashtags)
+    weights = [1.0 / (r ** cfg.zipf) for r in range(1, len(tags) + 1)]
+    captions = [" ".join(rng.choices(WORDS, k=rng.randint(4, 14))) for _ in range(POOL_SIZE)]
+    hashtags = [json.dumps(list(dict.fromkeys(rng.choices(tags, weights, k=rng.randint(1, 5)))))
+                for _ in range(POOL_SIZE)]
+    return captions, hashtags
+
+def _timestamps(epoch_us):
+    # Same text format SQLAlchemy's SQLite DateTime type writes
+    return [s.replace("T", " ") for s in np.datetime_as_string(epoch_us.astype("datetime64[us]"), unit="us")]
+
+def _rows(cfg, gen, owners, pools, now_us, sug_start, weights):
+    n = len(owners)
+    captions, hashtags = pools
+    views = gen.integers(100, 500_001, n)
+    likes, shares, comments = gen.integers(0, 50_001, n), gen.integers(0, 5_001, n), gen.integers(0, 2_001, n)
+    engagement = np.round(100.0 * (likes + shares + comments) / views, 1)
+    score = (weights["views"] * views + weights["likes"] * likes + weights["comments"] * comments
+             + weights["shares"] * shares)
+    created_us = now_us - gen.integers(0, cfg.days * 86400 * 10**6, n)
+    created = _timestamps(created_us)
+    memories = [
+        (cid, captions[c], hashtags[h],
+         f'{{"views": {v}, "likes": {l}, "shares": {s}, "comments": {m}, "engagement": {e}}}',
+         ts, v, l, m, s, e, sc)
+        for cid, c, h, ts, v, l, s, m, e, sc in zip(
+            owners, gen.integers(0, POOL_SIZE, n).tolist(), gen.integers(0, POOL_SIZE, n).tolist(), created,
+            views.tolist(), likes.tolist(), shares.tolist(), comments.tolist(), engagement.tolist(), score.tolist())
+    ]
+    # A share of the memories get a logged suggestion, answered with probability feedback_ratio
+    picked = np.flatnonzero(gen.random(n) < cfg.suggestion_ratio)
+    answered = gen.random(len(picked)) < cfg.feedback_ratio
+    status = np.where(answered, np.array(FEEDBACK_STATUSES)[gen.integers(0, 3, len(picked))], "pending")
+    updated = _timestamps(created_us[picked] + gen.integers(60, 36_000, len(picked)) * 10**6)
+    logs = []
+    for k, (i, st, up) in enumerate(zip(picked.tolist(), status.tolist(), updated)):
+        cid, caption, tags, _, created_at = memories[i][:5]
+        final = caption if st == "approved" else (caption + " ✨" if st == "edited" else None)
+        logs.append((f"{cfg.prefix}sug_{sug_start + k:09d}", cid, caption, tags, "gpt", "{}", st, final,
+                     tags if final else "[]", created_at, up))
+    return memories, logs
+
+def _by_shard(rows, shard_for, key):
+    parts = {}
+    for row in rows:
+        parts.setdefault(shard_for(row[key]), []).append(row)
+    return parts.items()
+
+def generate(cfg, log=print):
+    from . import store
+    from .sharding import ShardedDB, shard_for
+    from .vectors import vector_index
+    rng = random.Random(cfg.seed)
+    gen = np.random.default_rng(cfg.seed)
+    store.init_db()
+    started = time.perf_counter()
+    ids, creators, prefs = _creators(cfg, rng)
+    pools = _pools(cfg, rng)
+    owners = [cid for cid, n in zip(ids, zipf_sizes(int(cfg.creators * cfg.memories_per_creator), cfg.creators,
+                                                    cfg.zipf, rng)) for _ in range(n)]
+    rng.shuffle(owners)
+    now_us = int(time.time() * 10**6)
+    counts = {"creators": len(ids), "memories": 0, "suggestions": 0}
+    memory_sql = _insert_sql(store.MemoryORM.__table__, MEMORY_COLUMNS)
+    suggestion_sql = _insert_sql(store.SuggestionLogORM.__table__, SUGGESTION_COLUMNS, "INSERT OR REPLACE")
+    with ExitStack() as stack:
+        conns = [stack.enter_context(shard.engine.connect()) for shard in store.SHARDS]
+        for c in conns:
+            _relax(c, store)
+            with c.begin():
+                if cfg.clear:
+                    # creator_versions survives, so ETags issued before the wipe never match again
+                    for t in reversed(store.Base.metadata.sorted_tables):
+                        if t is not store.CreatorVersionORM.__table__:
+                            c.execute(t.delete())
+        for table, rows, key in ((store.CreatorORM.__table__, creators, "id"),
+                                 (store.PreferenceORM.__table__, prefs, "creator_id")):
+            for i, part in _by_shard(rows, shard_for, key):
+                with conns[i].begin():
+                    conns[i].execute(table.insert().prefix_with("OR REPLACE"), part)
+        for start in range(0, len(owners), cfg.batch):
+            memories, logs = _rows(cfg, gen, owners[start:start + cfg.batch], pools, now_us, counts["suggestions"],
+                                   store.ENGAGEMENT_WEIGHTS)
+            logs_by_shard = dict(_by_shard(logs, shard_for, 1))
+            for i, part in _by_shard(memories, shard_for, 0):
+                with conns[i].begin():
+                    conns[i].exec_driver_sql(memory_sql, part)
+                    if logs_by_shard.get(i):
+                        conns[i].exec_driver_sql(suggestion_sql, logs_by_shard[i])
+            counts["memories"] += len(memories)
+            counts["suggestions"] += len(logs)
+            log(f"   … {counts['memories']:,} memories ({counts['memories'] / (time.perf_counter() - started):,.0f}/s)")
+        loaded = time.perf_counter() - started
+    log("🔧 Rebuilding derived tables and indexes")
+    db = ShardedDB()
+    try:
+        # memory_hashtags is filled before its indexes come back, the FTS tables after their triggers;
+        # rebuild_hashtag_counts also bumps every creator's version
+        for rebuild in (db.rebuild_hashtag_counts, db.rebuild_memory_hashtags, db.rebuild_hashtag_buckets,
+                        db.rebuild_stats):
+            rebuild()
+        for shard in store.SHARDS:
+            with shard.engine.begin() as c:
+                _restore(c, store)
+        db.rebuild_search()
+    finally:
+        db.close()
+    vector_index.clear()  # rebuilt per creator on first similarity query
+    for shard in store.SHARDS:
+        with shard.engine.connect() as c:
+            c.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    return {**counts, "load_seconds": round(loaded, 1), "total_seconds": round(time.perf_counter() - started, 1)}
+
+def main(argv=None):
+    d = GenerateConfig()
+    parser = argparse.ArgumentParser(prog="python -m app.generate_data", description="Generate synthetic creator data")
+    parser.add_argument("--creators", type=int, default=d.creators)
+    parser.add_argument("--memories-per-creator", type=float, default=d.memories_per_creator, help="mean per creator")
+    parser.add_argument("--zipf", type=float, default=d.zipf, help="skew of creator sizes and hashtag popularity")
+    parser.add_argument("--hashtags", type=int, default=d.hashtags, help="hashtag vocabulary size")
+    parser.add_argument("--suggestion-ratio", type=float, default=d.suggestion_ratio,
+                        help="share of memories with a logged suggestion")
+    parser.add_argument("--feedback-ratio", type=float, default=d.feedback_ratio, help="share of suggestions answered")
+    parser.add_argument("--days", type=int, default=d.days, help="time span of created_at")
+    parser.add_argument("--seed", type=int, default=d.seed)
+    parser.add_argument("--prefix", default=d.prefix, help="creator id prefix")
+    parser.add_argument("--batch", type=int, default=d.batch, help="rows per insert transaction")
+    parser.add_argument("--clear", action="store_true", help="delete all existing data first")
+    cfg = GenerateConfig(**vars(parser.parse_args(argv)))
+    print(f"🧪 Generating {cfg.creators:,} creators x ~{cfg.memories_per_creator:g} memories (seed {cfg.seed})")
+    result = generate(cfg)
+    print(f"✅ {result['memories']:,} memories, {result['suggestions']:,} suggestions, {result['creators']:,} creators "
+          f"in {result['total_seconds']}s (load {result['load_seconds']}s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+import os, re
+from functools import lru_cache
+
+# Compiled banned-word matchers are cached by word list, so a creator's matcher is only rebuilt
+# when update_preferences actually changes the list (and creators sharing a list share one).
+MATCHER_CACHE_SIZE = int(os.getenv("GUARDRAIL_CACHE_SIZE", "4096"))
+
+class Matcher:
+    """Case-folded, whole-word matcher for one banned-word list.
+
+    All words go into a single alternation (longest first), bounded by non-word lookarounds so
+    "spam" matches "Spam!" and "#spam" but not "spammer". Multi-word entries match across any
+    run of whitespace.
+    """
+
+    def __init__(self, words):
+        self._original = {}
+        for w in words:
+            key = " ".join(w.casefold().split())
+            if key:
+                self._original.setdefault(key, w)
+        alts = sorted(self._original, key=len, reverse=True)
+        self._regex = re.compile(
+            r"(?<!\w)(" + "|".join(r"\s+".join(map(re.escape, k.split())) for k in alts) + r")(?!\w)"
+        ) if alts else None
+
+    def find(self, text):
+        # Banned words present in `text`, in order of first appearance, as configured
+        if not self._regex or not text:
+            return []
+        hits = dict.fromkeys(" ".join(m.group(1).split()) for m in self._regex.finditer(text.casefold()))
+        return [self._original[h] for h in hits]
+
+    def check(self, caption=None, hashtags=()):
+        return {
+            "caption": self.find(caption),
+            "hashtags": [h for h in hashtags or [] if self.find(h)],
+        }
+
+@lru_cache(maxsize=MATCHER_CACHE_SIZE)
+def _compile(words):
+    return Matcher(words)
+
+def matcher(banned_words):
+    return _compile(tuple(banned_words or ()))
@@ -1,14 +1,34 @@
 
 # app/main.py
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.cors import CORSMiddleware  # Starlette import avoids false Pylance warning
-from fastapi.responses import RedirectResponse, Response
-from pydantic import BaseModel, Field
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
 from typing import List, Optional, Literal
-from datetime import datetime
+from datetime import datetime, timedelta
+import asyncio, json, logging, os
 
-from .store import init_db, get_db, DB
+from .store import init_db, decode_cursor, encode_cursor, storage_report
+from .async_store import DB_MODE, AsyncDB, dispose, get_db, open_db
+from .cache import cache
+from .events import hub
+from .guardrails import matcher
+from .metrics import METRICS, MetricsMiddleware, TimedRoute, metrics
+from .responses import FastJSONResponse, dumps
+from .writebehind import WRITE_BEHIND, QueueFull, writer
+
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "5000"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+MAX_STREAM_SIZE = int(os.getenv("MAX_STREAM_SIZE", "1000000"))
+MAX_SEARCH_OFFSET = int(os.getenv("MAX_SEARCH_OFFSET", "10000"))
+MAX_GUARDRAIL_BATCH = int(os.getenv("MAX_GUARDRAIL_BATCH", "1000"))
+MAX_PERSONALIZE_BATCH = int(os.getenv("MAX_PERSONALIZE_BATCH", "1000"))
+MAX_WEBHOOK_BATCH = int(os.getenv("MAX_WEBHOOK_BATCH", "1000"))
+TRENDING_PRUNE_INTERVAL = int(os.getenv("TRENDING_PRUNE_INTERVAL", "3600"))  # seconds, 0 to leave it to cron
+
+log = logging.getLogger(__name__)
 
 # ---------------------------------------
 # App
@@ -18,6 +38,7 @@ app = FastAPI(
     version="0.1.0",
     description="Stores and retrieves creator history, preferences, and personalization logic",
 )
+app.router.route_class = TimedRoute
 
 # ---------------------------------------
 # CORS
@@ -28,8 +49,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Server-Timing", "X-Next-Cursor"],
 )
 
+# Outermost, so latency includes CORS handling
+if METRICS:
+    app.add_middleware(MetricsMiddleware)
+
 # ---------------------------------------
 # Utility routes
 # ---------------------------------------
@@ -39,7 +65,26 @@ def root():
 
 @app.get("/healthz", include_in_schema=False)
 def healthz():
-    return {"status": "ok", "service": "creator-memory", "time": datetime.utcnow().isoformat()}
+    return {
+        "status": "ok", "service": "creator-memory", "time": datetime.utcnow().isoformat(),
+        "db_mode": DB_MODE, "storage": storage_report(),
+    }
+
+@app.get("/stats/cache", include_in_schema=False)
+def cache_stats():
+    return cache.stats()
+
+@app.get("/stats/write-behind", include_in_schema=False)
+def write_behind_stats():
+    return {"enabled": WRITE_BEHIND, **writer.stats()}
+
+@app.get("/stats/events", include_in_schema=False)
+def events_stats():
+    return hub.stats()
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.get("/favicon.ico", include_in_schema=False)
 def favicon():
@@ -128,6 +173,21 @@ class GenerationWebhookDTO(BaseModel):
             }
         }
 
+class GenerationWebhookBatchDTO(BaseModel):
+    suggestions: List[GenerationWebhookDTO] = Field(..., max_items=MAX_WEBHOOK_BATCH)
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "suggestions": [
+                    {"creator_id": "creator_123", "suggestion_id": "sug_001", "suggested_caption": "Quick ramen hack 🍜",
+                     "suggested_hashtags": ["#ramen", "#sgfood"], "model": "gpt-4o-mini"},
+                    {"creator_id": "creator_456", "suggestion_id": "sug_002", "suggested_caption": "Cheap eats, no spam",
+                     "suggested_hashtags": ["#budget"], "model": "gpt-4o-mini"}
+                ]
+            }
+        }
+
 class FeedbackDTO(BaseModel):
     creator_id: str
     suggestion_id: str
@@ -150,26 +210,137 @@ class FeedbackDTO(BaseModel):
 
 class PersonalizeQueryDTO(BaseModel):
     creator_id: str
+    examples: Literal["recent","top"] = "recent"
+    since_days: Optional[int] = Field(None, ge=1, description="With examples=top, only rank memories from the last N days")
+    draft_caption: Optional[str] = Field(None, description="When set, examples are the past captions most similar to this draft")
+    hashtags: Literal["frequent","recent"] = Field("frequent", description="Preferred hashtags by total uses, or by uses decayed with HASHTAG_HALF_LIFE_DAYS")
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "creator_id": "creator_123",
+                "examples": "top",
+                "since_days": 30
+            }
+        }
+
+class PersonalizeBatchQueryDTO(BaseModel):
+    creator_ids: List[str] = Field(..., max_items=MAX_PERSONALIZE_BATCH)
+    examples: Literal["recent","top"] = "recent"
+    since_days: Optional[int] = Field(None, ge=1, description="With examples=top, only rank memories from the last N days")
+    hashtags: Literal["frequent","recent"] = Field("frequent", description="Preferred hashtags by total uses, or by uses decayed with HASHTAG_HALF_LIFE_DAYS")
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "creator_ids": ["creator_123", "creator_456"],
+                "examples": "recent"
+            }
+        }
+
+class GuardrailCandidateDTO(BaseModel):
+    caption: Optional[str] = None
+    hashtags: List[str] = []
+
+class GuardrailCheckDTO(BaseModel):
+    creator_id: str
+    candidates: List[GuardrailCandidateDTO] = Field(..., max_items=MAX_GUARDRAIL_BATCH)
 
     class Config:
         schema_extra = {
             "example": {
-                "creator_id": "creator_123"
+                "creator_id": "creator_123",
+                "candidates": [
+                    {"caption": "Budget ramen hack 🍜", "hashtags": ["#ramen"]},
+                    {"caption": "Not SPAM, promise", "hashtags": ["#spam", "#budget"]}
+                ]
             }
         }
 
+class ArchivedSuggestionDTO(BaseModel):
+    suggestion_id: str
+    status: Literal["approved","edited","rejected"]
+    model: Optional[str] = None
+    suggested_caption: Optional[str] = None
+    suggested_hashtags: List[str] = []
+    final_caption: Optional[str] = None
+    final_hashtags: List[str] = []
+    reason: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
 class PersonalizeResultDTO(BaseModel):
     creator_id: str
     guardrails: dict
     hints: dict
     examples: List[dict]
 
+# ---------------------------------------
+# Conditional requests
+# ---------------------------------------
+# Read routes tag responses with the creator's version from store.DB, which every write bumps.
+# Clients must revalidate each time; a matching If-None-Match costs one primary key lookup.
+CACHE_CONTROL = "private, no-cache"
+ETAG_HEADER = {"ETag": {"description": "Creator version; send it back in `If-None-Match`", "schema": {"type": "string"}}}
+NOT_MODIFIED = {304: {"description": "Unchanged since the ETag sent in `If-None-Match`"}}
+
+def _etag(version, *variant):
+    # None when the creator has no version yet (unknown creator): the route then answers as usual
+    if version is None:
+        return None
+    return '"' + "-".join(str(v) for v in (version, *variant)) + '"'
+
+def _not_modified(request: Request, etag):
+    # If-None-Match uses the weak comparison, so W/"7" matches "7"
+    header = request.headers.get("if-none-match")
+    if not etag or not header:
+        return None
+    tags = [t.strip() for t in header.split(",")]
+    if "*" in tags or etag in (t[2:] if t.startswith("W/") else t for t in tags):
+        return Response(status_code=304, headers=_validators(etag))
+    return None
+
+def _validators(etag):
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL} if etag else {}
+
 # ---------------------------------------
 # Startup
 # ---------------------------------------
 @app.on_event("startup")
 def on_startup():
     init_db()
+    hub.start()
+    if WRITE_BEHIND:
+        writer.start()
+
+async def _prune_trending():
+    # Trending buckets older than two windows are never read again. Every worker runs this; deleting
+    # already-deleted buckets is harmless.
+    while True:
+        await asyncio.sleep(TRENDING_PRUNE_INTERVAL)
+        db = open_db()
+        try:
+            await db.prune_hashtag_buckets()
+        except Exception:
+            log.exception("pruning trending buckets failed")
+        finally:
+            await db.close()
+
+_pruner = None
+
+@app.on_event("startup")
+async def start_pruning():
+    global _pruner
+    if TRENDING_PRUNE_INTERVAL > 0:
+        _pruner = asyncio.create_task(_prune_trending())
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    if _pruner is not None:
+        _pruner.cancel()
+    hub.stop()
+    await run_in_threadpool(writer.stop)
+    await dispose()
 
 # ---------------------------------------
 # Routes (with response examples)
@@ -194,8 +365,8 @@ def on_startup():
         400: {"description": "Bad request"}
     },
 )
-def upsert_creator(creator_id: str, payload: CreatorDTO, db: DB = Depends(get_db)):
-    obj = db.upsert_creator(creator_id, payload.username, payload.locale, payload.timezone)
+async def upsert_creator(creator_id: str, payload: CreatorDTO, db: AsyncDB = Depends(get_db)):
+    obj = await db.upsert_creator(creator_id, payload.username, payload.locale, payload.timezone)
     return CreatorDTO(id=obj.id, username=obj.username, locale=obj.locale, timezone=obj.timezone)
 
 @app.get(
@@ -204,6 +375,7 @@ def upsert_creator(creator_id: str, payload: CreatorDTO, db: DB = Depends(get_db
     responses={
         200: {
             "description": "Creator record",
+            "headers": ETAG_HEADER,
             "content": {
                 "application/json": {
                     "example": {
@@ -216,13 +388,21 @@ def upsert_creator(creator_id: str, payload: CreatorDTO, db: DB = Depends(get_db
             }
         },
         404: {"description": "Creator not found"},
+        **NOT_MODIFIED,
     },
 )
-def get_creator(creator_id: str, db: DB = Depends(get_db)):
-    obj = db.get_creator(creator_id)
+async def get_creator(creator_id: str, request: Request, db: AsyncDB = Depends(get_db)):
+    etag = _etag(await db.creator_version(creator_id))
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    obj = await db.get_creator(creator_id)
     if not obj:
         raise HTTPException(404, "Creator not found")
-    return CreatorDTO(id=obj.id, username=obj.username, locale=obj.locale, timezone=obj.timezone)
+    return FastJSONResponse(
+        {"id": obj.id, "username": obj.username, "locale": obj.locale, "timezone": obj.timezone},
+        headers=_validators(etag),
+    )
 
 @app.get(
     "/creators/{creator_id}/preferences",
@@ -230,6 +410,7 @@ def get_creator(creator_id: str, db: DB = Depends(get_db)):
     responses={
         200: {
             "description": "Current preferences",
+            "headers": ETAG_HEADER,
             "content": {
                 "application/json": {
                     "example": {
@@ -242,12 +423,18 @@ def get_creator(creator_id: str, db: DB = Depends(get_db)):
             }
         },
         404: {"description": "Creator not found"},
+        **NOT_MODIFIED,
     },
 )
-def get_preferences(creator_id: str, db: DB = Depends(get_db)):
-    p = db.get_or_create_preferences(creator_id)
-    return PreferenceDTO(
-        tone=p.tone, caption_length=p.caption_length, niche=p.niche, banned_words=p.banned_words
+async def get_preferences(creator_id: str, request: Request, db: AsyncDB = Depends(get_db)):
+    etag = _etag(await db.creator_version(creator_id))
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    p = await db.get_or_create_preferences(creator_id)
+    return FastJSONResponse(
+        {"tone": p.tone, "caption_length": p.caption_length, "niche": p.niche, "banned_words": p.banned_words},
+        headers=_validators(etag),
     )
 
 @app.put(
@@ -269,12 +456,49 @@ def get_preferences(creator_id: str, db: DB = Depends(get_db)):
         }
     },
 )
-def put_preferences(creator_id: str, payload: PreferenceDTO, db: DB = Depends(get_db)):
-    p = db.update_preferences(creator_id, payload.dict())
+async def put_preferences(creator_id: str, payload: PreferenceDTO, db: AsyncDB = Depends(get_db)):
+    p = await db.update_preferences(creator_id, payload.dict())
+    cache.invalidate(creator_id)
     return PreferenceDTO(
         tone=p.tone, caption_length=p.caption_length, niche=p.niche, banned_words=p.banned_words
     )
 
+@app.get(
+    "/creators/{creator_id}/events",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "description": (
+                "Server-sent events for this creator: `suggestion-logged`, `feedback-recorded` and "
+                "`memory-added`, with keepalive comments in between. Reconnecting with `Last-Event-ID` "
+                "replays what was missed; when that is no longer possible a `reset` event is sent "
+                "and the client should refetch. Clients that fall too far behind are disconnected."
+            ),
+            "content": {
+                "text/event-stream": {
+                    "example": (
+                        "id: 18f3a2c4b1d-42\nevent: feedback-recorded\ndata: {\"suggestion_id\":\"sug_001\","
+                        "\"status\":\"edited\",\"final_caption\":\"Budget ramen hack in 30s 🍜\","
+                        "\"final_hashtags\":[\"#ramen\",\"#budget\"]}\n\n"
+                    )
+                }
+            }
+        },
+        404: {"description": "Creator not found"},
+        503: {"description": "Too many open event streams, retry later"},
+    },
+)
+async def creator_events(creator_id: str, request: Request, db: AsyncDB = Depends(get_db)):
+    if not await db.get_creator(creator_id):
+        raise HTTPException(404, "Creator not found")
+    if hub.full():
+        raise HTTPException(503, "Too many event streams", headers={"Retry-After": "5"})
+    return StreamingResponse(
+        hub.stream(creator_id, request.headers.get("last-event-id")),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.post(
     "/memories/ingest",
     response_model=MemoryDTO,
@@ -297,21 +521,182 @@ def put_preferences(creator_id: str, payload: PreferenceDTO, db: DB = Depends(ge
         404: {"description": "Creator not found"},
     },
 )
-def ingest_memory(payload: IngestMemoryDTO, db: DB = Depends(get_db)):
-    if not db.get_creator(payload.creator_id):
+async def ingest_memory(payload: IngestMemoryDTO, db: AsyncDB = Depends(get_db)):
+    if not await db.get_creator(payload.creator_id):
         raise HTTPException(404, "Creator not found")
-    m = db.add_memory(payload.creator_id, payload.caption, payload.hashtags, payload.performance or {})
+    m = await db.add_memory(payload.creator_id, payload.caption, payload.hashtags, payload.performance or {})
+    cache.invalidate(payload.creator_id)
+    hub.memory_added(m.creator_id, m.id, m.caption, m.hashtags)
     return MemoryDTO(
         id=m.id, creator_id=m.creator_id, caption=m.caption,
         hashtags=m.hashtags, performance=m.performance, created_at=m.created_at
     )
 
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+
+# Yields (index, row) from a JSON array body, or (index, raw line) from a streamed NDJSON body
+async def _ingest_rows(request: Request):
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        buf, index = b"", 0
+        async for chunk in request.stream():
+            buf += chunk
+            *lines, buf = buf.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield index, line
+                    index += 1
+        if buf.strip():
+            yield index, buf
+        return
+    try:
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(400, "Body must be a JSON array or NDJSON")
+    if not isinstance(body, list):
+        raise HTTPException(400, "Body must be a JSON array or NDJSON")
+    for index, obj in enumerate(body):
+        yield index, obj
+
+@app.post(
+    "/memories/ingest:batch",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {"type": "array", "items": {"$ref": "#/components/schemas/IngestMemoryDTO"}}
+                },
+                "application/x-ndjson": {
+                    "schema": {"type": "string", "description": "One IngestMemoryDTO JSON object per line"}
+                },
+            },
+        }
+    },
+    responses={
+        200: {
+            "description": "Per-row ingest results, in request order",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "inserted": 1,
+                        "failed": 1,
+                        "results": [
+                            {"index": 0, "ok": True, "id": 42},
+                            {"index": 1, "ok": False, "error": "Creator not found"}
+                        ]
+                    }
+                }
+            }
+        },
+        400: {"description": "Body is neither a JSON array nor NDJSON"},
+    },
+)
+async def ingest_memories_batch(request: Request, db: AsyncDB = Depends(get_db)):
+    results, pending, known = [], [], {}
+
+    async def flush():
+        unseen = {row.creator_id for _, row in pending} - known.keys()
+        if unseen:
+            found = await db.existing_creators(unseen)
+            known.update({cid: cid in found for cid in unseen})
+        rows = [(i, row) for i, row in pending if known[row.creator_id]]
+        results.extend({"index": i, "ok": False, "error": "Creator not found"}
+                       for i, row in pending if not known[row.creator_id])
+        pending.clear()
+        if not rows:
+            return
+        ids = await db.add_memories([
+            {"creator_id": row.creator_id, "caption": row.caption,
+             "hashtags": row.hashtags, "performance": row.performance} for _, row in rows
+        ])
+        results.extend({"index": i, "ok": True, "id": mid} for (i, _), mid in zip(rows, ids))
+        for cid in {row.creator_id for _, row in rows}:
+            cache.invalidate(cid)
+        for (_, row), mid in zip(rows, ids):
+            hub.memory_added(row.creator_id, mid, row.caption, row.hashtags)
+
+    async for index, raw in _ingest_rows(request):
+        try:
+            obj = json.loads(raw) if isinstance(raw, bytes) else raw
+            if not isinstance(obj, dict):
+                raise ValueError("Row must be a JSON object")
+            pending.append((index, IngestMemoryDTO(**obj)))
+        except ValidationError as e:
+            results.append({"index": index, "ok": False, "error": _validation_message(e)})
+        except ValueError as e:
+            results.append({"index": index, "ok": False, "error": str(e)})
+        if len(pending) >= INGEST_CHUNK_SIZE:
+            await flush()
+    await flush()
+
+    results.sort(key=lambda r: r["index"])
+    inserted = sum(r["ok"] for r in results)
+    return {"inserted": inserted, "failed": len(results) - inserted, "results": results}
+
+# Declared before /memories/{creator_id} so "search" is not taken for a creator id
+@app.get(
+    "/memories/search",
+    responses={
+        200: {
+            "description": (
+                "Caption matches for one creator, best BM25 rank first. Every word must match, the last "
+                "one as a prefix. `next_offset` is null on the last page."
+            ),
+            "content": {
+                "application/json": {
+                    "example": {
+                        "results": [
+                            {
+                                "source": "memory",
+                                "id": 1,
+                                "caption": "Budget ramen hack 🍜",
+                                "snippet": "Budget <mark>ramen</mark> hack 🍜",
+                                "hashtags": ["#ramen", "#budget"],
+                                "created_at": "2025-08-29T11:22:33.123456",
+                                "rank": -1.42
+                            }
+                        ],
+                        "next_offset": 20
+                    }
+                }
+            }
+        },
+        400: {"description": "Nothing searchable in the query"},
+        404: {"description": "Creator not found"},
+    },
+)
+async def search_memories(
+    creator_id: str,
+    q: str = Query(..., min_length=1, description="Words to find, e.g. `ramen march`"),
+    source: Literal["memories", "suggestions", "all"] = Query("memories", description="Memory captions, final suggestion captions, or both"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=MAX_SEARCH_OFFSET),
+    db: AsyncDB = Depends(get_db),
+):
+    if not await db.get_creator(creator_id):
+        raise HTTPException(404, "Creator not found")
+    try:
+        hits = await db.search_captions(creator_id, q, source, limit + 1, offset)
+    except ValueError:
+        raise HTTPException(400, "Search query has no searchable words")
+    return {"results": hits[:limit], "next_offset": offset + limit if len(hits) > limit else None}
+
 @app.get(
     "/memories/{creator_id}",
     response_model=List[MemoryDTO],
     responses={
         200: {
-            "description": "List of recent memories",
+            "description": (
+                "Page of memories, newest first. When more rows exist the `X-Next-Cursor` header "
+                "carries the cursor for the next page. With `format=ndjson` the page is streamed one "
+                "memory per line and a final `{\"next_cursor\": ...}` line is appended instead."
+            ),
+            "headers": {
+                "X-Next-Cursor": {"description": "Cursor for the next page", "schema": {"type": "string"}},
+                **ETAG_HEADER,
+            },
             "content": {
                 "application/json": {
                     "example": [
@@ -327,39 +712,190 @@ def ingest_memory(payload: IngestMemoryDTO, db: DB = Depends(get_db)):
                 }
             }
         },
+        400: {"description": "Invalid cursor or page size"},
         404: {"description": "Creator not found"},
+        **NOT_MODIFIED,
     },
 )
-def list_memories(creator_id: str, db: DB = Depends(get_db)):
-    if not db.get_creator(creator_id):
+async def list_memories(
+    creator_id: str,
+    request: Request,
+    limit: int = Query(50, ge=1, description=f"Page size (max {MAX_PAGE_SIZE}, or {MAX_STREAM_SIZE} with format=ndjson)"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page"),
+    format: Literal["json", "ndjson"] = "json",
+    db: AsyncDB = Depends(get_db),
+):
+    if limit > (MAX_STREAM_SIZE if format == "ndjson" else MAX_PAGE_SIZE):
+        raise HTTPException(400, "Page size too large")
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    # Streams are not tagged: a strong ETag would have to cover both representations
+    etag = None if format == "ndjson" else _etag(await db.creator_version(creator_id))
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    if not await db.get_creator(creator_id):
         raise HTTPException(404, "Creator not found")
-    return [
-        MemoryDTO(
-            id=m.id, creator_id=m.creator_id, caption=m.caption,
-            hashtags=m.hashtags, performance=m.performance, created_at=m.created_at
-        )
-        for m in db.list_memories(creator_id)
-    ]
+    if format == "ndjson":
+        return StreamingResponse(_stream_memories(creator_id, limit, after), media_type="application/x-ndjson")
+    rows = await db.list_memories(creator_id, limit + 1, after)
+    headers = _validators(etag)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1])
+    return FastJSONResponse([_memory_json(m) for m in rows], headers=headers)
+
+def _memory_json(m):
+    # MemoryDTO's fields, straight from the store dataclass
+    return {
+        "id": m.id, "creator_id": m.creator_id, "caption": m.caption, "hashtags": m.hashtags,
+        "performance": m.performance, "created_at": m.created_at,
+    }
+
+async def _stream_memories(creator_id, limit, after, page=1000):
+    # Own session: the request-scoped one is closed before the body is streamed.
+    # Rows are read in keyset pages, so memory stays flat regardless of `limit`.
+    db = open_db()
+    try:
+        remaining = limit
+        while remaining:
+            size = min(page, remaining)
+            rows = await db.list_memories(creator_id, size, after)
+            yield b"".join(dumps(_memory_json(m)) + b"\n" for m in rows)
+            if len(rows) < size:
+                return
+            remaining -= size
+            after = (rows[-1].created_at, rows[-1].id)
+        if await db.list_memories(creator_id, 1, after):
+            yield dumps({"next_cursor": encode_cursor(rows[-1])}) + b"\n"
+    finally:
+        await db.close()
+
+SUGGESTION_CONFLICT = "suggestion_id is already logged for another creator"
 
 @app.post(
     "/webhooks/generation",
     responses={
         200: {
-            "description": "Suggestion logged",
-            "content": {"application/json": {"example": {"ok": True}}}
+            "description": "Suggestion logged. Banned words found in it are listed (and stored in meta)",
+            "content": {
+                "application/json": {
+                    "example": {"ok": True, "violations": {"caption": ["spam"], "hashtags": []}}
+                }
+            }
         },
         404: {"description": "Creator not found"},
+        409: {"description": "suggestion_id is already logged for another creator"},
+        503: {"description": "Write-behind queue full, retry later"},
     },
 )
-def log_generation(payload: GenerationWebhookDTO, db: DB = Depends(get_db)):
-    if not db.get_creator(payload.creator_id):
+async def log_generation(payload: GenerationWebhookDTO, db: AsyncDB = Depends(get_db)):
+    # Idempotent: a retry carrying the same payload changes nothing and publishes no event
+    if not await db.get_creator(payload.creator_id):
         raise HTTPException(404, "Creator not found")
-    db.log_suggestion(
+    args, violations = _generation_args(payload, await db.get_preferences(payload.creator_id))
+    if WRITE_BEHIND:
+        owner = (await _suggestion_owners(db, [payload.suggestion_id])).get(payload.suggestion_id)
+        if owner not in (None, payload.creator_id):
+            raise HTTPException(409, SUGGESTION_CONFLICT)
+        _enqueue(writer.log_suggestion, *args)
+        return {"ok": True, "violations": violations}
+    changed = await db.log_suggestion(*args)
+    if changed is None:
+        raise HTTPException(409, SUGGESTION_CONFLICT)
+    if changed:
+        cache.invalidate(payload.creator_id)
+        hub.suggestion_logged(*args[:5])
+    return {"ok": True, "violations": violations}
+
+async def _suggestion_owners(db, sids):
+    # Write-behind only, as the queue cannot answer for the upsert: owners of the ids still queued
+    # (from its overlay) or already stored. The synchronous path learns this from the upsert itself.
+    queued = {sid: view.creator_id for sid in sids if (view := writer.get_suggestion(sid))}
+    missing = [sid for sid in sids if sid not in queued]
+    return {**(await db.suggestion_owners(missing) if missing else {}), **queued}
+
+def _generation_args(payload, prefs):
+    # log_suggestion's arguments, with banned words found in the suggestion recorded in meta
+    violations = matcher(prefs.banned_words).check(payload.suggested_caption, payload.suggested_hashtags)
+    meta = payload.meta or {}
+    if violations["caption"] or violations["hashtags"]:
+        meta = {**meta, "guardrail_violations": violations}
+    args = (
         payload.creator_id, payload.suggestion_id,
         payload.suggested_caption, payload.suggested_hashtags,
-        payload.model, payload.meta
+        payload.model, meta
     )
-    return {"ok": True}
+    return args, violations
+
+@app.post(
+    "/webhooks/generation:batch",
+    responses={
+        200: {
+            "description": (
+                "Per-suggestion results, in request order. Suggestions for known creators are logged in one "
+                "transaction per shard; retried suggestions with an unchanged payload are accepted as no-ops. "
+                "A suggestion_id already logged for another creator fails that item and leaves the stored one alone."
+            ),
+            "content": {
+                "application/json": {
+                    "example": {
+                        "logged": 1,
+                        "failed": 1,
+                        "results": [
+                            {"index": 0, "ok": True, "violations": {"caption": [], "hashtags": []}},
+                            {"index": 1, "ok": False, "error": "Creator not found"}
+                        ]
+                    }
+                }
+            }
+        },
+        503: {"description": "Write-behind queue full; the whole batch can be retried"},
+    },
+)
+async def log_generation_batch(q: GenerationWebhookBatchDTO, db: AsyncDB = Depends(get_db)):
+    # One IN query finds the creators (with their banned words), one upsert batch logs the rest
+    prefs = await db.creator_preferences([p.creator_id for p in q.suggestions])
+    # Under write-behind the owners of the ids are looked up first; the first creator to use a new id claims it
+    owners = await _suggestion_owners(db, list({p.suggestion_id for p in q.suggestions})) if WRITE_BEHIND else {}
+    results, logged = [], []
+    for index, payload in enumerate(q.suggestions):
+        if payload.creator_id not in prefs:
+            results.append({"index": index, "ok": False, "error": "Creator not found"})
+            continue
+        if WRITE_BEHIND and owners.setdefault(payload.suggestion_id, payload.creator_id) != payload.creator_id:
+            results.append({"index": index, "ok": False, "error": SUGGESTION_CONFLICT})
+            continue
+        args, violations = _generation_args(payload, prefs[payload.creator_id])
+        results.append({"index": index, "ok": True, "violations": violations})
+        logged.append((index, args))
+    if WRITE_BEHIND:
+        # Only the last of repeated suggestion_ids, as log_suggestions does
+        for args in {args[1]: args for _, args in logged}.values():
+            _enqueue(writer.log_suggestion, *args)
+    elif logged:
+        changed = await db.log_suggestions([
+            {"creator_id": cid, "suggestion_id": sid, "suggested_caption": sc,
+             "suggested_hashtags": sh, "model": model, "meta": meta} for _, (cid, sid, sc, sh, model, meta) in logged
+        ])
+        for (index, _), ch in zip(logged, changed):
+            if ch is None:
+                results[index] = {"index": index, "ok": False, "error": SUGGESTION_CONFLICT}
+        for cid in {args[0] for (_, args), ch in zip(logged, changed) if ch}:
+            cache.invalidate(cid)
+        for (_, args), ch in zip(logged, changed):
+            if ch:
+                hub.suggestion_logged(*args[:5])
+    ok = sum(r["ok"] for r in results)
+    return {"logged": ok, "failed": len(results) - ok, "results": results}
+
+def _enqueue(submit, *args):
+    try:
+        submit(*args)
+    except QueueFull:
+        raise HTTPException(503, "Write queue full", headers={"Retry-After": "1"})
 
 @app.post(
     "/feedback",
@@ -369,18 +905,32 @@ def log_generation(payload: GenerationWebhookDTO, db: DB = Depends(get_db)):
             "content": {"application/json": {"example": {"ok": True}}}
         },
         404: {"description": "Unknown suggestion_id or creator mismatch"},
+        503: {"description": "Write-behind queue full, retry later"},
     },
 )
-def submit_feedback(payload: FeedbackDTO, db: DB = Depends(get_db)):
-    log = db.get_suggestion(payload.suggestion_id)
+async def submit_feedback(payload: FeedbackDTO, db: AsyncDB = Depends(get_db)):
+    # Suggestions still waiting in the write-behind queue are visible through its overlay
+    log = ((WRITE_BEHIND and writer.get_suggestion(payload.suggestion_id))
+           or await db.get_suggestion(payload.suggestion_id, payload.creator_id))
     if not log or log.creator_id != payload.creator_id:
         raise HTTPException(404, "Unknown suggestion_id for this creator")
-    db.save_feedback(
+    if WRITE_BEHIND:
+        memory = None
+        if payload.action in ("approved", "edited"):
+            memory = (payload.creator_id, payload.final_caption or "", payload.final_hashtags or [], {})
+        _enqueue(writer.save_feedback, log, payload.action, payload.final_caption,
+                 payload.final_hashtags, payload.reason, memory)
+        return {"ok": True}
+    await db.save_feedback(
         payload.suggestion_id, payload.action,
-        payload.final_caption, payload.final_hashtags, payload.reason
+        payload.final_caption, payload.final_hashtags, payload.reason, payload.creator_id
     )
+    hub.feedback_recorded(payload.creator_id, payload.suggestion_id, payload.action,
+                          payload.final_caption, payload.final_hashtags)
     if payload.action in ("approved", "edited"):
-        db.add_memory(payload.creator_id, payload.final_caption or "", payload.final_hashtags or [], {})
+        m = await db.add_memory(payload.creator_id, payload.final_caption or "", payload.final_hashtags or [], {})
+        hub.memory_added(m.creator_id, m.id, m.caption, m.hashtags)
+    cache.invalidate(payload.creator_id)
     return {"ok": True}
 
 @app.post(
@@ -388,7 +938,11 @@ def submit_feedback(payload: FeedbackDTO, db: DB = Depends(get_db)):
     response_model=PersonalizeResultDTO,
     responses={
         200: {
-            "description": "Personalization payload for FE/B1",
+            "description": (
+                "Personalization payload for FE/B1. Tagged with an ETag (honored in `If-None-Match`) "
+                "unless `draft_caption` is set or `since_days` narrows top examples."
+            ),
+            "headers": ETAG_HEADER,
             "content": {
                 "application/json": {
                     "example": {
@@ -406,7 +960,8 @@ def submit_feedback(payload: FeedbackDTO, db: DB = Depends(get_db)):
                             {
                                 "caption": "Budget ramen hack 🍜",
                                 "hashtags": ["#ramen", "#budget"],
-                                "created_at": "2025-08-29T11:22:33.123456"
+                                "created_at": "2025-08-29T11:22:33.123456",
+                                "score": 312.0
                             }
                         ]
                     }
@@ -414,28 +969,141 @@ def submit_feedback(payload: FeedbackDTO, db: DB = Depends(get_db)):
             }
         },
         404: {"description": "Creator not found"},
+        **NOT_MODIFIED,
     },
 )
-def personalize(q: PersonalizeQueryDTO, db: DB = Depends(get_db)):
-    p = db.get_or_create_preferences(q.creator_id)
-    memories = db.list_memories(q.creator_id)
-    top_hashtags = db.top_hashtags(q.creator_id, limit=5)
+async def personalize(q: PersonalizeQueryDTO, request: Request, db: AsyncDB = Depends(get_db)):
+    # Only results that depend on stored data alone are tagged: not draft similarity, not a
+    # since_days window that moves with the clock
+    top = q.examples == "top"
+    etag = None
+    if not q.draft_caption and not (top and q.since_days):
+        etag = _etag(await db.creator_version(q.creator_id), q.examples, q.hashtags)
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    # Draft-driven results are one-off, so only the draft-less variants are cached
+    key = ("personalize", q.examples, q.since_days, q.hashtags)
+    cached = None if q.draft_caption else cache.get(q.creator_id, key)
+    if cached is not None:
+        return FastJSONResponse(cached, headers=_validators(etag))
+    version = cache.version(q.creator_id)
+    since = datetime.utcnow() - timedelta(days=q.since_days) if top and q.since_days else None
+    snap = await db.personalization_snapshot(q.creator_id, top=top, since=since, draft=q.draft_caption,
+                                             decayed=q.hashtags == "recent")
+    result = _personalize_result(q.creator_id, snap)
+    if not q.draft_caption:
+        cache.put(q.creator_id, key, result, version)
+    return FastJSONResponse(result, headers=_validators(etag))
+
+def _personalize_result(creator_id, snap):
+    p = snap.preference
+    banned = matcher(p.banned_words)
     guardrails = {
         "tone": p.tone,
         "caption_length": p.caption_length,
         "banned_words": p.banned_words,
     }
     hints = {
-        "preferred_hashtags": [h for h in top_hashtags if h not in p.banned_words],
+        "preferred_hashtags": [h for h in snap.top_hashtags if not banned.find(h)],
         "niche": p.niche,
     }
     examples = [
-        {"caption": m.caption, "hashtags": m.hashtags, "created_at": m.created_at.isoformat()}
-        for m in memories[:3]
+        {"caption": m.caption, "hashtags": m.hashtags, "created_at": m.created_at.isoformat(), "score": m.score}
+        for m in snap.examples
     ]
-    return PersonalizeResultDTO(
-        creator_id=q.creator_id, guardrails=guardrails, hints=hints, examples=examples
-    )
+    # Plain dict in PersonalizeResultDTO's shape; cached as is and shared by the batch route
+    return {"creator_id": creator_id, "guardrails": guardrails, "hints": hints, "examples": examples}
+
+@app.post(
+    "/personalize/suggestions:batch",
+    responses={
+        200: {
+            "description": (
+                "Personalization payloads keyed by creator_id (same shape as /personalize/suggestions). "
+                "Creators that could not be resolved are listed under `errors` instead."
+            ),
+            "content": {
+                "application/json": {
+                    "example": {
+                        "results": {
+                            "creator_123": {
+                                "creator_id": "creator_123",
+                                "guardrails": {"tone": "informative", "caption_length": "short", "banned_words": ["spam"]},
+                                "hints": {"preferred_hashtags": ["#ramen", "#budget"], "niche": "food-review"},
+                                "examples": [
+                                    {
+                                        "caption": "Budget ramen hack 🍜",
+                                        "hashtags": ["#ramen", "#budget"],
+                                        "created_at": "2025-08-29T11:22:33.123456",
+                                        "score": 312.0
+                                    }
+                                ]
+                            }
+                        },
+                        "errors": {"creator_999": "Creator not found"}
+                    }
+                }
+            }
+        },
+    },
+)
+async def personalize_batch(q: PersonalizeBatchQueryDTO, db: AsyncDB = Depends(get_db)):
+    # Cached creators are answered from the cache; the rest share one set of batched queries
+    key = ("personalize", q.examples, q.since_days, q.hashtags)
+    results, errors, missing, versions = {}, {}, [], {}
+    for cid in dict.fromkeys(q.creator_ids):
+        cached = cache.get(cid, key)
+        if cached is not None:
+            results[cid] = cached
+        else:
+            missing.append(cid)
+            versions[cid] = cache.version(cid)
+    if missing:
+        top = q.examples == "top"
+        since = datetime.utcnow() - timedelta(days=q.since_days) if top and q.since_days else None
+        snaps = await db.personalization_snapshots(missing, top=top, since=since, decayed=q.hashtags == "recent")
+        for cid in missing:
+            if cid not in snaps:
+                errors[cid] = "Creator not found"
+                continue
+            results[cid] = _personalize_result(cid, snaps[cid])
+            cache.put(cid, key, results[cid], versions[cid])
+    return FastJSONResponse({"results": results, "errors": errors})
+
+@app.post(
+    "/guardrails/check",
+    responses={
+        200: {
+            "description": (
+                "Banned words found in each candidate, in request order. Matching is case-insensitive "
+                "and whole-word, so `spam` flags \"Spam!\" and `#spam` but not `#spammer`."
+            ),
+            "content": {
+                "application/json": {
+                    "example": {
+                        "ok": False,
+                        "results": [
+                            {"index": 0, "ok": True, "violations": {"caption": [], "hashtags": []}},
+                            {"index": 1, "ok": False, "violations": {"caption": ["spam"], "hashtags": ["#spam"]}}
+                        ]
+                    }
+                }
+            }
+        },
+        404: {"description": "Creator not found"},
+    },
+)
+async def check_guardrails(payload: GuardrailCheckDTO, db: AsyncDB = Depends(get_db)):
+    if not await db.get_creator(payload.creator_id):
+        raise HTTPException(404, "Creator not found")
+    banned = matcher((await db.get_preferences(payload.creator_id)).banned_words)
+    results = []
+    for index, c in enumerate(payload.candidates):
+        violations = banned.check(c.caption, c.hashtags)
+        results.append({"index": index, "ok": not (violations["caption"] or violations["hashtags"]),
+                        "violations": violations})
+    return {"ok": all(r["ok"] for r in results), "results": results}
 
 @app.get(
     "/analytics/inline",
@@ -453,5 +1121,223 @@ def personalize(q: PersonalizeQueryDTO, db: DB = Depends(get_db)):
         }
     },
 )
-def inline_analytics(creator_id: str, db: DB = Depends(get_db)):
-    return db.inline_stats(creator_id)
+async def inline_analytics(creator_id: str, db: AsyncDB = Depends(get_db)):
+    cached = cache.get(creator_id, "inline")
+    if cached is not None:
+        return cached
+    version = cache.version(creator_id)
+    stats = await db.inline_stats(creator_id)
+    cache.put(creator_id, "inline", stats, version)
+    return stats
+
+@app.get(
+    "/analytics/monthly",
+    responses={
+        200: {
+            "description": (
+                "Per-month totals, newest first, over live and archived history: memories posted and their "
+                "summed engagement, and suggestion outcomes by the month they were resolved"
+            ),
+            "content": {
+                "application/json": {
+                    "example": {
+                        "creator_id": "creator_123",
+                        "months": [
+                            {
+                                "month": "2025-08", "memories": 14, "views": 52000, "likes": 4100, "comments": 230,
+                                "shares": 95, "engagement": 118.4, "score": 5305.0,
+                                "feedback": {"approved": 6, "edited": 3, "rejected": 2}
+                            }
+                        ]
+                    }
+                }
+            }
+        },
+        404: {"description": "Creator not found"},
+    },
+)
+async def monthly_analytics(
+    creator_id: str,
+    months: int = Query(12, ge=1, le=120),
+    db: AsyncDB = Depends(get_db),
+):
+    if not await db.get_creator(creator_id):
+        raise HTTPException(404, "Creator not found")
+    return {"creator_id": creator_id, "months": await db.monthly_stats(creator_id, months)}
+
+@app.get(
+    "/analytics/trending",
+    responses={
+        200: {
+            "description": (
+                "Hashtags growing fastest in the window, compared with an equally long span right before it. "
+                "`previous_uses` is prorated where that span starts partway through a bucket."
+            ),
+            "content": {
+                "application/json": {
+                    "example": {
+                        "window": "24h",
+                        "niche": "food",
+                        "hashtags": [
+                            {"hashtag": "#viral", "uses": 134, "previous_uses": 40.0, "growth_pct": 235.0},
+                            {"hashtag": "#hawker", "uses": 12, "previous_uses": 0.0, "growth_pct": None}
+                        ]
+                    }
+                }
+            }
+        }
+    },
+)
+async def trending_analytics(
+    window: Literal["1h", "24h", "7d"] = "24h",
+    niche: Optional[str] = Query(None, description="Only count creators with this preference niche"),
+    limit: int = Query(20, ge=1, le=200),
+    db: AsyncDB = Depends(get_db),
+):
+    hashtags = await db.trending_hashtags(window, niche, limit)
+    return {"window": window, "niche": niche, "hashtags": hashtags}
+
+@app.get(
+    "/hashtags/top",
+    responses={
+        200: {
+            "description": (
+                "A creator's hashtags, most used first, or with `rank=recent` by uses decayed with a half-life "
+                "of HASHTAG_HALF_LIFE_DAYS"
+            ),
+            "content": {
+                "application/json": {
+                    "example": {"creator_id": "creator_123", "rank": "recent", "hashtags": ["#ramen", "#budget"]}
+                }
+            }
+        },
+        404: {"description": "Creator not found"},
+    },
+)
+async def hashtag_top(
+    creator_id: str,
+    rank: Literal["uses", "recent"] = "uses",
+    limit: int = Query(20, ge=1, le=200),
+    db: AsyncDB = Depends(get_db),
+):
+    if not await db.get_creator(creator_id):
+        raise HTTPException(404, "Creator not found")
+    hashtags = await db.top_hashtags(creator_id, limit, decayed=rank == "recent")
+    return {"creator_id": creator_id, "rank": rank, "hashtags": hashtags}
+
+@app.get(
+    "/hashtags/creators",
+    responses={
+        200: {
+            "description": "Creators using a hashtag, most uses first",
+            "content": {
+                "application/json": {
+                    "example": [
+                        {"creator_id": "creator_123", "uses": 12, "last_used_at": "2025-08-29T11:22:33.123456"}
+                    ]
+                }
+            }
+        }
+    },
+)
+async def hashtag_creators(
+    tag: str,
+    limit: int = Query(50, ge=1, le=500),
+    since_days: Optional[int] = Query(None, ge=1, description="Only count uses in the last N days"),
+    db: AsyncDB = Depends(get_db),
+):
+    since = datetime.utcnow() - timedelta(days=since_days) if since_days else None
+    return await db.creators_using_hashtag(tag, limit, since)
+
+@app.get(
+    "/hashtags/related",
+    responses={
+        200: {
+            "description": "Hashtags most often used together with `tag`",
+            "content": {
+                "application/json": {
+                    "example": [{"hashtag": "#budget", "uses": 7}]
+                }
+            }
+        }
+    },
+)
+async def hashtag_related(
+    tag: str,
+    creator_id: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=200),
+    db: AsyncDB = Depends(get_db),
+):
+    return await db.related_hashtags(tag, creator_id, limit)
+
+# ---------------------------------------
+# Archive (opt-in reads of history moved out by `python -m app.maintenance compact`)
+# ---------------------------------------
+@app.get(
+    "/archive/memories/{creator_id}",
+    response_model=List[MemoryDTO],
+    responses={
+        200: {
+            "description": (
+                "Page of archived memories, newest first. The `X-Next-Cursor` header carries the cursor "
+                "for the next page when more rows exist."
+            ),
+            "headers": {"X-Next-Cursor": {"description": "Cursor for the next page", "schema": {"type": "string"}}},
+        },
+        400: {"description": "Invalid cursor"},
+        404: {"description": "Creator not found"},
+    },
+)
+async def archived_memories(
+    creator_id: str,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page"),
+    db: AsyncDB = Depends(get_db),
+):
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    if not await db.get_creator(creator_id):
+        raise HTTPException(404, "Creator not found")
+    rows = await db.archived_memories(creator_id, limit + 1, after)
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1])
+    return FastJSONResponse([_memory_json(m) for m in rows], headers=headers)
+
+@app.get(
+    "/archive/suggestions/{creator_id}",
+    response_model=List[ArchivedSuggestionDTO],
+    responses={
+        200: {
+            "description": (
+                "Page of archived (resolved) suggestions, most recently updated first. The `X-Next-Cursor` "
+                "header carries the cursor for the next page when more rows exist."
+            ),
+            "headers": {"X-Next-Cursor": {"description": "Cursor for the next page", "schema": {"type": "string"}}},
+        },
+        400: {"description": "Invalid cursor"},
+        404: {"description": "Creator not found"},
+    },
+)
+async def archived_suggestions(
+    creator_id: str,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page"),
+    db: AsyncDB = Depends(get_db),
+):
+    try:
+        after = decode_cursor(cursor, key=str) if cursor else None
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    if not await db.get_creator(creator_id):
+        raise HTTPException(404, "Creator not found")
+    rows = await db.archived_suggestions(creator_id, limit + 1, after)
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        headers["X-Next-Cursor"] = encode_cursor(None, last["updated_at"], last["suggestion_id"])
+    return FastJSONResponse(rows, headers=headers)
@@ -0,0 +1,134 @@
+# Run with: python -m app.maintenance <command>
+
+import argparse
+import sys
+from datetime import datetime, timedelta
+from .sharding import ShardedDB
+from .store import init_db, MIN_RETENTION_DAYS, RETENTION_DAYS
+
+def check_stats(db, args):
+    """Compare the creator_stats counters against the memories/suggestion_logs tables"""
+    drift = db.check_stats()
+    if not drift:
+        print("✅ creator_stats counters are consistent")
+        return 0
+    print(f"❌ {len(drift)} creator(s) with drifted counters (memories, approved, edited, rejected):")
+    for cid, counted, actual in drift:
+        print(f"   - {cid}: counted {counted}, actual {actual}")
+    if args.fix:
+        db.rebuild_stats()
+        print("🔧 Counters rebuilt")
+        return 0
+    return 1
+
+def rebuild_stats(db, args):
+    """Recompute creator_stats from scratch"""
+    db.rebuild_stats()
+    print("✅ creator_stats rebuilt")
+    return 0
+
+def rebuild_hashtags(db, args):
+    """Recompute the per-creator hashtag counters from scratch"""
+    db.rebuild_hashtag_counts(args.creator_id)
+    print("✅ creator_hashtags rebuilt")
+    return 0
+
+def rebuild_hashtag_index(db, args):
+    """Re-derive the hashtag dictionary and memory_hashtags join table from memories.hashtags"""
+    db.rebuild_memory_hashtags()
+    print("✅ memory_hashtags rebuilt")
+    return 0
+
+def rebuild_engagement(db, args):
+    """Re-extract the engagement columns and scores from memories.performance"""
+    db.rebuild_engagement()
+    print("✅ memory engagement scores rebuilt")
+    return 0
+
+def rebuild_search(db, args):
+    """Reindex the caption full-text search tables (run after VACUUM)"""
+    db.rebuild_search()
+    print("✅ memories_fts / suggestions_fts rebuilt")
+    return 0
+
+def optimize_search(db, args):
+    """Merge the full-text index segments after large ingests"""
+    db.optimize_search()
+    print("✅ full-text indexes optimized")
+    return 0
+
+def rebuild_vectors(db, args):
+    """Rebuild the caption similarity index files from memories"""
+    n = db.rebuild_vectors(args.creator_id)
+    print(f"✅ vector index rebuilt for {n} creator(s)")
+    return 0
+
+def rebuild_trending(db, args):
+    """Recompute the trending hashtag buckets from recent memories"""
+    db.rebuild_hashtag_buckets()
+    print("✅ hashtag_buckets rebuilt")
+    return 0
+
+def prune_trending(db, args):
+    """Delete trending buckets older than every window needs"""
+    print(f"✅ {db.prune_hashtag_buckets()} old hashtag bucket(s) deleted")
+    return 0
+
+def compact(db, args):
+    """Archive memories and resolved suggestions older than the retention horizon into monthly rollups"""
+    if args.days < MIN_RETENTION_DAYS:
+        print(f"❌ --days must be at least {MIN_RETENTION_DAYS} (the trending windows read live memories)")
+        return 2
+    before = datetime.utcnow() - timedelta(days=args.days)
+    moved = db.compact_history(before, args.batch)
+    print(f"✅ archived {moved['memories']} memories and {moved['suggestions']} suggestion(s) "
+          f"from {moved['creators']} creator(s) older than {before:%Y-%m-%d}")
+    if moved["memories"] or moved["suggestions"]:
+        db.optimize_search()
+        print("✅ full-text indexes optimized")
+    return 0
+
+COMMANDS = {
+    "check-stats": check_stats,
+    "rebuild-stats": rebuild_stats,
+    "rebuild-hashtags": rebuild_hashtags,
+    "rebuild-hashtag-index": rebuild_hashtag_index,
+    "rebuild-engagement": rebuild_engagement,
+    "rebuild-search": rebuild_search,
+    "optimize-search": optimize_search,
+    "rebuild-vectors": rebuild_vectors,
+    "rebuild-trending": rebuild_trending,
+    "prune-trending": prune_trending,
+    "compact": compact,
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.maintenance", description="Creator memory service maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("check-stats", help=check_stats.__doc__)
+    p.add_argument("--fix", action="store_true", help="rebuild the counters when drift is found")
+    sub.add_parser("rebuild-stats", help=rebuild_stats.__doc__)
+    p = sub.add_parser("rebuild-hashtags", help=rebuild_hashtags.__doc__)
+    p.add_argument("--creator-id", help="only rebuild this creator")
+    sub.add_parser("rebuild-hashtag-index", help=rebuild_hashtag_index.__doc__)
+    sub.add_parser("rebuild-engagement", help=rebuild_engagement.__doc__)
+    sub.add_parser("rebuild-search", help=rebuild_search.__doc__)
+    sub.add_parser("optimize-search", help=optimize_search.__doc__)
+    p = sub.add_parser("rebuild-vectors", help=rebuild_vectors.__doc__)
+    p.add_argument("--creator-id", help="only rebuild this creator")
+    sub.add_parser("rebuild-trending", help=rebuild_trending.__doc__)
+    sub.add_parser("prune-trending", help=prune_trending.__doc__)
+    p = sub.add_parser("compact", help=compact.__doc__)
+    p.add_argument("--days", type=int, default=RETENTION_DAYS, help=f"retention horizon (default {RETENTION_DAYS})")
+    p.add_argument("--batch", type=int, default=5000, help="rows moved per transaction")
+    args = parser.parse_args(argv)
+
+    init_db()
+    db = ShardedDB()
+    try:
+        return COMMANDS[args.command](db, args)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+import bisect, contextvars, inspect, os, threading, time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from functools import lru_cache, wraps
+from typing import List, Optional
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+# On by default: a request costs one lock acquisition plus two clock reads per SQL statement.
+METRICS = os.getenv("METRICS", "1") == "1"
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+POOL_BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+UNMATCHED = "unmatched"    # route label for 404s, so unknown paths cannot blow up label cardinality
+BACKGROUND = "background"  # route label for SQL outside any request (write-behind thread, startup)
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds, self.counts, self.sum, self.count = bounds, [0] * (len(bounds) + 1), 0.0, 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+@dataclass
+class RequestTimings:
+    statements: List[float] = field(default_factory=list)
+    handler_done: Optional[float] = None
+
+    @property
+    def db(self):
+        return sum(self.statements)
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+class Metrics:
+    """Process-wide request, SQL and connection pool metrics in Prometheus text format.
+
+    SQL statements are buffered on the request's RequestTimings and folded in once the response
+    is finished, so they are labelled with the matched route template and the registry lock is
+    taken once per request rather than once per statement.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)  # (method, route, status) -> count
+        self.latency = {}                 # (method, route) -> Histogram
+        self.statements = defaultdict(int)  # route -> count
+        self.sql = {}                     # route -> Histogram of statement durations
+        self.pool_wait = {}               # pool label -> Histogram of checkout waits
+        self.pools = {}                   # pool label -> most recent pool, for the gauges
+
+    def observe_request(self, method, route, status, seconds, statements=()):
+        with self._lock:
+            self.requests[(method, route, status)] += 1
+            self._histogram(self.latency, (method, route), LATENCY_BUCKETS).observe(seconds)
+            if statements:
+                self._observe_sql(route, statements)
+
+    def observe_statement(self, route, seconds):
+        with self._lock:
+            self._observe_sql(route, (seconds,))
+
+    def observe_checkout(self, label, pool, seconds):
+        with self._lock:
+            self.pools[label] = pool
+            self._histogram(self.pool_wait, label, POOL_BUCKETS).observe(seconds)
+
+    def _observe_sql(self, route, statements):
+        self.statements[route] += len(statements)
+        h = self._histogram(self.sql, route, SQL_BUCKETS)
+        for s in statements:
+            h.observe(s)
+
+    @staticmethod
+    def _histogram(table, key, bounds):
+        h = table.get(key)
+        if h is None:
+            h = table[key] = Histogram(bounds)
+        return h
+
+    def render(self):
+        out = []
+        with self._lock:
+            _family(out, "http_requests_total", "counter", "HTTP responses by route and status",
+                    [(dict(method=m, route=r, status=str(s)), n) for (m, r, s), n in sorted(self.requests.items())])
+            _histograms(out, "http_request_duration_seconds", "Time from request to last response byte",
+                        [(dict(method=m, route=r), h) for (m, r), h in sorted(self.latency.items())])
+            _family(out, "db_statements_total", "counter", "SQL statements executed, by route",
+                    [(dict(route=r), n) for r, n in sorted(self.statements.items())])
+            _histograms(out, "db_statement_duration_seconds", "SQL statement execution time, by route",
+                        [(dict(route=r), h) for r, h in sorted(self.sql.items())])
+            _histograms(out, "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection",
+                        [(dict(pool=p), h) for p, h in sorted(self.pool_wait.items())])
+            pools = sorted(self.pools.items())
+        _family(out, "db_pool_checked_out", "gauge", "Connections currently checked out",
+                [(dict(pool=p), pool.checkedout()) for p, pool in pools if hasattr(pool, "checkedout")])
+        _family(out, "db_pool_size", "gauge", "Configured pool size",
+                [(dict(pool=p), pool.size()) for p, pool in pools if hasattr(pool, "size")])
+        return "\n".join(out) + "\n"
+
+def _labels(labels):
+    esc = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in labels.items()) + "}"
+
+def _family(out, name, kind, doc, samples):
+    out += [f"# HELP {name} {doc}", f"# TYPE {name} {kind}"]
+    out += [f"{name}{_labels(labels)} {value}" for labels, value in samples]
+
+def _histograms(out, name, doc, samples):
+    out += [f"# HELP {name} {doc}", f"# TYPE {name} histogram"]
+    for labels, h in samples:
+        cumulative = 0
+        for bound, n in zip(h.bounds + (float("inf"),), h.counts):
+            cumulative += n
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            out.append(f"{name}_bucket{_labels({**labels, 'le': le})} {cumulative}")
+        out += [f"{name}_sum{_labels(labels)} {h.sum}", f"{name}_count{_labels(labels)} {h.count}"]
+
+metrics = Metrics()
+
+# ---------------------------------------
+# SQL and pool hooks
+# ---------------------------------------
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["metrics_start"].pop()
+    timings = _current.get()
+    if timings is not None:
+        timings.statements.append(seconds)
+    else:
+        metrics.observe_statement(BACKGROUND, seconds)
+
+def _handle_error(ctx):
+    # A statement that raised never reaches after_cursor_execute
+    starts = ctx.connection.info.get("metrics_start") if ctx.connection is not None and ctx.cursor is not None else None
+    if starts:
+        starts.pop()
+
+def instrument(engine):
+    # `engine` is a sync Engine; for an AsyncEngine pass its .sync_engine
+    if METRICS:
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+    return engine
+
+@lru_cache(maxsize=None)
+def timed_pool(base, label):
+    # Pool subclass that times checkouts. A subclass rather than a patched instance, because
+    # engine.dispose() replaces the pool with a fresh instance of the same class.
+    if not METRICS:
+        return base
+
+    class TimedPool(base):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                metrics.observe_checkout(label, self, time.perf_counter() - start)
+
+    TimedPool.__name__ = TimedPool.__qualname__ = f"Timed{base.__name__}"
+    return TimedPool
+
+# ---------------------------------------
+# Request hooks
+# ---------------------------------------
+def _mark_handler_done():
+    timings = _current.get()
+    if timings is not None:
+        timings.handler_done = time.perf_counter()
+
+def _timed(endpoint):
+    if inspect.iscoroutinefunction(endpoint):
+        @wraps(endpoint)
+        async def timed(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                _mark_handler_done()
+    else:
+        @wraps(endpoint)
+        def timed(*args, **kwargs):
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                _mark_handler_done()
+    return timed
+
+class TimedRoute(APIRoute):
+    """APIRoute that notes when the endpoint returns, so Server-Timing can split out the time
+    FastAPI spends validating and serializing the result."""
+
+    def __init__(self, path, endpoint, **kwargs):
+        if METRICS:
+            endpoint = _timed(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: per-route latency and status counts, plus a Server-Timing header.
+
+    Server-Timing is written with the response headers, so for streamed responses it covers
+    the work done before the first byte; the histograms cover the whole response.
+    """
+
+    def __init__(self, app, registry=metrics):
+        self.app, self.registry = app, registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        timings = RequestTimings()
+        token = _current.set(timings)
+        status = 500
+
+        async def send_timed(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                now = time.perf_counter()
+                parts = [f'db;dur={timings.db * 1000:.2f};desc="{len(timings.statements)} queries"']
+                if timings.handler_done is not None:
+                    parts.append(f"serialize;dur={(now - timings.handler_done) * 1000:.2f}")
+                parts.append(f"total;dur={(now - start) * 1000:.2f}")
+                MutableHeaders(scope=message).append("Server-Timing", ", ".join(parts))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", UNMATCHED)
+            self.registry.observe_request(scope["method"], route, status, time.perf_counter() - start,
+                                          timings.statements)
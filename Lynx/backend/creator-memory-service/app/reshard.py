@@ -0,0 +1,132 @@
+# Run with (service stopped): python -m app.reshard --to 4
+#
+# Offline rebalancing after changing the shard count. Every creator whose shard differs under the
+# new count is moved, a batch of creators per transaction, by ATTACHing its current shard file to
+# the new shard's writer connection and copying its rows table by table. Memory ids are handed out
+# afresh on the destination (they are only unique within a shard). Tables that mix creators (the
+# hashtag dictionary and trending buckets) are re-derived instead of copied. A batch interrupted
+# half-way is copied again on the next run, so the tool can simply be rerun.
+
+import argparse, sys, time
+from . import store
+from .sharding import HashRing
+from .vectors import vector_index
+
+# Rows keyed by creator, copied as-is (with the column naming the creator)
+COPIED = {"creators": "id", "preferences": "creator_id", "suggestion_logs": "creator_id",
+          "creator_hashtags": "creator_id", "creator_stats": "creator_id", "suggestion_logs_archive": "creator_id",
+          "creator_monthly_rollups": "creator_id", "creator_monthly_hashtags": "creator_id"}
+# Rows whose integer id is renumbered past every id already used on the destination
+RENUMBERED = ("memories_archive", "memories")
+# Every table holding a creator's rows on the source shard
+OWNED = {**COPIED, **dict.fromkeys(RENUMBERED, "creator_id"), "memory_hashtags": "creator_id",
+         "creator_versions": "creator_id"}
+
+def _moving(col="creator_id"):
+    return f"{col} IN (SELECT creator_id FROM temp.moving)"
+
+def _columns(table):
+    return [c.name for c in store.Base.metadata.tables[table].columns]
+
+def _creators(shard):
+    # Every creator with rows on the shard, including ones that only have history
+    with shard.read_engine.connect() as c:
+        return [r[0] for r in c.exec_driver_sql(
+            " UNION ".join(f"SELECT {col} FROM {t}" for t, col in OWNED.items()))]
+
+def _move(src, dst, cids):
+    with dst.engine.connect() as c:
+        c.exec_driver_sql("ATTACH DATABASE ? AS src", (src.engine.url.database,))
+        try:
+            with c.begin():
+                c.exec_driver_sql("CREATE TEMP TABLE IF NOT EXISTS moving (creator_id TEXT PRIMARY KEY)")
+                c.exec_driver_sql("DELETE FROM temp.moving")
+                c.exec_driver_sql("INSERT INTO temp.moving VALUES (?)", [(cid,) for cid in cids])
+                # Leftovers of an interrupted earlier run are replaced
+                for t, col in OWNED.items():
+                    c.exec_driver_sql(f"DELETE FROM main.{t} WHERE {_moving(col)}")
+                for t, col in COPIED.items():
+                    cols = ", ".join(_columns(t))
+                    c.exec_driver_sql(f"INSERT INTO main.{t} ({cols}) SELECT {cols} FROM src.{t} "
+                                      f"WHERE {_moving(col)}")
+                # Bumped, so ETags issued by the old shard never match again
+                c.exec_driver_sql("INSERT INTO main.creator_versions (creator_id, version) "
+                                  f"SELECT creator_id, version + 1 FROM src.creator_versions WHERE {_moving()}")
+                base = c.exec_driver_sql("SELECT max(coalesce((SELECT max(id) FROM main.memories), 0), "
+                                         "coalesce((SELECT max(id) FROM main.memories_archive), 0))").scalar()
+                for t in RENUMBERED:
+                    cols = [x for x in _columns(t) if x != "id"]
+                    moved = c.exec_driver_sql(
+                        f"INSERT INTO main.{t} (id, {', '.join(cols)}) SELECT ? + row_number() OVER (ORDER BY id), "
+                        f"{', '.join(cols)} FROM src.{t} WHERE {_moving()}", (base,)).rowcount
+                    base += max(moved, 0)
+                c.exec_driver_sql("INSERT OR IGNORE INTO main.hashtags (tag) SELECT DISTINCT j.value "
+                                  f"FROM main.memories m, json_each(m.hashtags) j WHERE j.type = 'text' AND {_moving('m.creator_id')}")
+                c.exec_driver_sql(
+                    "INSERT OR IGNORE INTO main.memory_hashtags (memory_id, hashtag_id, creator_id, created_at) "
+                    "SELECT m.id, h.id, m.creator_id, m.created_at FROM main.memories m, json_each(m.hashtags) j "
+                    f"JOIN main.hashtags h ON h.tag = j.value WHERE j.type = 'text' AND {_moving('m.creator_id')}")
+                for t, col in OWNED.items():
+                    c.exec_driver_sql(f"DELETE FROM src.{t} WHERE {_moving(col)}")
+        finally:
+            c.exec_driver_sql("DETACH DATABASE src")
+
+def reshard(old, new, batch=500, dry_run=False, log=print):
+    new_ring = HashRing(new)
+    shards = [store.Shard(i, store.shard_url(store.DB_URL, i)) for i in range(max(old, new))]
+    if not dry_run:
+        store.init_db(shards)
+    moves, total = {}, 0
+    for src in shards[:old]:
+        cids = _creators(src)
+        total += len(cids)
+        for cid in cids:
+            dst = new_ring.shard(cid)
+            if dst != src.index:
+                moves.setdefault((src.index, dst), []).append(cid)
+    moved = sum(len(cids) for cids in moves.values())
+    log(f"🔀 {moved:,} of {total:,} creators change shard ({old} -> {new} shards)")
+    for (s, d), cids in sorted(moves.items()):
+        log(f"   - shard {s} -> shard {d}: {len(cids):,} creators")
+    if dry_run or not moves:
+        return {"creators": total, "moved": moved}
+    started = time.perf_counter()
+    for (s, d), cids in sorted(moves.items()):
+        for i in range(0, len(cids), batch):
+            _move(shards[s], shards[d], cids[i:i + batch])
+            for cid in cids[i:i + batch]:
+                vector_index.drop(cid)  # memory ids changed; rebuilt on next use
+        log(f"   … shard {s} -> shard {d} done ({time.perf_counter() - started:.1f}s)")
+    log("🔧 Rebuilding trending buckets and full-text indexes")
+    for shard in shards:
+        db = store.DB(shard=shard)
+        try:
+            db.rebuild_hashtag_buckets()
+            db.optimize_search()
+        finally:
+            db.session.close()
+    for shard in shards:
+        shard.engine.dispose()
+        shard.read_engine.dispose()
+    if new < old:
+        log("🗑️ now empty: " + ", ".join(shard.url for shard in shards[new:]))
+    return {"creators": total, "moved": moved, "seconds": round(time.perf_counter() - started, 1)}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.reshard",
+                                     description="Move creators between shard files after changing DB_SHARDS")
+    parser.add_argument("--from", dest="old", type=int, default=store.DB_SHARDS,
+                        help=f"current shard count (default DB_SHARDS={store.DB_SHARDS})")
+    parser.add_argument("--to", dest="new", type=int, required=True, help="new shard count")
+    parser.add_argument("--batch", type=int, default=500, help="creators moved per transaction")
+    parser.add_argument("--dry-run", action="store_true", help="only report how many creators would move")
+    args = parser.parse_args(argv)
+    if args.old < 1 or args.new < 1:
+        parser.error("shard counts must be at least 1")
+    result = reshard(args.old, args.new, args.batch, args.dry_run)
+    if not args.dry_run:
+        print(f"✅ {result['moved']:,} creators moved; restart the service with DB_SHARDS={args.new}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
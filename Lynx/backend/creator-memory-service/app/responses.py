@@ -0,0 +1,30 @@
+import json
+from datetime import date, datetime
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder produces the same JSON, just slower
+    orjson = None
+
+def _default(obj):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(content):
+    # Compact UTF-8 JSON bytes; datetimes as ISO 8601 like FastAPI's own encoder
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode()
+
+class FastJSONResponse(JSONResponse):
+    """JSON response for payloads built from trusted store data.
+
+    Routes return it directly, so FastAPI skips response_model validation and its encoder;
+    response_model still documents the shape in the OpenAPI schema. Content must already be
+    plain dicts, lists and scalars (datetimes allowed).
+    """
+
+    def render(self, content):
+        return dumps(content)
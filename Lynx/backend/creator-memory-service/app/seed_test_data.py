@@ -3,7 +3,10 @@
 
 import json
 from datetime import datetime, timedelta, timezone
-from .store import init_db, DB, MemoryORM  # ✅ keep a single import of MemoryORM
+from .vectors import vector_index
+from .sharding import ShardedDB, shard_for
+from .store import (init_db, DB, SHARDS, MemoryORM, MemoryHashtagORM, HashtagCountORM, HashtagBucketORM, CreatorStatsORM,  # ✅ keep a single import of MemoryORM
+                    MemoryArchiveORM, SuggestionArchiveORM, CreatorRollupORM, HashtagRollupORM)
 
 def clear_database():
     """Clear all existing data from the database"""
@@ -11,19 +14,33 @@ def clear_database():
     
     # Initialize database
     init_db()
-    db = DB()
-    
+    for shard in SHARDS:
+        clear_shard(shard)
+    vector_index.clear()  # memory ids restart once the table is emptied
+    print("✅ Database cleared successfully!")
+
+def clear_shard(shard):
+    db = DB(shard=shard)
+
     try:
         # Clear all tables (assuming you have these ORM models)
         # Adjust table names based on your actual ORM models
         db.session.query(MemoryORM).delete()
+        db.session.query(MemoryHashtagORM).delete()
+        db.session.query(HashtagCountORM).delete()
+        db.session.query(HashtagBucketORM).delete()
+        db.session.query(CreatorStatsORM).delete()
+        # Archived history and its monthly rollups feed the same counters and analytics
+        db.session.query(MemoryArchiveORM).delete()
+        db.session.query(SuggestionArchiveORM).delete()
+        db.session.query(CreatorRollupORM).delete()
+        db.session.query(HashtagRollupORM).delete()
         
         # If you have other tables, clear them too:
         # db.session.query(CreatorORM).delete()
         # db.session.query(PreferencesORM).delete()
         
-        db.session.commit()
-        print("✅ Database cleared successfully!")
+        db.bump_versions()  # commits; invalidates cached ETags of the emptied creators
         
     except Exception as e:
         print(f"❌ Error clearing database: {e}")
@@ -41,7 +58,7 @@ def seed_test_data():
 
     # Initialize database
     init_db()
-    db = DB()
+    db = ShardedDB()
 
     try:
         # 1. Create test creators
@@ -253,14 +270,23 @@ def seed_test_data():
                 created_at=created_at
             )
 
-            db.session.add(memory_orm)
+            db.shard(shard_for(memory['creator_id'])).session.add(memory_orm)
 
             # Calculate what the trend score will be (purely informational)
             days_ago = memory['days_ago']
             trend_score = max(50, 100 - days_ago * 2)
             print(f"✅ Added memory: '{memory['caption'][:40]}...' ({days_ago}d ago, trend: {trend_score}%)")
 
-        db.session.commit()  # single commit
+        for i in range(len(SHARDS)):
+            db.shard(i).session.commit()  # single commit per shard
+
+        # Rows above bypass add_memory, so derive the hashtag tables and stats counters in one pass
+        db.rebuild_engagement()
+        db.rebuild_hashtag_counts()
+        db.rebuild_memory_hashtags()
+        db.rebuild_hashtag_buckets()
+        db.rebuild_stats()
+        db.rebuild_vectors()
 
         # 4. Show summary
         print("\n📊 Summary:")
@@ -292,9 +318,9 @@ def seed_test_data():
         traceback.print_exc()
 
     finally:
-        # Close session if it exists
+        # Close sessions if they exist
         try:
-            db.session.close()
+            db.close()
         except Exception:
             pass
 
@@ -0,0 +1,221 @@
+import bisect, hashlib, inspect, os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from .store import DB, SHARDS, rank_trending
+
+# Creator-sharded storage. Every DB method is scoped by creator except a few global reads and the
+# maintenance rebuilds; ROUTES says, per method, which shard(s) to call and how to merge results.
+RING_REPLICAS = int(os.getenv("DB_SHARD_REPLICAS", "128"))  # virtual nodes per shard
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+class HashRing:
+    """Consistent hash ring mapping creator ids to shard indexes.
+
+    Each shard owns `replicas` points on the ring and a creator belongs to the first point after
+    its hash, so going from N to N+1 shards only moves about 1/(N+1) of the creators, all of them
+    onto the new shard.
+    """
+
+    def __init__(self, shards, replicas=RING_REPLICAS):
+        points = sorted((_hash(f"shard-{i}#{r}"), i) for i in range(shards) for r in range(replicas))
+        self._keys, self._owners = [k for k, _ in points], [i for _, i in points]
+        self.size = shards
+
+    def shard(self, cid):
+        if self.size == 1:
+            return 0
+        return self._owners[bisect.bisect(self._keys, _hash(cid)) % len(self._keys)]
+
+ring = HashRing(len(SHARDS))
+shard_for = lru_cache(maxsize=1 << 16)(ring.shard)
+
+_executor = ThreadPoolExecutor(max_workers=len(SHARDS), thread_name_prefix="shard") if len(SHARDS) > 1 else None
+
+def fan_out(calls):
+    # Runs zero-argument callables, one per shard, in parallel; results in call order
+    if len(calls) <= 1:
+        return [call() for call in calls]
+    return list(_executor.map(lambda call: call(), calls))
+
+# ---- routes: (method, params) -> ([(shard, method, params)], merge of the per-shard results) ----
+# Merges are built from the call's params, so they can apply the caller's limit after combining.
+def _only(p):
+    return lambda results: results[0]
+
+def _nothing(p):
+    return lambda results: None
+
+def _total(p):
+    return lambda results: sum(results)
+
+def _creator(param):
+    def route(name, p):
+        return [(shard_for(p[param]), name, p)], _only(p)
+    return route
+
+def _everywhere(merge, **overrides):
+    def route(name, p):
+        return [(i, name, {**p, **overrides}) for i in range(len(SHARDS))], merge(p)
+    return route
+
+def _creator_or_everywhere(param, merge, **overrides):
+    # Routed when the creator is given, fanned out when it is None
+    def route(name, p):
+        if p[param] is not None:
+            return _creator(param)(name, p)
+        return _everywhere(merge, **overrides)(name, p)
+    return route
+
+def _split(param, merge, key=lambda x: x):
+    # A list of creator ids (or rows keyed by one) split into one call per shard
+    def route(name, p):
+        items, parts = list(p[param]), {}
+        for pos, item in enumerate(items):
+            parts.setdefault(shard_for(key(item)), []).append(pos)
+        calls = [(i, name, {**p, param: [items[pos] for pos in positions]}) for i, positions in parts.items()]
+        return calls, merge(p, list(parts.values()))
+    return route
+
+def _union(p, parts):
+    return lambda results: set().union(*results)
+
+def _joined(p, parts):
+    return lambda results: {k: v for r in results for k, v in r.items()}
+
+def _in_order(p, parts):
+    # add_memories / log_suggestions: per-item results back in input order
+    def merge(results):
+        ids = [None] * sum(map(len, parts))
+        for positions, part in zip(parts, results):
+            for pos, mid in zip(positions, part):
+                ids[pos] = mid
+        return ids
+    return merge
+
+def _tally(p):
+    # Per-shard counts of the same tag add up; re-ranked and cut to the caller's limit
+    def merge(results):
+        total = Counter()
+        for rows in results:
+            for r in rows:
+                total[r["hashtag"]] += r["uses"]
+        return [{"hashtag": h, "uses": n} for h, n in total.most_common(p["limit"])]
+    return merge
+
+def _top_creators(p):
+    # Shards own disjoint creators, so each shard's top-N holds the global top-N
+    return lambda results: sorted((r for rows in results for r in rows), key=lambda r: -r["uses"])[:p["limit"]]
+
+def _window_counts(p):
+    def merge(results):
+        total = {}
+        for counts in results:
+            for tag, (uses, prev) in counts.items():
+                u, v = total.get(tag, (0, 0))
+                total[tag] = (u + uses, v + prev)
+        return total
+    return merge
+
+def _trending(name, p):
+    # Window counts are summed across shards before ranking, so a tag used on several shards ranks once
+    counts = {k: v for k, v in p.items() if k != "limit"}
+    total = _window_counts(p)
+    return ([(i, "trending_counts", counts) for i in range(len(SHARDS))],
+            lambda results: rank_trending(total(results), p["limit"]))
+
+def _first_found(p):
+    return lambda results: next((r for r in results if r is not None), None)
+
+def _drift(p):
+    return lambda results: sorted((d for rows in results for d in rows), key=lambda d: d[0])
+
+def _moved(p):
+    return lambda results: {k: sum(r[k] for r in results) for k in results[0]}
+
+ROUTES = {
+    **{name: _creator("id") for name in ("upsert_creator", "get_creator")},
+    **{name: _creator("cid") for name in (
+        "get_preferences", "get_or_create_preferences", "update_preferences", "add_memory", "list_memories",
+        "top_memories", "similar_memories", "top_hashtags", "personalization_snapshot", "log_suggestion",
+        "creator_version", "inline_stats", "aggregate_stats", "search_captions", "archived_memories",
+        "archived_suggestions", "monthly_stats")},
+    "existing_creators": _split("ids", _union),
+    "creator_preferences": _split("cids", _joined),
+    # Suggestion ids are looked up on every shard: a reused id may sit on another creator's shard
+    "suggestion_owners": _everywhere(lambda p: _joined(p, None)),
+    "personalization_snapshots": _split("cids", _joined),
+    **{name: _split("items", _in_order, key=lambda it: it["creator_id"]) for name in ("add_memories", "log_suggestions")},
+    "get_suggestion": _creator_or_everywhere("cid", _first_found),
+    "save_feedback": _creator_or_everywhere("cid", _nothing),
+    "hashtag_usage": _creator_or_everywhere("cid", _tally, limit=None),
+    "related_hashtags": _creator_or_everywhere("cid", _tally, limit=None),
+    "creators_using_hashtag": _everywhere(_top_creators),
+    "trending_hashtags": _trending,
+    "trending_counts": _everywhere(_window_counts),
+    "rebuild_vectors": _creator_or_everywhere("cid", _total),
+    "rebuild_hashtag_counts": _creator_or_everywhere("cid", _nothing),
+    "bump_versions": _creator_or_everywhere("cid", _nothing),
+    "prune_hashtag_buckets": _everywhere(_total),
+    "check_stats": _everywhere(_drift),
+    "compact_history": _everywhere(_moved),
+    **{name: _everywhere(_nothing) for name in (
+        "rebuild_engagement", "rebuild_memory_hashtags", "rebuild_hashtag_buckets", "rebuild_stats",
+        "rebuild_search", "optimize_search")},
+}
+
+_SIGNATURES = {name: inspect.signature(getattr(DB, name)) for name in ROUTES}
+
+def plan(name, args, kwargs):
+    """Shard calls for one DB operation: ([(shard index, method, kwargs)], merge of their results)."""
+    if len(SHARDS) == 1:
+        return None
+    route = ROUTES.get(name)
+    if route is None:
+        raise AttributeError(f"DB.{name} has no shard route")
+    bound = _SIGNATURES[name].bind(None, *args, **kwargs)
+    bound.apply_defaults()
+    params = dict(bound.arguments)
+    del params["self"]
+    return route(name, params)
+
+class ShardedDB:
+    """Synchronous store.DB over every shard, for scripts and background threads.
+
+    Calls go to the shard owning the creator; global ones run on every shard in parallel and
+    their results are merged. A transaction spanning shards is not atomic, so callers that batch
+    writes (the write-behind queue) group them per shard first.
+    """
+
+    def __init__(self, readonly=False):
+        self.readonly = readonly
+        self._dbs = {}
+
+    def shard(self, index):
+        if index not in self._dbs:
+            self._dbs[index] = DB(readonly=self.readonly, shard=SHARDS[index])
+        return self._dbs[index]
+
+    def __getattr__(self, name):
+        op = getattr(DB, name)
+        def call(*args, **kwargs):
+            planned = plan(name, args, kwargs)
+            if planned is None:
+                return self._run(0, op, args, kwargs)
+            calls, merge = planned
+            return merge(fan_out([lambda i=i, m=m, p=p: self._run(i, getattr(DB, m), (), p) for i, m, p in calls]))
+        return call
+
+    def _run(self, index, op, args, kwargs):
+        # Like async_store: every call ends its transaction, so no shard's writer stays checked out
+        db = self.shard(index)
+        try:
+            return op(db, *args, **kwargs)
+        finally:
+            db.session.rollback()
+
+    def close(self):
+        for db in self._dbs.values():
+            db.session.close()
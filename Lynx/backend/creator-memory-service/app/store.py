@@ -1,17 +1,173 @@
 from typing import List, Optional, Dict
-from dataclasses import dataclass
-from datetime import datetime
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
 from collections import Counter
-import json, os
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text
+from contextlib import contextmanager
+import base64, json, logging, math, os, re, sys
+from sqlalchemy import create_engine, event, and_, bindparam, case, func, inspect, or_, select, text, union_all, Column, Integer, String, DateTime, Text, Float, Index
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import aliased, sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
+from .metrics import instrument, timed_pool
+from .vectors import VECTOR_INDEX, vector_index
+try:
+    from orjson import loads as json_loads  # optional, same result as json.loads and several times faster
+except ImportError:
+    json_loads = json.loads
+
+log = logging.getLogger(__name__)
 
 DB_URL = os.getenv("DB_URL", "sqlite:///./b2.sqlite3")
-engine = create_engine(DB_URL, connect_args={"check_same_thread": False} if DB_URL.startswith("sqlite") else {})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Serve /analytics/inline from the creator_stats counters instead of aggregating the tables
+STATS_COUNTERS = os.getenv("STATS_COUNTERS", "1") == "1"
+FEEDBACK_STATUSES = ("approved","edited","rejected")
 Base = declarative_base()
 
+@dataclass
+class StorageProfile:
+    journal_mode: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    synchronous: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    cache_size: int = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))  # negative = KiB, so 64 MiB
+    mmap_size: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    busy_timeout: int = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))  # ms
+    temp_store: str = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+
+STORAGE_PROFILE = StorageProfile()
+READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))
+WRITER_TIMEOUT = float(os.getenv("SQLITE_WRITER_TIMEOUT", "30"))  # seconds to wait for the writer connection
+
+def configure_sqlite(sync_engine, readonly=False, profile=STORAGE_PROFILE):
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_conn, _):
+        cur=dbapi_conn.cursor()
+        for name,value in asdict(profile).items(): cur.execute(f"PRAGMA {name}={value}")
+        if readonly: cur.execute("PRAGMA query_only=ON")
+        cur.close()
+        if hasattr(dbapi_conn,"create_function"):
+            dbapi_conn.create_function("hashtag_log_weight", 1, _hashtag_log_weight_sql, deterministic=True)
+            dbapi_conn.create_function("log2_add", 2, log2_add, deterministic=True)
+            # Also builtins when SQLite has its math functions compiled in, which is not guaranteed
+            dbapi_conn.create_function("log2", 1, _log2_sql, deterministic=True)
+            dbapi_conn.create_function("exp2", 1, _exp2_sql, deterministic=True)
+
+def is_file_sqlite(url):
+    return url.startswith("sqlite") and not url.split("?")[0].rstrip("/").endswith((":memory:","sqlite:"))
+
+def make_engines(url):
+    # One writer connection that every write serializes through, plus a pool of read-only
+    # connections. In-memory and non-SQLite URLs get a single shared engine.
+    if not url.startswith("sqlite"):
+        e=instrument(create_engine(url)); return e,e
+    args={"check_same_thread": False}
+    if not is_file_sqlite(url):
+        e=instrument(create_engine(url,connect_args=args,poolclass=StaticPool)); configure_sqlite(e); return e,e
+    writer=create_engine(url,connect_args=args,poolclass=timed_pool(QueuePool,"writer"),pool_size=1,max_overflow=0,
+                         pool_timeout=WRITER_TIMEOUT)
+    reader=create_engine(url,connect_args=args,poolclass=timed_pool(QueuePool,"reader"),pool_size=READ_POOL_SIZE,
+                         max_overflow=0)
+    configure_sqlite(writer); configure_sqlite(reader,readonly=True)
+    return instrument(writer),instrument(reader)
+
+def storage_report():
+    report={"profile":asdict(STORAGE_PROFILE),"shards":len(SHARDS),"split":read_engine is not engine,
+            "read_pool_size":READ_POOL_SIZE if read_engine is not engine else None}
+    if engine.dialect.name=="sqlite":
+        with read_engine.connect() as c:
+            report["effective"]={k:c.exec_driver_sql(f"PRAGMA {k}").scalar() for k in asdict(STORAGE_PROFILE)}
+    return report
+
+# Hashtag scores decay with this half-life. Weights are referenced to a fixed epoch, so a stored
+# score only ever grows and ranking by it equals ranking by the decayed score at any instant.
+# The weight doubles every half-life and would overflow a float within decades (within a year
+# at a half-life of two days), so scores are kept as log2 and summed with log2_add.
+HASHTAG_HALF_LIFE_DAYS = float(os.getenv("HASHTAG_HALF_LIFE_DAYS", "14"))
+DECAY_EPOCH = datetime(2020, 1, 1)
+
+def hashtag_log_weight(ts):
+    return (ts.replace(tzinfo=None) - DECAY_EPOCH).total_seconds() / (HASHTAG_HALF_LIFE_DAYS * 86400)
+
+def log2_add(a, b):
+    # log2(2**a + 2**b) without leaving log space; None stands for an empty sum
+    if a is None or b is None: return b if a is None else a
+    hi,lo=max(a,b),min(a,b)
+    return hi+math.log2(1.0+2.0**(lo-hi))
+
+def _hashtag_log_weight_sql(ts):
+    return hashtag_log_weight(datetime.fromisoformat(ts)) if ts else None
+
+def _log2_sql(x):
+    return math.log2(x) if x is not None and x>0 else None
+
+def _exp2_sql(x):
+    try: return 2.0**x if x is not None else None
+    except OverflowError: return None
+
+# log2 of sum(2**log_score) over a group, where `top` is max(log_score) over the same group
+# (a window column): every term is at most 1, so nothing overflows
+_LOG2_SUM = "max(top) + log2(sum(exp2(log_score - top)))"
+
+# Engagement score = weighted sum of the interaction counts pulled out of Memory.performance
+ENGAGEMENT_WEIGHTS = {"views": 0.01, "likes": 1.0, "comments": 2.0, "shares": 3.0}
+
+# Counts above this are dropped: past 2**53 integers are no longer exact as floats, and a month of
+# them could overflow SQLite's integer sum() in the rollups
+MAX_METRIC = 2**53
+
+def engagement_columns(performance):
+    # Typed copies of the well-known performance metrics. Anything non-numeric, negative, NaN/inf or
+    # too large becomes NULL; the raw performance JSON keeps whatever was sent.
+    perf=performance if isinstance(performance,dict) else {}
+    def num(k,limit):
+        v=perf.get(k)
+        if isinstance(v,bool) or not isinstance(v,(int,float)): return None
+        return v if 0<=v<=limit else None  # NaN fails both comparisons
+    cols={k:None if num(k,MAX_METRIC) is None else int(num(k,MAX_METRIC)) for k in ENGAGEMENT_WEIGHTS}
+    cols["engagement"]=None if num("engagement",sys.float_info.max) is None else float(num("engagement",sys.float_info.max))
+    cols["score"]=sum(w*(cols[k] or 0) for k,w in ENGAGEMENT_WEIGHTS.items())
+    return cols
+
+# Trending windows: name -> (window length, bucket width), both in seconds. Each window is compared
+# with the one right before it, so buckets older than two windows are never read again.
+TRENDING_WINDOWS = {"1h": (3600, 300), "24h": (86400, 3600), "7d": (7 * 86400, 86400)}
+ALL_NICHES = ""
+
+# Retention: memories and resolved suggestion logs older than this many days are moved to the
+# archive tables by `python -m app.maintenance compact`, leaving monthly rollups behind. The
+# horizon must cover the trending windows, which are rebuilt from live memories.
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "180"))
+MIN_RETENTION_DAYS = max(2 * span for span, _ in TRENDING_WINDOWS.values()) // 86400
+
+def epoch_seconds(ts):
+    return int((ts.replace(tzinfo=None) - datetime(1970, 1, 1)).total_seconds())
+
+# Creators are spread over DB_SHARDS SQLite files (see app.sharding), each with its own writer
+# connection. Shard 0 is DB_URL itself, so a single-shard deployment is laid out as before.
+DB_SHARDS = int(os.getenv("DB_SHARDS", "1"))
+
+def shard_url(url,index):
+    # sqlite:///./b2.sqlite3 -> sqlite:///./b2.shard1.sqlite3 for shard 1
+    if index==0: return url
+    if not is_file_sqlite(url): raise ValueError(f"sharding needs file-backed SQLite URLs, got {url!r}")
+    path,sep,query=url.partition("?"); head,dot,ext=path.rpartition(".")
+    if "/" in ext or not dot: head,ext=path,""
+    return f"{head}.shard{index}"+(f".{ext}" if ext else "")+sep+query
+
+class Shard:
+    def __init__(self,index,url):
+        self.index,self.url=index,url
+        self.engine,self.read_engine=make_engines(url)
+        self.SessionLocal=sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.ReadSessionLocal=sessionmaker(autocommit=False, autoflush=False, bind=self.read_engine)
+
+    def __repr__(self):
+        return f"Shard({self.index}, {self.url!r})"
+
+SHARDS = [Shard(i, shard_url(DB_URL, i)) for i in range(DB_SHARDS)]
+engine, read_engine = SHARDS[0].engine, SHARDS[0].read_engine
+SessionLocal, ReadSessionLocal = SHARDS[0].SessionLocal, SHARDS[0].ReadSessionLocal
+
 class CreatorORM(Base):
     __tablename__ = "creators"
     id = Column(String, primary_key=True)
@@ -35,6 +191,54 @@ class MemoryORM(Base):
     hashtags = Column(Text, default="[]")
     performance = Column(Text, default="{}")
     created_at = Column(DateTime, default=datetime.utcnow)
+    views = Column(Integer, nullable=True)
+    likes = Column(Integer, nullable=True)
+    comments = Column(Integer, nullable=True)
+    shares = Column(Integer, nullable=True)
+    engagement = Column(Float, nullable=True)
+    score = Column(Float, default=0.0, nullable=False)
+    __table_args__ = (
+        Index("ix_memories_creator_created", "creator_id", created_at.desc(), "id"),
+        Index("ix_memories_creator_score", "creator_id", score.desc(), created_at.desc()),
+    )
+
+class HashtagORM(Base):
+    __tablename__ = "hashtags"
+    id = Column(Integer, primary_key=True)
+    tag = Column(String, nullable=False, unique=True)
+
+class MemoryHashtagORM(Base):
+    __tablename__ = "memory_hashtags"
+    memory_id = Column(Integer, primary_key=True)
+    hashtag_id = Column(Integer, primary_key=True)
+    creator_id = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    __table_args__ = (
+        Index("ix_memory_hashtags_tag_creator", "hashtag_id", "creator_id"),
+        Index("ix_memory_hashtags_creator_tag", "creator_id", "hashtag_id"),
+        Index("ix_memory_hashtags_tag_created", "hashtag_id", "created_at"),
+    )
+
+class HashtagCountORM(Base):
+    __tablename__ = "creator_hashtags"
+    creator_id = Column(String, primary_key=True)
+    hashtag = Column(String, primary_key=True)
+    uses = Column(Integer, default=0, nullable=False)
+    log_score = Column(Float, default=0.0, nullable=False)  # log2 of the decayed score, see hashtag_log_weight
+    last_used_at = Column(DateTime, nullable=True)
+    __table_args__ = (
+        Index("ix_creator_hashtags_uses", "creator_id", "uses"),
+        Index("ix_creator_hashtags_log_score", "creator_id", "log_score"),
+    )
+
+class HashtagBucketORM(Base):
+    # Per-bucket hashtag uses across all creators (niche "") and per creator niche
+    __tablename__ = "hashtag_buckets"
+    width = Column(Integer, primary_key=True)
+    niche = Column(String, primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    hashtag = Column(String, primary_key=True)
+    uses = Column(Integer, default=0, nullable=False)
 
 class SuggestionLogORM(Base):
     __tablename__ = "suggestion_logs"
@@ -50,34 +254,263 @@ class SuggestionLogORM(Base):
     reason = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (Index("ix_suggestion_logs_creator_status", "creator_id", "status"),)
+
+class CreatorStatsORM(Base):
+    __tablename__ = "creator_stats"
+    creator_id = Column(String, primary_key=True)
+    memories = Column(Integer, default=0, nullable=False)
+    approved = Column(Integer, default=0, nullable=False)
+    edited = Column(Integer, default=0, nullable=False)
+    rejected = Column(Integer, default=0, nullable=False)
+
+class MemoryArchiveORM(Base):
+    # Same columns as memories, plus when the row was moved here
+    __tablename__ = "memories_archive"
+    id = Column(Integer, primary_key=True)
+    creator_id = Column(String, nullable=False)
+    caption = Column(Text, default="")
+    hashtags = Column(Text, default="[]")
+    performance = Column(Text, default="{}")
+    created_at = Column(DateTime)
+    views = Column(Integer, nullable=True)
+    likes = Column(Integer, nullable=True)
+    comments = Column(Integer, nullable=True)
+    shares = Column(Integer, nullable=True)
+    engagement = Column(Float, nullable=True)
+    score = Column(Float, default=0.0, nullable=False)
+    archived_at = Column(DateTime, nullable=False)
+    __table_args__ = (Index("ix_memories_archive_creator_created", "creator_id", created_at.desc(), "id"),)
+
+class SuggestionArchiveORM(Base):
+    # Same columns as suggestion_logs, plus when the row was moved here
+    __tablename__ = "suggestion_logs_archive"
+    suggestion_id = Column(String, primary_key=True)
+    creator_id = Column(String, nullable=False)
+    suggested_caption = Column(Text, nullable=True)
+    suggested_hashtags = Column(Text, default="[]")
+    model = Column(String, default="gpt")
+    meta = Column(Text, default="{}")
+    status = Column(String, nullable=False)
+    final_caption = Column(Text, nullable=True)
+    final_hashtags = Column(Text, default="[]")
+    reason = Column(Text, nullable=True)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime, nullable=False)
+    __table_args__ = (Index("ix_suggestion_logs_archive_creator_updated", "creator_id", updated_at.desc(), "suggestion_id"),)
+
+class CreatorRollupORM(Base):
+    # Per creator and calendar month ("YYYY-MM") totals of the archived rows: memories by
+    # created_at, suggestion outcomes by updated_at
+    __tablename__ = "creator_monthly_rollups"
+    creator_id = Column(String, primary_key=True)
+    month = Column(String, primary_key=True)
+    memories = Column(Integer, default=0, nullable=False)
+    views = Column(Integer, default=0, nullable=False)
+    likes = Column(Integer, default=0, nullable=False)
+    comments = Column(Integer, default=0, nullable=False)
+    shares = Column(Integer, default=0, nullable=False)
+    engagement = Column(Float, default=0.0, nullable=False)  # sum of the per-memory engagement values
+    score = Column(Float, default=0.0, nullable=False)
+    approved = Column(Integer, default=0, nullable=False)
+    edited = Column(Integer, default=0, nullable=False)
+    rejected = Column(Integer, default=0, nullable=False)
+
+class HashtagRollupORM(Base):
+    # Archived hashtag uses per creator and month. `uses` counts occurrences (as creator_hashtags
+    # does), `memories` the memories carrying the tag (as memory_hashtags does).
+    __tablename__ = "creator_monthly_hashtags"
+    creator_id = Column(String, primary_key=True)
+    month = Column(String, primary_key=True)
+    hashtag = Column(String, primary_key=True)
+    uses = Column(Integer, default=0, nullable=False)
+    memories = Column(Integer, default=0, nullable=False)
+    log_score = Column(Float, default=0.0, nullable=False)
+    last_used_at = Column(DateTime, nullable=True)
+    __table_args__ = (Index("ix_creator_monthly_hashtags_tag", "hashtag", "month"),)
+
+class CreatorVersionORM(Base):
+    # Bumped in the same transaction as every write that touches a creator; never reset, so it
+    # can be served as a strong ETag
+    __tablename__ = "creator_versions"
+    creator_id = Column(String, primary_key=True)
+    version = Column(Integer, default=1, nullable=False)
 
 @dataclass
 class Creator: id: str; username: Optional[str]; locale: str; timezone: str
 @dataclass
 class Preference: tone: str; caption_length: str; niche: Optional[str]; banned_words: List[str]
 @dataclass
-class Memory: id: int; creator_id: str; caption: str; hashtags: List[str]; performance: Dict; created_at: datetime
+class Memory: id: int; creator_id: str; caption: str; hashtags: List[str]; performance: Dict; created_at: datetime; score: float = 0.0
+@dataclass
+class Suggestion: suggestion_id: str; creator_id: str; status: str; suggested_caption: Optional[str]; suggested_hashtags: List[str]; final_caption: Optional[str]; final_hashtags: List[str]
+@dataclass
+class Snapshot: preference: Preference; examples: List[Memory]; top_hashtags: List[str]
+
+def _preference(p):
+    if not p: return Preference("friendly","short",None,[])
+    return Preference(p.tone,p.caption_length,p.niche,json_loads(p.banned_words or "[]"))
+
+# Columns a generation webhook sets; comparing them tells a retry from a new payload
+SUGGESTION_PAYLOAD=("suggested_caption","suggested_hashtags","model","meta")
+
+def _suggestion_row(cid,sid,sc,sh,model,meta,now):
+    return {"suggestion_id":sid,"creator_id":cid,"suggested_caption":sc,"suggested_hashtags":json.dumps(sh or []),
+            "model":model,"meta":json.dumps(meta or {}),"created_at":now,"updated_at":now}
+
+def encode_cursor(m,ts=None,key=None):
+    # Position after m: (created_at, id) by default, or an explicit (timestamp, key) pair
+    raw=json.dumps([(ts or m.created_at).isoformat(),m.id if key is None else key]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor,key=int):
+    # Opaque (created_at, id) keyset position; raises ValueError on anything malformed
+    try:
+        ts,mid=json.loads(base64.urlsafe_b64decode(cursor+"="*(-len(cursor)%4)))
+        return datetime.fromisoformat(ts),key(mid)
+    except Exception as e:
+        raise ValueError("invalid cursor") from e
+
+# Full-text search over memory captions and final suggestion captions. Both FTS5 tables use
+# external content (the text lives only in the source table) and are kept in sync by triggers,
+# so every write path, ORM or bulk Core insert, is indexed. creator_id is an indexed column so
+# a creator scope is part of the MATCH rather than a post-filter; it gets zero weight in bm25.
+SEARCH_SNIPPET = ("<mark>", "</mark>", "…", 12)
+
+_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS memories_fts USING fts5(caption, creator_id, content='memories', "
+    "content_rowid='id', prefix='2 3', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS memories_fts_ai AFTER INSERT ON memories BEGIN "
+    "INSERT INTO memories_fts(rowid, caption, creator_id) VALUES (new.id, new.caption, new.creator_id); END",
+    "CREATE TRIGGER IF NOT EXISTS memories_fts_ad AFTER DELETE ON memories BEGIN "
+    "INSERT INTO memories_fts(memories_fts, rowid, caption, creator_id) VALUES ('delete', old.id, old.caption, old.creator_id); END",
+    "CREATE TRIGGER IF NOT EXISTS memories_fts_au AFTER UPDATE OF caption, creator_id ON memories BEGIN "
+    "INSERT INTO memories_fts(memories_fts, rowid, caption, creator_id) VALUES ('delete', old.id, old.caption, old.creator_id); "
+    "INSERT INTO memories_fts(rowid, caption, creator_id) VALUES (new.id, new.caption, new.creator_id); END",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS suggestions_fts USING fts5(final_caption, creator_id, content='suggestion_logs', "
+    "prefix='2 3', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS suggestions_fts_ai AFTER INSERT ON suggestion_logs BEGIN "
+    "INSERT INTO suggestions_fts(rowid, final_caption, creator_id) VALUES (new.rowid, new.final_caption, new.creator_id); END",
+    "CREATE TRIGGER IF NOT EXISTS suggestions_fts_ad AFTER DELETE ON suggestion_logs BEGIN "
+    "INSERT INTO suggestions_fts(suggestions_fts, rowid, final_caption, creator_id) "
+    "VALUES ('delete', old.rowid, old.final_caption, old.creator_id); END",
+    "CREATE TRIGGER IF NOT EXISTS suggestions_fts_au AFTER UPDATE OF final_caption, creator_id ON suggestion_logs BEGIN "
+    "INSERT INTO suggestions_fts(suggestions_fts, rowid, final_caption, creator_id) "
+    "VALUES ('delete', old.rowid, old.final_caption, old.creator_id); "
+    "INSERT INTO suggestions_fts(rowid, final_caption, creator_id) VALUES (new.rowid, new.final_caption, new.creator_id); END",
+]
+
+_SEARCH_SQL = {
+    "memories": (
+        "SELECT 'memory' AS source, m.id AS id, m.caption AS caption, "
+        "snippet(memories_fts, 0, :open, :close, :ellipsis, :tokens) AS snippet, m.hashtags AS hashtags, "
+        "m.created_at AS created_at, bm25(memories_fts, 1.0, 0.0) AS rank "
+        "FROM memories_fts JOIN memories m ON m.id = memories_fts.rowid "
+        "WHERE memories_fts MATCH :memories AND m.creator_id = :cid"),
+    "suggestions": (
+        "SELECT 'suggestion' AS source, s.suggestion_id AS id, s.final_caption AS caption, "
+        "snippet(suggestions_fts, 0, :open, :close, :ellipsis, :tokens) AS snippet, s.final_hashtags AS hashtags, "
+        "s.updated_at AS created_at, bm25(suggestions_fts, 1.0, 0.0) AS rank "
+        "FROM suggestions_fts JOIN suggestion_logs s ON s.rowid = suggestions_fts.rowid "
+        "WHERE suggestions_fts MATCH :suggestions AND s.creator_id = :cid"),
+}
+
+def fts_query(q, cid, column):
+    # Free text -> FTS5 expression: every word must appear (the last one as a prefix, for
+    # search-as-you-type), scoped to the creator. Raises ValueError when nothing is searchable.
+    terms=re.findall(r"\w+",q or "")
+    if not terms: raise ValueError("empty search query")
+    expr=" ".join(f'"{t}"' for t in terms[:-1])+f' "{terms[-1]}"*'
+    owner=re.findall(r"\w+",cid)
+    return (f'creator_id : "{" ".join(owner)}" AND ' if owner else "")+f"{column} : ({expr.strip()})"
+
+# Reads select these columns rather than whole MemoryORM entities: plain rows skip the ORM's
+# identity map and instance state, which is most of the cost of loading a page of memories.
+MEMORY_COLUMNS = (MemoryORM.id, MemoryORM.creator_id, MemoryORM.caption, MemoryORM.hashtags, MemoryORM.performance,
+                  MemoryORM.created_at, MemoryORM.score)
+
+ARCHIVE_COLUMNS = tuple(getattr(MemoryArchiveORM,c.key) for c in MEMORY_COLUMNS)
+
+def _json_int(s):
+    # Integers orjson can write stay ints; larger ones become floats, as orjson.loads itself reads them
+    n=int(s)
+    return n if -2**63<=n<2**64 else float(n)
+
+def _performance(raw):
+    # Stored as sent, so it may hold NaN/Infinity (which orjson rejects); those read back as null
+    try:
+        return json_loads(raw or "{}")
+    except ValueError:
+        return json.loads(raw,parse_constant=lambda c: None,parse_int=_json_int)
+
+def _memory(r):
+    return Memory(r.id,r.creator_id,r.caption,json_loads(r.hashtags or "[]"),_performance(r.performance),r.created_at,r.score or 0.0)
 
 class DB:
-    def __init__(self):
-        self.session = SessionLocal()
+    # Operations that never write; the async facades run them on the read-only pool
+    READ_OPS = frozenset({"get_creator","get_preferences","existing_creators","creator_preferences","list_memories","top_memories",
+                          "similar_memories","search_captions","top_hashtags","personalization_snapshot",
+                          "personalization_snapshots","get_suggestion","suggestion_owners","inline_stats","aggregate_stats",
+                          "creators_using_hashtag","hashtag_usage","related_hashtags","trending_hashtags",
+                          "creator_version","archived_memories","archived_suggestions","monthly_stats",
+                          "trending_counts"})
+
+    def __init__(self, session=None, readonly=False, shard=None):
+        # One shard's tables; app.sharding routes each call to the shard owning the creator
+        shard=shard or SHARDS[0]
+        self.session = session or (shard.ReadSessionLocal if readonly else shard.SessionLocal)()
+        self._depth = 0
+        self._pending = []  # _after_commit callbacks waiting for the outermost commit
+
+    @contextmanager
+    def transaction(self):
+        # Groups several write operations into one commit; nested blocks join the outer one
+        self._depth+=1
+        try:
+            yield self
+        except BaseException:
+            self._depth-=1
+            if not self._depth: self._pending.clear(); self.session.rollback()
+            raise
+        self._depth-=1
+        if self._depth: return
+        try: self.session.commit()
+        except BaseException: self._pending.clear(); raise
+        pending,self._pending=self._pending,[]
+        for fn,args in pending: fn(*args)
+
+    def _commit(self):
+        if self._depth: self.session.flush()
+        else: self.session.commit()
+
+    def _after_commit(self,fn,*args):
+        # Side effects outside the database (the vector index) must only see committed rows: inside
+        # transaction() they wait for the outermost commit and are dropped on rollback
+        if self._depth: self._pending.append((fn,args))
+        else: fn(*args)
 
     def upsert_creator(self, id, username, locale, timezone):
-        s=self.session; obj=s.query(CreatorORM).get(id)
-        if not obj:
-            obj=CreatorORM(id=id, username=username, locale=locale, timezone=timezone); s.add(obj)
-        else:
-            obj.username, obj.locale, obj.timezone = username, locale, timezone
-        s.commit(); return Creator(obj.id,obj.username,obj.locale,obj.timezone)
+        # One statement; re-sending the same profile matches no row, so the version (and ETag) stay put
+        t=CreatorORM.__table__; stmt=sqlite_insert(t).values(id=id,username=username,locale=locale,timezone=timezone)
+        cols={k:stmt.excluded[k] for k in ("username","locale","timezone")}
+        stmt=stmt.on_conflict_do_update(index_elements=[t.c.id],set_=cols,
+                                        where=or_(*(t.c[k].is_distinct_from(v) for k,v in cols.items())))
+        if self.session.execute(stmt).rowcount: self._bump_version(id)
+        self._commit(); return Creator(id,username,locale,timezone)
 
     def get_creator(self,id):
         s=self.session; obj=s.query(CreatorORM).get(id)
         return Creator(obj.id,obj.username,obj.locale,obj.timezone) if obj else None
 
+    def get_preferences(self,cid):
+        # Read-only variant: defaults when the creator has none yet
+        return _preference(self.session.query(PreferenceORM).get(cid))
+
     def get_or_create_preferences(self,cid):
         s=self.session; p=s.query(PreferenceORM).get(cid)
-        if not p: p=PreferenceORM(creator_id=cid); s.add(p); s.commit()
-        return Preference(p.tone,p.caption_length,p.niche,json.loads(p.banned_words or "[]"))
+        if not p: p=PreferenceORM(creator_id=cid); s.add(p); self._commit()
+        return _preference(p)
 
     def update_preferences(self,cid,patch):
         s=self.session; p=s.query(PreferenceORM).get(cid)
@@ -85,57 +518,673 @@ class DB:
         for k,v in patch.items():
             if v is None: continue
             setattr(p,k,json.dumps(v) if k=="banned_words" else v)
-        s.commit(); return p
+        self._bump_version(cid); self._commit(); return _preference(p)
 
     def add_memory(self,cid,caption,hashtags,performance):
-        s=self.session; m=MemoryORM(creator_id=cid,caption=caption or "",
-            hashtags=json.dumps(hashtags or []), performance=json.dumps(performance or {}))
-        s.add(m); s.commit()
-        return Memory(m.id,m.creator_id,m.caption,json.loads(m.hashtags),json.loads(m.performance),m.created_at)
+        s=self.session; now=datetime.utcnow(); m=MemoryORM(creator_id=cid,caption=caption or "",
+            hashtags=json.dumps(hashtags or []), performance=json.dumps(performance or {}),created_at=now,
+            **engagement_columns(performance))
+        s.add(m); s.flush(); self._count_hashtags(Counter((cid,h) for h in hashtags or []),now)
+        self._link_hashtags([(m.id,cid,now,hashtags or [])])
+        self._bucket_hashtags(Counter((cid,h) for h in hashtags or []),now)
+        self._bump_stats(cid,memories=1); self._bump_version(cid); self._commit()
+        if VECTOR_INDEX: self._after_commit(vector_index.add,cid,[(m.id,m.caption)])
+        return _memory(m)
+
+    def existing_creators(self,ids):
+        ids=list(set(ids))
+        if not ids: return set()
+        return {r.id for r in self.session.query(CreatorORM.id).filter(CreatorORM.id.in_(ids))}
+
+    def suggestion_owners(self,sids):
+        # {suggestion_id: creator_id} for the suggestions logged on this shard, one IN query
+        ids=list(set(sids))
+        if not ids: return {}
+        return dict(self.session.query(SuggestionLogORM.suggestion_id,SuggestionLogORM.creator_id)
+                    .filter(SuggestionLogORM.suggestion_id.in_(ids)))
+
+    def creator_preferences(self,cids):
+        # {creator_id: Preference} for the creators that exist (defaults when they have none), one IN query
+        ids=list(set(cids))
+        if not ids: return {}
+        rows=self.session.query(CreatorORM.id,PreferenceORM).outerjoin(PreferenceORM,PreferenceORM.creator_id==CreatorORM.id)\
+            .filter(CreatorORM.id.in_(ids))
+        return {cid:_preference(p) for cid,p in rows}
+
+    def add_memories(self,items):
+        # items: dicts with creator_id/caption/hashtags/performance; one executemany + one commit.
+        # Ids are assigned here, past every live and archived one. The version bumps come first so
+        # the write lock is held from the max(id) lookup until the commit.
+        if not items: return []
+        s=self.session; now=datetime.utcnow(); per=Counter(it["creator_id"] for it in items)
+        self._bump_version(*per)
+        base=max(s.query(func.max(MemoryORM.id)).scalar() or 0,s.query(func.max(MemoryArchiveORM.id)).scalar() or 0)
+        ids=list(range(base+1,base+len(items)+1))
+        rows=[{"id":mid,"creator_id":it["creator_id"],"caption":it.get("caption") or "",
+               "hashtags":json.dumps(it.get("hashtags") or []),"performance":json.dumps(it.get("performance") or {}),
+               "created_at":now,**engagement_columns(it.get("performance"))} for mid,it in zip(ids,items)]
+        s.execute(MemoryORM.__table__.insert(),rows)
+        self._count_hashtags(Counter((it["creator_id"],h) for it in items for h in it.get("hashtags") or []),now)
+        self._link_hashtags([(mid,it["creator_id"],now,it.get("hashtags") or []) for mid,it in zip(ids,items)])
+        self._bucket_hashtags(Counter((it["creator_id"],h) for it in items for h in it.get("hashtags") or []),now)
+        for cid,n in per.items(): self._bump_stats(cid,memories=n)
+        self._commit()
+        if VECTOR_INDEX:
+            by_creator={}
+            for row in rows: by_creator.setdefault(row["creator_id"],[]).append((row["id"],row["caption"]))
+            for cid,vecs in by_creator.items(): self._after_commit(vector_index.add,cid,vecs)
+        return ids
+
+    def list_memories(self,cid,limit=50,after=None):
+        # Newest first, keyset-paged on (created_at DESC, id) to match ix_memories_creator_created
+        s=self.session; q=s.query(*MEMORY_COLUMNS).filter(MemoryORM.creator_id==cid)
+        if after:
+            ts,mid=after
+            q=q.filter(or_(MemoryORM.created_at<ts,and_(MemoryORM.created_at==ts,MemoryORM.id>mid)))
+        rows=q.order_by(MemoryORM.created_at.desc(),MemoryORM.id).limit(limit).all()
+        return [_memory(r) for r in rows]
+
+    def top_memories(self,cid,limit=3,since=None):
+        # Best-scoring memories, optionally only those created after `since`. Walks ix_memories_creator_score;
+        # with a narrow `since` SQLite may prefer the created_at range of ix_memories_creator_created instead.
+        q=self.session.query(*MEMORY_COLUMNS).filter(MemoryORM.creator_id==cid)
+        if since: q=q.filter(MemoryORM.created_at>=since)
+        rows=q.order_by(MemoryORM.score.desc(),MemoryORM.created_at.desc(),MemoryORM.id).limit(limit).all()
+        return [_memory(r) for r in rows]
 
-    def list_memories(self,cid):
+    def similar_memories(self,cid,text,limit=3):
+        # Memories whose captions are closest to `text` (cosine over the creator's vector index)
+        hits=vector_index.search(cid,[text],limit*2,lambda: self._captions(cid))[0]
+        ids=list(dict.fromkeys(mid for mid,_ in hits))
+        rows={r.id:r for r in self.session.query(*MEMORY_COLUMNS).filter(MemoryORM.id.in_(ids),MemoryORM.creator_id==cid)}
+        return [_memory(rows[mid]) for mid in ids if mid in rows][:limit]
+
+    def _captions(self,cid):
+        q=self.session.query(MemoryORM.id,MemoryORM.caption).filter(MemoryORM.creator_id==cid).order_by(MemoryORM.id)
+        return ((r.id,r.caption) for r in q.yield_per(10000))
+
+    def rebuild_vectors(self,cid=None):
+        cids=[cid] if cid else [r[0] for r in self.session.query(MemoryORM.creator_id).distinct()]
+        for c in cids: vector_index.build(c,self._captions(c))
+        self.session.rollback()
+        return len(cids)
+
+    def rebuild_engagement(self):
+        # Re-extract the engagement columns from the performance JSON
         s=self.session
-        rows=s.query(MemoryORM).filter(MemoryORM.creator_id==cid).order_by(MemoryORM.created_at.desc()).limit(50).all()
-        return [Memory(r.id,r.creator_id,r.caption,json.loads(r.hashtags or "[]"),
-                       json.loads(r.performance or "{}"),r.created_at) for r in rows]
+        # Same rules as engagement_columns: 9e999 in the JSON is read as Inf, which fails the upper bound
+        metric=lambda k,cast,limit: (f"CASE WHEN json_type(performance, '$.{k}') IN ('integer', 'real') "
+                                     f"AND json_extract(performance, '$.{k}') BETWEEN 0 AND {limit} "
+                                     f"THEN CAST(json_extract(performance, '$.{k}') AS {cast}) END")
+        cols=[f"{k} = {metric(k,'INTEGER',MAX_METRIC)}" for k in ENGAGEMENT_WEIGHTS]+\
+             [f"engagement = {metric('engagement','REAL',repr(sys.float_info.max))}"]
+        s.execute(text("UPDATE memories SET "+", ".join(cols)+" WHERE json_valid(performance)"))
+        s.execute(text("UPDATE memories SET views = NULL, likes = NULL, comments = NULL, shares = NULL, engagement = NULL "
+                       "WHERE NOT json_valid(coalesce(performance, ''))"))
+        s.execute(text("UPDATE memories SET score = "+" + ".join(f"coalesce({k}, 0) * {w}" for k,w in ENGAGEMENT_WEIGHTS.items())))
+        self.bump_versions()
 
-    def top_hashtags(self,cid,limit=5):
-        tags=[]; [tags.extend(m.hashtags) for m in self.list_memories(cid)]
-        return [t for t,_ in Counter(tags).most_common(limit)]
+    def _count_hashtags(self,counts,ts):
+        # counts: Counter keyed by (creator_id, hashtag)
+        if not counts: return
+        t=HashtagCountORM.__table__; lw=hashtag_log_weight(ts); stmt=sqlite_insert(t)
+        stmt=stmt.on_conflict_do_update(index_elements=[t.c.creator_id,t.c.hashtag],set_={
+            "uses":t.c.uses+stmt.excluded.uses, "log_score":func.log2_add(t.c.log_score,stmt.excluded.log_score),
+            "last_used_at":func.max(t.c.last_used_at,stmt.excluded.last_used_at)})
+        self.session.execute(stmt,[{"creator_id":cid,"hashtag":h,"uses":n,"log_score":lw+math.log2(n),"last_used_at":ts}
+                                   for (cid,h),n in counts.items()])
 
-    def log_suggestion(self,cid,sid,sc,sh,model,meta):
-        s=self.session; row=s.query(SuggestionLogORM).get(sid)
-        if not row:
-            row=SuggestionLogORM(suggestion_id=sid,creator_id=cid,suggested_caption=sc,
-                                 suggested_hashtags=json.dumps(sh or []),model=model,meta=json.dumps(meta or {}))
-            s.add(row)
-        else:
-            row.suggested_caption=sc
-            row.suggested_hashtags=json.dumps(sh or [])
-            row.model=model
-            row.meta=json.dumps(meta or {})
-            row.updated_at=datetime.utcnow()
+    def hashtag_ids(self,tags):
+        # tag -> id from the hashtag dictionary, inserting unseen tags
+        tags=list({t for t in tags if isinstance(t,str)})
+        if not tags: return {}
+        s=self.session; t=HashtagORM.__table__
+        s.execute(sqlite_insert(t).on_conflict_do_nothing(index_elements=[t.c.tag]),[{"tag":x} for x in tags])
+        ids={}
+        for i in range(0,len(tags),500):
+            ids.update((r.tag,r.id) for r in s.execute(select(t.c.tag,t.c.id).where(t.c.tag.in_(tags[i:i+500]))))
+        return ids
+
+    def _link_hashtags(self,memories):
+        # memories: (memory_id, creator_id, created_at, hashtags)
+        ids=self.hashtag_ids(h for _,_,_,tags in memories for h in tags)
+        rows=[{"memory_id":mid,"hashtag_id":ids[h],"creator_id":cid,"created_at":ts}
+              for mid,cid,ts,tags in memories for h in set(tags) if h in ids]
+        if rows:
+            self.session.execute(sqlite_insert(MemoryHashtagORM.__table__).on_conflict_do_nothing(),rows)
+
+    def creators_using_hashtag(self,tag,limit=50,since=None):
+        # Live uses from memory_hashtags plus archived ones from the monthly rollups
+        mh,r=MemoryHashtagORM,HashtagRollupORM
+        live=select(mh.creator_id,func.count().label("uses"),func.max(mh.created_at).label("last_used_at"))\
+            .join(HashtagORM,HashtagORM.id==mh.hashtag_id).where(HashtagORM.tag==tag)
+        if since: live=live.where(mh.created_at>=since)
+        old=select(r.creator_id,r.memories,r.last_used_at).where(r.hashtag==tag)
+        if since: old=old.where(r.month>=_first_full_month(since))
+        u=union_all(live.group_by(mh.creator_id),old).subquery()
+        rows=self.session.query(u.c.creator_id,func.sum(u.c.uses).label("uses"),func.max(u.c.last_used_at).label("last_used_at"))\
+            .group_by(u.c.creator_id).order_by(func.sum(u.c.uses).desc()).limit(limit).all()
+        return [{"creator_id":r.creator_id,"uses":r.uses,"last_used_at":r.last_used_at} for r in rows]
+
+    def hashtag_usage(self,cid=None,since=None,limit=20):
+        # Most used tags for one creator (or everyone) within an optional time window, archive included
+        mh,r=MemoryHashtagORM,HashtagRollupORM
+        live=select(HashtagORM.tag.label("tag"),func.count().label("uses")).join(mh,mh.hashtag_id==HashtagORM.id)
+        old=select(r.hashtag,r.memories)
+        if cid: live,old=live.where(mh.creator_id==cid),old.where(r.creator_id==cid)
+        if since: live,old=live.where(mh.created_at>=since),old.where(r.month>=_first_full_month(since))
+        u=union_all(live.group_by(HashtagORM.tag),old).subquery()
+        rows=self.session.query(u.c.tag,func.sum(u.c.uses).label("uses")).group_by(u.c.tag)\
+            .order_by(func.sum(u.c.uses).desc()).limit(limit).all()
+        return [{"hashtag":r.tag,"uses":r.uses} for r in rows]
+
+    def related_hashtags(self,tag,cid=None,limit=20):
+        # Tags that co-occur with `tag` on the same memory (live memories only: rollups lose co-occurrence)
+        a,b=aliased(MemoryHashtagORM),aliased(MemoryHashtagORM)
+        q=self.session.query(HashtagORM.tag,func.count().label("uses"))\
+            .select_from(a).join(b,and_(b.memory_id==a.memory_id,b.hashtag_id!=a.hashtag_id))\
+            .join(HashtagORM,HashtagORM.id==b.hashtag_id)\
+            .filter(a.hashtag_id==select(HashtagORM.id).where(HashtagORM.tag==tag).scalar_subquery())
+        if cid: q=q.filter(a.creator_id==cid)
+        rows=q.group_by(HashtagORM.tag).order_by(func.count().desc()).limit(limit).all()
+        return [{"hashtag":r.tag,"uses":r.uses} for r in rows]
+
+    def rebuild_memory_hashtags(self):
+        s=self.session; s.query(MemoryHashtagORM).delete(synchronize_session=False)
+        s.execute(text(
+            "INSERT OR IGNORE INTO hashtags (tag) SELECT DISTINCT j.value "
+            "FROM memories m, json_each(m.hashtags) j WHERE j.type = 'text'"))
+        s.execute(text(
+            "INSERT OR IGNORE INTO memory_hashtags (memory_id, hashtag_id, creator_id, created_at) "
+            "SELECT m.id, h.id, m.creator_id, m.created_at "
+            "FROM memories m, json_each(m.hashtags) j JOIN hashtags h ON h.tag = j.value WHERE j.type = 'text'"))
+        s.commit()
+
+    def _niches(self,cids):
+        rows=self.session.query(PreferenceORM.creator_id,PreferenceORM.niche)\
+            .filter(PreferenceORM.creator_id.in_(list(cids)),PreferenceORM.niche.isnot(None)).all()
+        return {r.creator_id:r.niche.strip().lower() for r in rows if r.niche.strip()}
+
+    def _bucket_hashtags(self,counts,ts):
+        # counts: Counter keyed by (creator_id, hashtag); one upsert row per window width and niche
+        if not counts: return
+        niches=self._niches({cid for cid,_ in counts}); per=Counter()
+        for (cid,h),n in counts.items():
+            per[(ALL_NICHES,h)]+=n
+            if cid in niches: per[(niches[cid],h)]+=n
+        t=HashtagBucketORM.__table__; stmt=sqlite_insert(t); now=epoch_seconds(ts)
+        stmt=stmt.on_conflict_do_update(index_elements=[t.c.width,t.c.niche,t.c.bucket,t.c.hashtag],
+                                        set_={"uses":t.c.uses+stmt.excluded.uses})
+        self.session.execute(stmt,[{"width":w,"niche":niche,"bucket":now//w*w,"hashtag":h,"uses":n}
+                                   for _,w in TRENDING_WINDOWS.values() for (niche,h),n in per.items()])
+
+    def trending_hashtags(self,window="24h",niche=None,limit=20,now=None):
+        return rank_trending(self.trending_counts(window,niche,now),limit)
+
+    def trending_counts(self,window="24h",niche=None,now=None):
+        # {hashtag: (uses in the current window, uses in the previous one)}. The current window is
+        # the last span/width buckets including the one in progress, so it is only a fraction f of a
+        # bucket into its newest one; the previous window is the same length right before it: n-1
+        # full buckets plus the last f of the one before those, assuming uses spread evenly over a
+        # bucket. Counts from several shards add up.
+        span,w=TRENDING_WINDOWS[window]; n=span//w; now=epoch_seconds(now or datetime.utcnow())
+        f=(now%w)/w; cur=now//w*w-(n-1)*w; prev=cur-(n-1)*w; edge=prev-w
+        b=HashtagBucketORM; recent=func.sum(case((b.bucket>=cur,b.uses),else_=0))
+        before=func.sum(case((b.bucket==edge,b.uses*f),(b.bucket<cur,b.uses),else_=0))
+        rows=self.session.query(b.hashtag,recent,before)\
+            .filter(b.width==w,b.niche==(niche or ALL_NICHES).strip().lower(),b.bucket>=edge).group_by(b.hashtag)
+        return {r[0]:(r[1],r[2]) for r in rows}
+
+    def prune_hashtag_buckets(self,now=None):
+        # Drop buckets that no longer fall inside any window's comparison range
+        now=epoch_seconds(now or datetime.utcnow()); b=HashtagBucketORM; deleted=0
+        for span,w in TRENDING_WINDOWS.values():
+            deleted+=self.session.query(b).filter(b.width==w,b.bucket<now//w*w-2*span)\
+                .delete(synchronize_session=False)
+        self.session.commit()
+        return deleted
+
+    def rebuild_hashtag_buckets(self):
+        s=self.session; s.query(HashtagBucketORM).delete(synchronize_session=False)
+        now=epoch_seconds(datetime.utcnow())
+        for span,w in TRENDING_WINDOWS.values():
+            for niche_sql,join in (("''",""),("lower(trim(p.niche))",
+                    "JOIN preferences p ON p.creator_id = m.creator_id AND trim(coalesce(p.niche, '')) != '' ")):
+                s.execute(text(
+                    "INSERT INTO hashtag_buckets (width, niche, bucket, hashtag, uses) "
+                    f"SELECT :w, {niche_sql}, CAST(strftime('%s', m.created_at) AS INTEGER) / :w * :w AS b, j.value, count(*) "
+                    f"FROM memories m {join}, json_each(m.hashtags) j "
+                    "WHERE j.type = 'text' AND m.created_at >= datetime(:since, 'unixepoch') "
+                    f"GROUP BY {niche_sql}, b, j.value"), {"w":w,"since":now//w*w-2*span})
+        s.commit()
+
+    def search_captions(self,cid,q,source="memories",limit=20,offset=0):
+        # BM25-ranked hits (best first) from memories, final suggestion captions, or both
+        sources=["memories","suggestions"] if source=="all" else [source]
+        params={"cid":cid,"limit":limit,"offset":offset,"memories":fts_query(q,cid,"caption"),
+                "suggestions":fts_query(q,cid,"final_caption"),**dict(zip(("open","close","ellipsis","tokens"),SEARCH_SNIPPET))}
+        sql=" UNION ALL ".join(_SEARCH_SQL[x] for x in sources)+" ORDER BY rank LIMIT :limit OFFSET :offset"
+        return [{"source":r.source,"id":r.id,"caption":r.caption,"snippet":r.snippet,
+                 "hashtags":json.loads(r.hashtags or "[]"),
+                 "created_at":datetime.fromisoformat(r.created_at) if r.created_at else None,"rank":r.rank}
+                for r in self.session.execute(text(sql),params)]
+
+    def rebuild_search(self):
+        # Reindex both FTS tables from their content tables. suggestions_fts is keyed by the implicit
+        # rowid of suggestion_logs, which VACUUM may renumber, so run this after a VACUUM.
+        s=self.session
+        s.execute(text("INSERT INTO memories_fts(memories_fts) VALUES ('rebuild')"))
+        s.execute(text("INSERT INTO suggestions_fts(suggestions_fts) VALUES ('rebuild')"))
+        s.commit()
+
+    def optimize_search(self):
+        # Merge the FTS b-trees into one; worth running after large ingests
+        s=self.session
+        s.execute(text("INSERT INTO memories_fts(memories_fts) VALUES ('optimize')"))
+        s.execute(text("INSERT INTO suggestions_fts(suggestions_fts) VALUES ('optimize')"))
+        s.commit()
+
+    def top_hashtags(self,cid,limit=5,decayed=False):
+        order=HashtagCountORM.log_score if decayed else HashtagCountORM.uses
+        rows=self.session.query(HashtagCountORM.hashtag).filter(HashtagCountORM.creator_id==cid)\
+            .order_by(order.desc(),HashtagCountORM.last_used_at.desc(),HashtagCountORM.hashtag).limit(limit).all()
+        return [r.hashtag for r in rows]
+
+    def rebuild_hashtag_counts(self,cid=None):
+        s=self.session; q=s.query(HashtagCountORM)
+        if cid: q=q.filter(HashtagCountORM.creator_id==cid)
+        q.delete(synchronize_session=False)
+        s.execute(text(
+            "INSERT INTO creator_hashtags (creator_id, hashtag, uses, log_score, last_used_at) "
+            f"SELECT creator_id, hashtag, sum(uses), {_LOG2_SUM}, max(last_used_at) FROM ("
+            " SELECT *, max(log_score) OVER (PARTITION BY creator_id, hashtag) AS top FROM ("
+            "  SELECT m.creator_id, j.value AS hashtag, 1 AS uses, hashtag_log_weight(m.created_at) AS log_score,"
+            "  m.created_at AS last_used_at FROM memories m, json_each(m.hashtags) j "
+            "  WHERE j.type = 'text'" + (" AND m.creator_id = :cid" if cid else "") +
+            "  UNION ALL SELECT creator_id, hashtag, uses, log_score, last_used_at FROM creator_monthly_hashtags"
+            + (" WHERE creator_id = :cid" if cid else "") +
+            ")) GROUP BY creator_id, hashtag"), {"cid":cid})
+        self.bump_versions(cid)
+
+    def log_monthly_hashtag_scores(self):
+        # One-off for rollups written before scores moved to log space (the linear score column)
+        s=self.session
+        s.execute(text("UPDATE creator_monthly_hashtags SET log_score = log2(score) WHERE score > 0"))
         s.commit()
 
-    def get_suggestion(self,sid):
-        return self.session.query(SuggestionLogORM).get(sid)
+    def personalization_snapshot(self,cid,examples=3,hashtags=5,top=False,since=None,draft=None,decayed=False):
+        # Read-only: missing preferences fall back to defaults instead of being created.
+        # Three statements in one transaction, released with a rollback since nothing was written.
+        # Examples are the newest memories, or with top=True the best-scoring ones (created after
+        # `since`), or with a draft caption the most similar ones. Hashtags are the most used, or with
+        # decayed=True the highest by time-decayed score.
+        s=self.session
+        try:
+            p=s.query(PreferenceORM).get(cid)
+            if draft: picked=self.similar_memories(cid,draft,examples)
+            elif top: picked=self.top_memories(cid,examples,since)
+            else: picked=self.list_memories(cid,examples)
+            return Snapshot(_preference(p),picked,self.top_hashtags(cid,limit=hashtags,decayed=decayed))
+        finally:
+            s.rollback()
+
+    def personalization_snapshots(self,cids,examples=3,hashtags=5,top=False,since=None,decayed=False,chunk=500):
+        # Batch form of personalization_snapshot: {creator_id: Snapshot} for the creators that exist.
+        # Four statements per chunk of ids (creators, preferences, examples, hashtags). Each creator's
+        # top-N comes from a correlated LIMIT subquery, so it is N index seeks per creator rather than
+        # a ROW_NUMBER() window over every row the creators own.
+        s=self.session; out={}
+        try:
+            for i in range(0,len(cids),chunk):
+                ids=list(dict.fromkeys(cids[i:i+chunk]))
+                found=[r.id for r in s.query(CreatorORM.id).filter(CreatorORM.id.in_(ids))]
+                if not found: continue
+                prefs={p.creator_id:p for p in s.query(PreferenceORM).filter(PreferenceORM.creator_id.in_(found))}
+                m,m2=MemoryORM,aliased(MemoryORM)
+                order=lambda t: [t.score.desc(),t.created_at.desc(),t.id] if top else [t.created_at.desc(),t.id]
+                inner=select(m2.id).where(m2.creator_id==CreatorORM.id)
+                if top and since: inner=inner.where(m2.created_at>=since)
+                inner=inner.order_by(*order(m2)).limit(examples).correlate(CreatorORM)
+                picked={cid:[] for cid in found}
+                for r in s.query(*MEMORY_COLUMNS).join(CreatorORM,m.id.in_(inner)).filter(CreatorORM.id.in_(found))\
+                        .order_by(m.creator_id,*order(m)):
+                    picked[r.creator_id].append(_memory(r))
+                h,h2=HashtagCountORM,aliased(HashtagCountORM)
+                rank=lambda t: [(t.log_score if decayed else t.uses).desc(),t.last_used_at.desc(),t.hashtag]
+                inner=select(h2.hashtag).where(h2.creator_id==CreatorORM.id)\
+                    .order_by(*rank(h2)).limit(hashtags).correlate(CreatorORM)
+                tags={cid:[] for cid in found}
+                for r in s.query(h.creator_id,h.hashtag).join(CreatorORM,and_(h.creator_id==CreatorORM.id,h.hashtag.in_(inner)))\
+                        .filter(CreatorORM.id.in_(found)).order_by(h.creator_id,*rank(h)):
+                    tags[r.creator_id].append(r.hashtag)
+                for cid in found: out[cid]=Snapshot(_preference(prefs.get(cid)),picked[cid],tags[cid])
+            return out
+        finally:
+            s.rollback()
+
+    def log_suggestion(self,cid,sid,sc,sh,model,meta):
+        # One upsert. A retried webhook with the same payload leaves the row (and updated_at) alone and
+        # bumps nothing; True when the suggestion was inserted or changed. None when `sid` is another
+        # creator's suggestion on this shard, which is left alone (the owner is only read on that path).
+        changed=self._upsert_suggestions([_suggestion_row(cid,sid,sc,sh,model,meta,datetime.utcnow())])>0
+        if changed: self._bump_version(cid)
+        elif self.session.query(SuggestionLogORM.creator_id).filter(SuggestionLogORM.suggestion_id==sid).scalar()!=cid:
+            changed=None
+        self._commit(); return changed
+
+    def log_suggestions(self,items,chunk=500):
+        # Batch form of log_suggestion in one transaction; items are dicts with creator_id/suggestion_id/
+        # suggested_caption/suggested_hashtags/model/meta. Stored payloads are read first (one IN query per
+        # chunk) so each item reports whether it changed anything, in input order; only changed rows are
+        # written. Of repeated suggestion_ids the last one wins and the earlier ones report False. Items
+        # reusing the id of another creator's suggestion (stored, or earlier in the batch) report None.
+        if not items: return []
+        s=self.session; now=datetime.utcnow(); t=SuggestionLogORM.__table__
+        rows=[_suggestion_row(it["creator_id"],it["suggestion_id"],it.get("suggested_caption"),it.get("suggested_hashtags"),
+                              it.get("model"),it.get("meta"),now) for it in items]
+        sids=list({r["suggestion_id"] for r in rows}); stored={}; owner={}
+        for i in range(0,len(sids),chunk):
+            for r in s.execute(select(t.c.suggestion_id,t.c.creator_id,*(t.c[k] for k in SUGGESTION_PAYLOAD))
+                               .where(t.c.suggestion_id.in_(sids[i:i+chunk]))):
+                owner[r[0]]=r[1]; stored[r[0]]=tuple(r[2:])
+        for r in rows: owner.setdefault(r["suggestion_id"],r["creator_id"])
+        own=[owner[r["suggestion_id"]]==r["creator_id"] for r in rows]
+        last={r["suggestion_id"]:i for i,(r,o) in enumerate(zip(rows,own)) if o}
+        changed=[(last[r["suggestion_id"]]==i and stored.get(r["suggestion_id"])!=tuple(r[k] for k in SUGGESTION_PAYLOAD))
+                 if o else None for i,(r,o) in enumerate(zip(rows,own))]
+        latest={r["suggestion_id"]:r for r,ch in zip(rows,changed) if ch}
+        if latest:
+            self._upsert_suggestions(list(latest.values()))
+            self._bump_version(*{r["creator_id"] for r in latest.values()})
+        self._commit(); return changed
+
+    def _upsert_suggestions(self,rows):
+        # Feedback columns are left as they are; a conflicting row whose payload is unchanged, or that
+        # belongs to another creator, is not updated at all, which keeps retries idempotent. Returns
+        # the rows inserted or updated.
+        t=SuggestionLogORM.__table__; stmt=sqlite_insert(t)
+        stmt=stmt.on_conflict_do_update(index_elements=[t.c.suggestion_id],
+            set_={**{k:stmt.excluded[k] for k in SUGGESTION_PAYLOAD},"updated_at":stmt.excluded.updated_at},
+            where=and_(t.c.creator_id==stmt.excluded.creator_id,
+                       or_(*(t.c[k].is_distinct_from(stmt.excluded[k]) for k in SUGGESTION_PAYLOAD))))
+        return self.session.execute(stmt,rows).rowcount
+
+    def get_suggestion(self,sid,cid=None):
+        # With `cid`, a suggestion logged for another creator counts as missing
+        r=self.session.query(SuggestionLogORM).get(sid)
+        if r and cid and r.creator_id!=cid: r=None
+        return Suggestion(r.suggestion_id,r.creator_id,r.status,r.suggested_caption,json.loads(r.suggested_hashtags or "[]"),
+                          r.final_caption,json.loads(r.final_hashtags or "[]")) if r else None
 
-    def save_feedback(self,sid,action,fc,fh,reason):
+    def save_feedback(self,sid,action,fc,fh,reason,cid=None):
         s=self.session; row=s.query(SuggestionLogORM).get(sid)
-        if not row: return
+        if not row or (cid and row.creator_id!=cid): return
+        if row.status!=action:
+            delta={}
+            if row.status in FEEDBACK_STATUSES: delta[row.status]=-1
+            if action in FEEDBACK_STATUSES: delta[action]=1
+            self._bump_stats(row.creator_id,**delta)
         row.status=action; row.final_caption=fc; row.final_hashtags=json.dumps(fh or [])
-        row.reason=reason; row.updated_at=datetime.utcnow(); s.commit()
+        row.reason=reason; row.updated_at=datetime.utcnow(); self._bump_version(row.creator_id); self._commit()
+
+    def _bump_stats(self,cid,**delta):
+        if not delta: return
+        t=CreatorStatsORM.__table__; stmt=sqlite_insert(t).values(creator_id=cid,**delta)
+        self.session.execute(stmt.on_conflict_do_update(index_elements=[t.c.creator_id],
+            set_={k:t.c[k]+stmt.excluded[k] for k in delta}))
+
+    def _bump_version(self,*cids):
+        t=CreatorVersionORM.__table__; stmt=sqlite_insert(t)
+        self.session.execute(stmt.on_conflict_do_update(index_elements=[t.c.creator_id],set_={"version":t.c.version+1}),
+                             [{"creator_id":cid,"version":1} for cid in cids])
+
+    def bump_versions(self,cid=None):
+        # Set-based bump (and backfill) for bulk loads and rebuilds that bypass the write methods
+        self.session.execute(text(
+            "INSERT INTO creator_versions (creator_id, version) SELECT id, 1 FROM creators WHERE "
+            + ("id = :cid" if cid else "true") +
+            " ON CONFLICT (creator_id) DO UPDATE SET version = version + 1"),{"cid":cid})
+        self.session.commit()
+
+    def creator_version(self,cid):
+        # None when the creator has never been written
+        return self.session.query(CreatorVersionORM.version).filter(CreatorVersionORM.creator_id==cid).scalar()
 
     def inline_stats(self,cid):
-        s=self.session
-        total=s.query(MemoryORM).filter(MemoryORM.creator_id==cid).count()
-        approved=s.query(SuggestionLogORM).filter(SuggestionLogORM.creator_id==cid,SuggestionLogORM.status=="approved").count()
-        edited=s.query(SuggestionLogORM).filter(SuggestionLogORM.creator_id==cid,SuggestionLogORM.status=="edited").count()
-        rejected=s.query(SuggestionLogORM).filter(SuggestionLogORM.creator_id==cid,SuggestionLogORM.status=="rejected").count()
-        return {"memories":total,"feedback":{"approved":approved,"edited":edited,"rejected":rejected}}
+        if STATS_COUNTERS:
+            row=self.session.query(CreatorStatsORM).get(cid)
+            if not row: return {"memories":0,"feedback":{k:0 for k in FEEDBACK_STATUSES}}
+            return {"memories":row.memories,"feedback":{k:getattr(row,k) for k in FEEDBACK_STATUSES}}
+        return self.aggregate_stats(cid)
+
+    def aggregate_stats(self,cid):
+        # Live rows counted, archived history summed from the monthly rollups
+        s=self.session; r=CreatorRollupORM
+        total=s.query(func.count(MemoryORM.id)).filter(MemoryORM.creator_id==cid).scalar()
+        by_status=dict(s.query(SuggestionLogORM.status,func.count()).filter(SuggestionLogORM.creator_id==cid,
+            SuggestionLogORM.status.in_(FEEDBACK_STATUSES)).group_by(SuggestionLogORM.status).all())
+        old=s.query(func.sum(r.memories),*(func.sum(getattr(r,k)) for k in FEEDBACK_STATUSES)).filter(r.creator_id==cid).one()
+        return {"memories":total+(old[0] or 0),
+                "feedback":{k:by_status.get(k,0)+(n or 0) for k,n in zip(FEEDBACK_STATUSES,old[1:])}}
+
+    def check_stats(self):
+        # Creators whose counters disagree with the tables, as (creator_id, counted, actual)
+        s=self.session; zero=(0,0,0,0)
+        actual={r[0]:tuple(r[1:]) for r in s.execute(text(_STATS_SQL))}
+        counted={r.creator_id:(r.memories,r.approved,r.edited,r.rejected) for r in s.query(CreatorStatsORM)}
+        s.rollback()
+        return [(cid,counted.get(cid,zero),actual.get(cid,zero)) for cid in sorted(actual.keys()|counted.keys())
+                if counted.get(cid,zero)!=actual.get(cid,zero)]
+
+    def rebuild_stats(self):
+        s=self.session; s.query(CreatorStatsORM).delete(synchronize_session=False)
+        s.execute(text("INSERT INTO creator_stats (creator_id, memories, approved, edited, rejected) "+_STATS_SQL))
+        s.commit()
+
+    def compact_history(self,before,batch=5000):
+        # Moves memories created before `before`, and resolved suggestion logs last updated before it,
+        # into the archive tables and folds them into the monthly rollups, in transactions of about
+        # `batch` rows so the writer is never held for long. creator_stats counts all-time and is
+        # left alone. The newest memory id always stays live: ids are max(rowid)+1 and must not be
+        # handed out again.
+        s=self.session; m,sl=MemoryORM,SuggestionLogORM
+        cids=[r[0] for r in s.execute(text("SELECT creator_id FROM memories UNION SELECT creator_id FROM suggestion_logs"))]
+        last=s.query(func.max(m.id)).scalar()
+        moved={"creators":0,"memories":0,"suggestions":0}; mids,sids=[],[]  # (creator_id, key) pairs
+        for cid in cids:
+            found=[(cid,r[0]) for r in s.query(m.id).filter(m.creator_id==cid,m.created_at<before,m.id!=last)]
+            found_s=[(cid,r[0]) for r in s.query(sl.suggestion_id).filter(sl.creator_id==cid,sl.status.in_(FEEDBACK_STATUSES),
+                                                                          sl.updated_at<before)]
+            if not (found or found_s): continue
+            mids+=found; sids+=found_s; moved["creators"]+=1
+            while len(mids)+len(sids)>=batch:
+                n=min(len(mids),batch)
+                self._archive(mids[:n],sids[:batch-n],moved)
+                mids,sids=mids[n:],sids[batch-n:]
+        s.rollback()
+        if mids or sids: self._archive(mids,sids,moved)
+        return moved
+
+    def _archive(self,mids,sids,moved):
+        s=self.session; now=datetime.utcnow(); cids={cid for cid,_ in mids+sids}
+        with self.transaction():
+            if mids:
+                for sql in _ARCHIVE_MEMORIES_SQL: s.execute(sql,{"ids":[k for _,k in mids],"now":now})
+            if sids:
+                for sql in _ARCHIVE_SUGGESTIONS_SQL: s.execute(sql,{"ids":[k for _,k in sids],"now":now})
+            self._bump_version(*cids)
+            if VECTOR_INDEX:
+                for cid in cids: self._after_commit(vector_index.drop,cid)  # rebuilt from the live rows on next use
+        moved["memories"]+=len(mids); moved["suggestions"]+=len(sids)
+
+    def archived_memories(self,cid,limit=50,after=None):
+        # Same order and cursor as list_memories, over memories_archive
+        a=MemoryArchiveORM; q=self.session.query(*ARCHIVE_COLUMNS).filter(a.creator_id==cid)
+        if after:
+            ts,mid=after
+            q=q.filter(or_(a.created_at<ts,and_(a.created_at==ts,a.id>mid)))
+        return [_memory(r) for r in q.order_by(a.created_at.desc(),a.id).limit(limit)]
+
+    def archived_suggestions(self,cid,limit=50,after=None):
+        # Resolved suggestions, most recently updated first; `after` is (updated_at, suggestion_id)
+        a=SuggestionArchiveORM; q=self.session.query(a).filter(a.creator_id==cid)
+        if after:
+            ts,sid=after
+            q=q.filter(or_(a.updated_at<ts,and_(a.updated_at==ts,a.suggestion_id>sid)))
+        return [{"suggestion_id":r.suggestion_id,"status":r.status,"model":r.model,
+                 "suggested_caption":r.suggested_caption,"suggested_hashtags":json_loads(r.suggested_hashtags or "[]"),
+                 "final_caption":r.final_caption,"final_hashtags":json_loads(r.final_hashtags or "[]"),"reason":r.reason,
+                 "created_at":r.created_at,"updated_at":r.updated_at}
+                for r in q.order_by(a.updated_at.desc(),a.suggestion_id).limit(limit)]
+
+    def monthly_stats(self,cid,months=12):
+        # Newest months first: archived rollups plus the live rows, grouped the same way
+        rows=self.session.execute(text(_MONTHLY_SQL),{"cid":cid,"months":months})
+        return [{"month":r.month,"memories":r.memories,"views":r.views,"likes":r.likes,"comments":r.comments,
+                 "shares":r.shares,"engagement":r.engagement,"score":r.score,
+                 "feedback":{k:getattr(r,k) for k in FEEDBACK_STATUSES}} for r in rows]
+
+def rank_trending(counts,limit=20):
+    # Ranked by absolute growth, then current uses; tags unused in the current window are left out.
+    # previous_uses is prorated (see trending_counts), hence rounded
+    rows=sorted(((h,u,p) for h,(u,p) in counts.items() if u>0),key=lambda r: (-(r[1]-r[2]),-r[1],r[0]))[:limit]
+    return [{"hashtag":h,"uses":u,"previous_uses":round(p,1),"growth_pct":round((u-p)*100.0/p,1) if p else None}
+            for h,u,p in rows]
+
+def _first_full_month(since):
+    # Rollups have month granularity: only months starting at or after `since` are counted
+    start=since.replace(day=1,hour=0,minute=0,second=0,microsecond=0)
+    if start<since: start=(start.replace(day=28)+timedelta(days=4)).replace(day=1)
+    return start.strftime("%Y-%m")
+
+def _expanding(*sql):
+    return [text(x).bindparams(bindparam("ids",expanding=True),bindparam("now",type_=DateTime)) if ":now" in x
+            else text(x).bindparams(bindparam("ids",expanding=True)) for x in sql]
+
+_MEMORY_FIELDS = ", ".join(c.name for c in MemoryORM.__table__.columns)
+_SUGGESTION_FIELDS = ", ".join(c.name for c in SuggestionLogORM.__table__.columns)
+_ENGAGEMENT_SUMS = "count(*), " + ", ".join(f"coalesce(sum({k}), 0)" for k in (*ENGAGEMENT_WEIGHTS, "engagement", "score"))
+_ROLLUP_FIELDS = "memories, views, likes, comments, shares, engagement, score, approved, edited, rejected"
+
+_ARCHIVE_MEMORIES_SQL = _expanding(
+    f"INSERT INTO memories_archive ({_MEMORY_FIELDS}, archived_at) SELECT {_MEMORY_FIELDS}, :now FROM memories WHERE id IN :ids",
+    f"INSERT INTO creator_monthly_rollups (creator_id, month, {_ROLLUP_FIELDS}) "
+    f"SELECT creator_id, strftime('%Y-%m', created_at), {_ENGAGEMENT_SUMS}, 0, 0, 0 FROM memories WHERE id IN :ids "
+    "GROUP BY creator_id, strftime('%Y-%m', created_at) ON CONFLICT (creator_id, month) DO UPDATE SET "
+    + ", ".join(f"{k} = {k} + excluded.{k}" for k in ("memories", *ENGAGEMENT_WEIGHTS, "engagement", "score")),
+    "INSERT INTO creator_monthly_hashtags (creator_id, month, hashtag, uses, memories, log_score, last_used_at) "
+    f"SELECT creator_id, month, hashtag, count(*), count(DISTINCT id), {_LOG2_SUM}, max(created_at) FROM ("
+    " SELECT *, max(log_score) OVER (PARTITION BY creator_id, month, hashtag) AS top FROM ("
+    "  SELECT m.id, m.creator_id, strftime('%Y-%m', m.created_at) AS month, j.value AS hashtag, m.created_at,"
+    "  hashtag_log_weight(m.created_at) AS log_score FROM memories m, json_each(m.hashtags) j"
+    "  WHERE m.id IN :ids AND j.type = 'text')) GROUP BY creator_id, month, hashtag "
+    "ON CONFLICT (creator_id, month, hashtag) DO UPDATE SET uses = uses + excluded.uses, "
+    "memories = memories + excluded.memories, log_score = log2_add(log_score, excluded.log_score), "
+    "last_used_at = max(last_used_at, excluded.last_used_at)",
+    "DELETE FROM memory_hashtags WHERE memory_id IN :ids",
+    "DELETE FROM memories WHERE id IN :ids",
+)
+
+# Client-chosen suggestion ids can come back after being archived; the newer row replaces the old
+# one in the archive, while the rollups keep counting both
+_ARCHIVE_SUGGESTIONS_SQL = _expanding(
+    f"INSERT OR REPLACE INTO suggestion_logs_archive ({_SUGGESTION_FIELDS}, archived_at) "
+    f"SELECT {_SUGGESTION_FIELDS}, :now FROM suggestion_logs WHERE suggestion_id IN :ids",
+    f"INSERT INTO creator_monthly_rollups (creator_id, month, {_ROLLUP_FIELDS}) "
+    "SELECT creator_id, strftime('%Y-%m', updated_at), 0, 0, 0, 0, 0, 0, 0, "
+    "sum(status = 'approved'), sum(status = 'edited'), sum(status = 'rejected') FROM suggestion_logs "
+    "WHERE suggestion_id IN :ids GROUP BY creator_id, strftime('%Y-%m', updated_at) "
+    "ON CONFLICT (creator_id, month) DO UPDATE SET "
+    + ", ".join(f"{k} = {k} + excluded.{k}" for k in FEEDBACK_STATUSES),
+    "DELETE FROM suggestion_logs WHERE suggestion_id IN :ids",
+)
+
+_MONTHLY_SQL = (
+    f"SELECT month, {', '.join(f'sum({k}) AS {k}' for k in _ROLLUP_FIELDS.split(', '))} FROM ("
+    f" SELECT month, {_ROLLUP_FIELDS} FROM creator_monthly_rollups WHERE creator_id = :cid"
+    " UNION ALL"
+    f" SELECT strftime('%Y-%m', created_at), {_ENGAGEMENT_SUMS}, 0, 0, 0"
+    " FROM memories WHERE creator_id = :cid GROUP BY strftime('%Y-%m', created_at)"
+    " UNION ALL"
+    " SELECT strftime('%Y-%m', updated_at), 0, 0, 0, 0, 0, 0, 0,"
+    " sum(status = 'approved'), sum(status = 'edited'), sum(status = 'rejected')"
+    " FROM suggestion_logs WHERE creator_id = :cid AND status IN ('approved', 'edited', 'rejected')"
+    " GROUP BY strftime('%Y-%m', updated_at)"
+    ") GROUP BY month ORDER BY month DESC LIMIT :months")
+
+_STATS_SQL = (
+    "SELECT creator_id, sum(memories), sum(approved), sum(edited), sum(rejected) FROM ("
+    " SELECT creator_id, count(*) AS memories, 0 AS approved, 0 AS edited, 0 AS rejected"
+    " FROM memories GROUP BY creator_id"
+    " UNION ALL"
+    " SELECT creator_id, 0, sum(status = 'approved'), sum(status = 'edited'), sum(status = 'rejected')"
+    " FROM suggestion_logs GROUP BY creator_id"
+    " UNION ALL"
+    " SELECT creator_id, sum(memories), sum(approved), sum(edited), sum(rejected)"
+    " FROM creator_monthly_rollups GROUP BY creator_id"
+    ") GROUP BY creator_id")
+
+# Derived tables (and "table.column" for added columns) filled from existing rows when first created.
+_BACKFILLS = {"memories.score": "rebuild_engagement",
+              "creator_hashtags": "rebuild_hashtag_counts", "creator_stats": "rebuild_stats",
+              "memory_hashtags": "rebuild_memory_hashtags", "hashtag_buckets": "rebuild_hashtag_buckets",
+              "memories_fts": "rebuild_search", "creator_versions": "bump_versions",
+              "creator_hashtags.log_score": "rebuild_hashtag_counts"}
+
+# Columns a newer one replaced: carried over by the named method (if any), then dropped with their indexes.
+# Runs before the backfills, which may insert rows the old NOT NULL columns would reject.
+_DROPPED_COLUMNS = {"creator_monthly_hashtags.score": "log_monthly_hashtag_scores",
+                    "creator_hashtags.score": None}
+
+def _add_missing_columns(engine,table,present):
+    # create_all never alters existing tables; new columns must be nullable or have a scalar default
+    added=set()
+    with engine.begin() as c:
+        for col in table.columns:
+            if col.name in present: continue
+            ddl=f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col.type.compile(engine.dialect)}"
+            if col.default is not None and col.default.is_scalar: ddl+=f" NOT NULL DEFAULT {col.default.arg!r}"
+            c.exec_driver_sql(ddl); added.add(f"{table.name}.{col.name}")
+    return added
+
+def _drop_columns(shard,insp,present):
+    for name,method in _DROPPED_COLUMNS.items():
+        table,col=name.split(".")
+        if col not in present.get(table,()): continue
+        if method:
+            db=DB(shard=shard)
+            try: getattr(db,method)()
+            finally: db.session.close()
+        indexes=[i["name"] for i in insp.get_indexes(table) if col in i["column_names"]]  # before taking the writer
+        with shard.engine.begin() as c:
+            for idx in indexes: c.exec_driver_sql(f"DROP INDEX {idx}")
+            c.exec_driver_sql(f"ALTER TABLE {table} DROP COLUMN {col}")
+
+def init_db(shards=None):
+    for shard in shards or SHARDS: init_shard(shard)
 
-def init_db():
+def init_shard(shard):
+    engine=shard.engine; insp=inspect(engine); existing=set(insp.get_table_names()); added=set()
+    present={t:{c["name"] for c in insp.get_columns(t)} for t in existing}
+    for t in Base.metadata.sorted_tables:
+        if t.name in existing: added|=_add_missing_columns(engine,t,present[t.name])
+    _drop_columns(shard,insp,present)
     Base.metadata.create_all(bind=engine)
+    # create_all only adds indexes together with new tables
+    for t in Base.metadata.sorted_tables:
+        for idx in t.indexes: idx.create(bind=engine,checkfirst=True)
+    if engine.dialect.name=="sqlite":
+        try:
+            with engine.begin() as c:
+                for ddl in _SEARCH_DDL: c.exec_driver_sql(ddl)
+        except OperationalError as e:
+            log.warning("full-text search disabled: %s", e); existing.add("memories_fts")
+    if "memories" not in existing: return
+    for table,method in _BACKFILLS.items():
+        if table in existing or ("." in table and table not in added): continue
+        db=DB(shard=shard)
+        try: getattr(db,method)()
+        finally: db.session.close()
 
 def get_db():
     db=DB()
@@ -0,0 +1,439 @@
+import fcntl, glob, hashlib, json, math, os, re, threading, zlib
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+import numpy as np
+
+# Offline caption similarity: hashed word + char n-gram vectors, one memory-mapped matrix per creator.
+VECTOR_INDEX = os.getenv("VECTOR_INDEX", "1") == "1"
+VECTOR_DIR = os.getenv("VECTOR_DIR", "./vectors")
+VECTOR_DIM = int(os.getenv("VECTOR_DIM", "256"))
+VECTOR_OPEN_LIMIT = int(os.getenv("VECTOR_OPEN_LIMIT", "256"))  # creators kept mapped at once
+# From this many rows a creator's vectors are clustered and a query only scans the NPROBE clusters
+# nearest to it, instead of every row
+IVF_MIN_ROWS = int(os.getenv("VECTOR_IVF_MIN_ROWS", "8192"))
+NPROBE = int(os.getenv("VECTOR_NPROBE", "10"))
+INITIAL_CAPACITY = 1024
+
+_WORD = re.compile(r"\w+")
+
+def features(text):
+    # Words, adjacent word pairs and char 3-grams of each padded word, with sublinear tf
+    words = _WORD.findall((text or "").lower())
+    grams = Counter(words)
+    grams.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    for w in words:
+        w = f" {w} "
+        grams.update("#" + w[i:i + 3] for i in range(len(w) - 2))
+    return {g: 1.0 + math.log(n) for g, n in grams.items()}
+
+def vectorize(texts, dim=VECTOR_DIM):
+    # Signed hashing trick (crc32 is stable across processes, unlike hash()); rows are L2-normalised
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for g, w in features(text).items():
+            h = zlib.crc32(g.encode())
+            out[row, h % dim] += w if h & 0x80000000 else -w
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    np.divide(out, norms, out=out, where=norms > 0)
+    return out
+
+def _kmeans(vecs, nlist, iters=8, seed=0):
+    # Spherical k-means on a sample of the rows; unit-norm centroids
+    rng = np.random.default_rng(seed)
+    x = np.asarray(vecs[np.sort(rng.choice(len(vecs), min(len(vecs), nlist * 64), replace=False))])
+    c = x[rng.choice(len(x), nlist, replace=False)].copy()
+    for _ in range(iters):
+        sums = np.zeros_like(c)
+        np.add.at(sums, np.argmax(x @ c.T, axis=1), x)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        c = np.where(norms > 0, sums / np.maximum(norms, 1e-12), c)  # an emptied cluster keeps its centroid
+    return c.astype(np.float32)
+
+def _nearest(vecs, centroids, chunk=65536):
+    out = np.empty(len(vecs), dtype=np.int32)
+    for i in range(0, len(vecs), chunk):
+        out[i:i + chunk] = np.argmax(np.asarray(vecs[i:i + chunk]) @ centroids.T, axis=1)
+    return out
+
+class _Shard:
+    """One creator's rows: vecs (capacity x dim float32), ids (int64), df (per-dimension doc counts),
+    and once clustered, centroids (nlist x dim) with each row's cluster in assign (int32). Clustering
+    sorts the rows by cluster, so the first `trained` rows hold each cluster as one contiguous run;
+    rows appended later are found through per-cluster row lists kept in memory.
+
+    `path`.json names the current generation of `path`.<gen>.*.npy files and how many rows are
+    valid. Appends write past the count and then replace the json; growing or re-clustering writes
+    a new generation, so other processes still mapping the old files are never cut short. Any
+    process notices a change from the json's stat and remaps (or just re-reads the count).
+    """
+
+    ARRAYS = ("vecs", "ids", "df", "assign", "centroids")
+
+    def __init__(self, path, dim):
+        self.path, self.dim = path, dim
+        self.gen, self._stamp = None, None
+        self.count = self.trained = 0
+        self.centroids = None
+        if not self.refresh():
+            raise FileNotFoundError(path + ".json")
+
+    def _file(self, gen, name):
+        return f"{self.path}.{gen}.{name}.npy"
+
+    def refresh(self):
+        # False once the index was dropped (or cannot be read). Cheap when nothing changed: one stat of the json.
+        for _ in range(5):
+            try:
+                st = os.stat(self.path + ".json")
+                if (st.st_ino, st.st_mtime_ns, st.st_size) == self._stamp:
+                    return True
+                with open(self.path + ".json") as f:
+                    meta = json.load(f)
+                if meta["gen"] != self.gen:
+                    self._map(meta["gen"], meta["trained"] > 0, meta["trained"])
+            except FileNotFoundError:
+                if not os.path.exists(self.path + ".json"):
+                    return False
+                continue  # replaced by a newer generation while we were reading; try again
+            self._stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+            self.count, self.trained = meta["count"], meta["trained"]
+            return True
+        return False
+
+    def _map(self, gen, clustered, trained):
+        # Plain ndarray views over the maps: numpy.memmap indexing is several times slower
+        self._maps = [np.load(self._file(gen, name), mmap_mode="r+")
+                      for name in self.ARRAYS if clustered or name != "centroids"]
+        arrays = [np.asarray(m) for m in self._maps]
+        self.vecs, self.ids, self.df, self.assign = arrays[:4]
+        self.centroids = arrays[4] if clustered else None
+        self.gen, self._posted = gen, trained
+        if clustered:
+            self._bounds = np.searchsorted(self.assign[:trained], np.arange(len(self.centroids) + 1))
+            self._postings = [np.empty(0, dtype=np.int64) for _ in range(len(self.centroids))]
+
+    @classmethod
+    def create(cls, path, dim, capacity=INITIAL_CAPACITY):
+        # A new, empty generation; a previous one is removed once the json points here
+        try:
+            with open(path + ".json") as f:
+                gen = json.load(f)["gen"] + 1
+        except (FileNotFoundError, ValueError, KeyError):
+            gen = 1
+        _write_arrays(path, gen, {"vecs": np.zeros((capacity, dim), np.float32), "ids": np.zeros(capacity, np.int64),
+                                  "df": np.zeros(dim, np.float64), "assign": np.zeros(capacity, np.int32)})
+        _write_meta(path, gen, 0, 0)
+        _remove_generations(path, keep=gen)
+        return cls(path, dim)
+
+    def append(self, ids, vecs, cluster=True):
+        # Caller holds the creator's file lock and has refreshed the shard
+        need = self.count + len(ids)
+        if need > len(self.ids):
+            self._rewrite(max(need, 2 * len(self.ids)))
+        self.vecs[self.count:need] = vecs
+        self.ids[self.count:need] = ids
+        if self.centroids is not None:
+            self.assign[self.count:need] = _nearest(vecs, self.centroids)
+        self.df += (vecs != 0).sum(axis=0)
+        for m in self._maps:
+            m.flush()
+        # The row count is published last, so a crash mid-append only loses the new rows
+        self.count = need
+        if cluster and need >= IVF_MIN_ROWS and need >= 4 * self.trained:
+            self.cluster()  # re-clustered as the creator grows, so clusters stay about sqrt(rows) in size
+        else:
+            self._publish()
+
+    def cluster(self):
+        n = self.count
+        centroids = _kmeans(self.vecs[:n], max(1, int(math.sqrt(n))))
+        assign = _nearest(self.vecs[:n], centroids)
+        self._rewrite(len(self.ids), centroids, assign, np.argsort(assign, kind="stable"))
+
+    def _rewrite(self, capacity, centroids=None, assign=None, order=None):
+        # New generation of files; with `order`, rows are written in that order and all count as clustered
+        n, gen = self.count, self.gen + 1
+        order = slice(None) if order is None else order
+        arrays = {"vecs": np.zeros((capacity, self.dim), np.float32), "ids": np.zeros(capacity, np.int64),
+                  "df": self.df.copy(), "assign": np.zeros(capacity, np.int32)}
+        arrays["vecs"][:n], arrays["ids"][:n] = self.vecs[:n][order], self.ids[:n][order]
+        arrays["assign"][:n] = (self.assign[:n] if assign is None else assign)[order]
+        if centroids is not None:
+            self.trained = n
+        centroids = self.centroids if centroids is None else centroids
+        if centroids is not None:
+            arrays["centroids"] = centroids
+        _write_arrays(self.path, gen, arrays)
+        self._map(gen, centroids is not None, self.trained)
+        self._publish()
+        _remove_generations(self.path, keep=gen)
+
+    def _publish(self):
+        _write_meta(self.path, self.gen, self.count, self.trained)
+        st = os.stat(self.path + ".json")
+        self._stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _probe(self, q):
+        # (rows, scores) over the NPROBE clusters nearest to query q: their contiguous runs, plus
+        # their rows appended since clustering (lists extended with whatever arrived since the last query)
+        n = self.count
+        if self._posted < n:
+            a = self.assign[self._posted:n]
+            order = np.argsort(a, kind="stable")
+            bounds = np.searchsorted(a[order], np.arange(len(self._postings) + 1))
+            for c in np.flatnonzero(np.diff(bounds)):
+                self._postings[c] = np.concatenate([self._postings[c], order[bounds[c]:bounds[c + 1]] + self._posted])
+            self._posted = n
+        nprobe = min(NPROBE, len(self.centroids))
+        probe = np.argpartition(-(self.centroids @ q), nprobe - 1)[:nprobe]
+        runs = [(self._bounds[c], self._bounds[c + 1]) for c in probe]
+        tail = np.concatenate([self._postings[c] for c in probe])
+        rows = np.concatenate([np.arange(a, b) for a, b in runs] + [tail])
+        scores = np.concatenate([self.vecs[a:b] @ q for a, b in runs] + [self.vecs[tail] @ q])
+        return rows, scores
+
+    def search(self, queries, k):
+        # IDF is applied on the query side only, so stored rows never need rewriting as df moves
+        n = self.count
+        if not n:
+            return [[] for _ in range(len(queries))]
+        idf = np.log((1.0 + n) / (1.0 + self.df)).astype(np.float32) + 1.0
+        q = queries * idf
+        norms = np.linalg.norm(q, axis=1, keepdims=True)
+        np.divide(q, norms, out=q, where=norms > 0)
+        if self.centroids is None:
+            rows, scores = None, self.vecs[:n] @ q.T  # (n, queries): one pass over the matrix for the whole batch
+        results = []
+        for j in range(len(q)):
+            if self.centroids is not None:
+                rows, col = self._probe(q[j])
+            else:
+                col = scores[:, j]
+            m = len(col)
+            if not m:
+                results.append([])
+                continue
+            top = np.argpartition(-col, min(k, m) - 1)[:k] if k < m else np.arange(m)
+            top = top[np.argsort(-col[top], kind="stable")]
+            pos = top if rows is None else rows[top]
+            results.append([(int(self.ids[i]), float(col[t])) for i, t in zip(pos, top)])
+        return results
+
+def _write_arrays(path, gen, arrays):
+    for name, a in arrays.items():
+        out = np.lib.format.open_memmap(f"{path}.{gen}.{name}.npy", mode="w+", dtype=a.dtype, shape=a.shape)
+        out[:] = a
+        out.flush()
+        del out
+
+def _write_meta(path, gen, count, trained):
+    with open(path + ".json.tmp", "w") as f:
+        json.dump({"gen": gen, "count": count, "trained": trained}, f)
+    os.replace(path + ".json.tmp", path + ".json")
+
+def _remove_generations(path, keep=None):
+    # Processes that still map an older generation keep reading it until they notice the new json
+    for name in glob.glob(glob.escape(path) + ".*.npy"):
+        if keep is None or not name.startswith(f"{path}.{keep}."):
+            os.remove(name)
+
+def _take_pending(path):
+    # Rows other workers queued in `path`.pending during a first build; caller holds the file lock
+    try:
+        with open(path + ".pending") as f:
+            rows = [tuple(json.loads(line)) for line in f if line.endswith("\n")]
+    except FileNotFoundError:
+        rows = []
+    for suffix in (".pending", ".building"):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+    return rows
+
+@contextmanager
+def _file_lock(path):
+    # Serialises writers to one creator's files across worker processes
+    with open(path + ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+class VectorIndex:
+    """Per-creator similarity index over memory captions.
+
+    Each creator's vectors live in .npy files under `root`, opened memory-mapped and kept in a
+    bounded LRU. A creator's index is built on first query from `load()` and afterwards only
+    appended to, so callers feed every new (committed) memory through `add`. Adds for creators
+    without an index are skipped; the first query builds it from the database, including those
+    rows. Several worker processes can share `root`: writes take a file lock, and readers pick up
+    other processes' appends and rebuilds on their next query. A first build leaves a `.building`
+    marker before it loads; while it is there, other processes queue their adds in a `.pending`
+    file that the build folds in, since its load may have read the database before they committed.
+    A marker left by a failed load stays until the next build succeeds.
+
+    The per-creator thread locks are only held for numpy and file work, never while load() runs:
+    under DB_MODE=async load() awaits the database on the event loop thread, and another request
+    blocking that thread on the lock would never let it finish.
+    """
+
+    def __init__(self, root=VECTOR_DIR, dim=VECTOR_DIM, max_open=VECTOR_OPEN_LIMIT):
+        self.root, self.dim, self.max_open = root, dim, max_open
+        self._open = OrderedDict()
+        self._locks = {}
+        self._building = {}  # cid -> rows added while its first build was loading
+        self._lock = threading.Lock()
+
+    def _path(self, cid):
+        return os.path.join(self.root, hashlib.sha1(cid.encode()).hexdigest())
+
+    def _creator_lock(self, cid):
+        with self._lock:
+            return self._locks.setdefault(cid, threading.Lock())
+
+    def _shard(self, cid):
+        # Caller holds the creator lock
+        with self._lock:
+            shard = self._open.get(cid)
+            if shard is not None:
+                self._open.move_to_end(cid)
+        if shard is not None:
+            if shard.refresh():
+                return shard
+            with self._lock:
+                self._open.pop(cid, None)
+            return None
+        path = self._path(cid)
+        if not os.path.exists(path + ".json"):
+            return None
+        try:
+            shard = _Shard(path, self.dim)
+        except (FileNotFoundError, ValueError, KeyError):
+            return None  # dropped meanwhile, or written by an older version: rebuilt on next query
+        if shard.vecs.shape[1] != self.dim:
+            return None
+        with self._lock:
+            self._open[cid] = shard
+            while len(self._open) > self.max_open:
+                self._open.popitem(last=False)
+        return shard
+
+    def add(self, cid, rows):
+        # rows: (memory_id, caption)
+        if not rows:
+            return
+        vecs = vectorize([c for _, c in rows], self.dim)
+        with self._creator_lock(cid):
+            if cid in self._building:
+                self._building[cid].append((rows, vecs))
+                return
+            self._append(cid, rows, vecs)
+
+    def _append(self, cid, rows, vecs):
+        # Caller holds the creator lock. Without either file no build can miss these rows: one
+        # starting later loads them from the database.
+        path = self._path(cid)
+        if not os.path.exists(path + ".json") and not os.path.exists(path + ".building"):
+            return
+        with _file_lock(path):
+            shard = self._shard(cid)
+            if shard is not None:
+                shard.append([mid for mid, _ in rows], vecs)
+            elif os.path.exists(path + ".building"):
+                with open(path + ".pending", "a") as f:
+                    f.writelines(json.dumps([mid, caption]) + "\n" for mid, caption in rows)
+
+    def build(self, cid, rows, chunk=10000):
+        # Replaces the creator's index with `rows` (memory_id, caption)
+        rows = list(rows)
+        with self._creator_lock(cid):
+            self._build(cid, rows, chunk)
+
+    def _build(self, cid, rows, chunk, pending=()):
+        os.makedirs(self.root, exist_ok=True)
+        with self._lock:
+            self._open.pop(cid, None)
+        path = self._path(cid)
+        with _file_lock(path):
+            shard = _Shard.create(path, self.dim, max(INITIAL_CAPACITY, len(rows)))
+            for i in range(0, len(rows), chunk):
+                batch = rows[i:i + chunk]
+                shard.append([m for m, _ in batch], vectorize([c for _, c in batch], self.dim), cluster=False)
+            # Memories committed while the rows were being loaded; the load may have seen them too
+            loaded = {m for m, _ in rows}
+            for added, vecs in pending:
+                keep = [i for i, (m, _) in enumerate(added) if m not in loaded]
+                if keep:
+                    shard.append([added[i][0] for i in keep], vecs[keep], cluster=False)
+                    loaded.update(added[i][0] for i in keep)
+            # ... and the ones other workers committed meanwhile
+            queued = [(m, c) for m, c in dict(_take_pending(path)).items() if m not in loaded]
+            if queued:
+                shard.append([m for m, _ in queued], vectorize([c for _, c in queued], self.dim), cluster=False)
+            if shard.count >= IVF_MIN_ROWS:
+                shard.cluster()
+        with self._lock:
+            self._open[cid] = shard
+        return shard
+
+    def search(self, cid, texts, k, load):
+        # Cosine top-k memory ids for each text, best first; load() yields (memory_id, caption)
+        # for building the index the first time this creator is queried.
+        queries = vectorize(texts, self.dim)
+        lock = self._creator_lock(cid)
+        with lock:
+            shard = self._shard(cid)
+            if shard is not None:
+                return shard.search(queries, k)
+            self._building.setdefault(cid, [])
+            os.makedirs(self.root, exist_ok=True)
+            path = self._path(cid)
+            with _file_lock(path):
+                if not os.path.exists(path + ".json"):  # else another worker just built it
+                    open(path + ".building", "a").close()
+        try:
+            rows = list(load())
+        except BaseException:
+            with lock:
+                for added, vecs in self._building.pop(cid, []):
+                    self._append(cid, added, vecs)
+            raise
+        with lock:
+            # Another request (or worker) may have built it while we were loading
+            shard = self._shard(cid)
+            pending = self._building.pop(cid, [])
+            if shard is None:
+                shard = self._build(cid, rows, 10000, pending)
+            else:
+                for added, vecs in pending:
+                    self._append(cid, added, vecs)
+            return shard.search(queries, k)
+
+    def drop(self, cid):
+        with self._creator_lock(cid):
+            with self._lock:
+                self._open.pop(cid, None)
+            path = self._path(cid)
+            if not os.path.isdir(self.root):
+                return
+            with _file_lock(path):
+                for suffix in (".json", ".building", ".pending"):
+                    try:
+                        os.remove(path + suffix)
+                    except FileNotFoundError:
+                        pass
+                _remove_generations(path)
+
+    def clear(self):
+        # Forget every creator's index; the next query per creator rebuilds it
+        with self._lock:
+            self._open.clear()
+        if os.path.isdir(self.root):
+            for name in os.listdir(self.root):
+                if name.endswith((".json", ".npy", ".building", ".pending")):
+                    os.remove(os.path.join(self.root, name))
+
+vector_index = VectorIndex()
@@ -0,0 +1,169 @@
+import itertools, logging, os, queue, threading, time
+from dataclasses import replace
+from functools import partial
+from .cache import cache
+from .events import hub
+from .sharding import fan_out, shard_for
+from .store import DB, SHARDS, Suggestion
+
+log = logging.getLogger(__name__)
+
+# Opt-in: acknowledge generation webhooks and feedback once validated, and let a dedicated
+# writer thread commit them in batched transactions.
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "0") == "1"
+MAX_BATCH = int(os.getenv("WRITE_BEHIND_MAX_BATCH", "500"))
+MAX_DELAY = float(os.getenv("WRITE_BEHIND_MAX_DELAY_MS", "20")) / 1000
+QUEUE_SIZE = int(os.getenv("WRITE_BEHIND_QUEUE_SIZE", "10000"))
+DRAIN_TIMEOUT = float(os.getenv("WRITE_BEHIND_DRAIN_TIMEOUT", "30"))
+
+class QueueFull(Exception):
+    pass
+
+class WriteBehindQueue:
+    """Bounded queue of DB write groups, flushed by one thread in batched transactions.
+
+    Each submitted group is a list of (DB method name, args) applied atomically. Until a group is
+    committed, the suggestion it touches is kept in an overlay so get_suggestion can answer
+    read-your-writes lookups for that suggestion_id. A batch is split by shard and each shard's
+    part is committed in parallel.
+    """
+
+    def __init__(self, max_batch=MAX_BATCH, max_delay=MAX_DELAY, maxsize=QUEUE_SIZE):
+        self.max_batch, self.max_delay = max_batch, max_delay
+        self._queue = queue.Queue(maxsize)
+        self._overlay = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+        self._thread = None
+        self.flushed = self.batches = self.failed = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=DRAIN_TIMEOUT):
+        # Drains everything already accepted before the thread exits
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def log_suggestion(self, cid, sid, sc, sh, model, meta):
+        with self._lock:
+            prev = self._overlay.get(sid)
+        status = prev[1].status if prev else "pending"
+        view = Suggestion(sid, cid, status, sc, list(sh or []), prev[1].final_caption if prev else None,
+                          prev[1].final_hashtags if prev else [])
+        self._submit(cid, sid, view, [("log_suggestion", (cid, sid, sc, sh, model, meta))])
+
+    def save_feedback(self, suggestion, action, fc, fh, reason, memory=None):
+        ops = [("save_feedback", (suggestion.suggestion_id, action, fc, fh, reason, suggestion.creator_id))]
+        if memory is not None:
+            ops.append(("add_memory", memory))
+        view = replace(suggestion, status=action, final_caption=fc, final_hashtags=list(fh or []))
+        self._submit(suggestion.creator_id, suggestion.suggestion_id, view, ops)
+
+    def get_suggestion(self, sid):
+        with self._lock:
+            entry = self._overlay.get(sid)
+        return entry[1] if entry else None
+
+    def _submit(self, cid, sid, view, ops):
+        seq = next(self._seq)
+        with self._lock:
+            try:
+                self._queue.put_nowait((seq, cid, sid, ops))
+            except queue.Full:
+                raise QueueFull()
+            self._overlay[sid] = (seq, view)
+
+    def stats(self):
+        return {"queued": self._queue.qsize(), "maxsize": self._queue.maxsize, "pending_suggestions": len(self._overlay),
+                "flushed": self.flushed, "batches": self.batches, "failed": self.failed}
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch, deadline = [item], time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+        # Anything accepted before stop() was called
+        rest = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                rest.append(item)
+        for i in range(0, len(rest), self.max_batch):
+            self._flush(rest[i:i + self.max_batch])
+
+    def _flush(self, batch):
+        parts = {}
+        for entry in batch:
+            parts.setdefault(shard_for(entry[1]), []).append(entry)
+        done = [d for part in fan_out([partial(self._commit, i, entries) for i, entries in parts.items()]) for d in part]
+        self.batches += 1
+        self.flushed += len(done)
+        self.failed += len(batch) - len(done)
+        with self._lock:
+            for seq, _, sid, _ in batch:
+                if sid in self._overlay and self._overlay[sid][0] == seq:
+                    del self._overlay[sid]
+        for cid in {entry[1] for entry in batch}:
+            cache.invalidate(cid)
+        for (_, cid, _, ops), results in done:
+            self._publish(cid, ops, results)
+
+    def _commit(self, shard, batch):
+        # One shard's groups in one transaction: [(entry, results)] for the groups committed
+        db = DB(shard=SHARDS[shard])
+        try:
+            try:
+                with db.transaction():
+                    done = [(entry, self._apply(db, entry[3])) for entry in batch]
+            except Exception:
+                # Isolate the bad group(s) so one invalid write does not drop the whole batch
+                log.exception("write-behind batch of %d failed; retrying groups individually", len(batch))
+                done = []
+                for entry in batch:
+                    try:
+                        with db.transaction():
+                            results = self._apply(db, entry[3])
+                        done.append((entry, results))
+                    except Exception:
+                        log.exception("write-behind group for suggestion %s dropped", entry[2])
+        finally:
+            db.session.close()
+        return done
+
+    @staticmethod
+    def _apply(db, ops):
+        return [getattr(db, name)(*args) for name, args in ops]
+
+    @staticmethod
+    def _publish(cid, ops, results):
+        # Events go out once the group is committed, same as on the synchronous path
+        for (name, args), result in zip(ops, results):
+            if name == "log_suggestion":
+                if result:  # False for a retry that changed nothing
+                    hub.suggestion_logged(*args[:5])
+            elif name == "save_feedback":
+                hub.feedback_recorded(cid, *args[:4])
+            elif name == "add_memory":
+                hub.memory_added(cid, result.id, result.caption, result.hashtags)
+
+writer = WriteBehindQueue()
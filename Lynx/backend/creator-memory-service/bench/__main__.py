@@ -0,0 +1,271 @@
+# Benchmark harness for the creator memory service. Run from the service directory:
+#
+#   python -m bench run --scales 1k,100k --modes inprocess,http --concurrency 1,16 --out bench-<sha>.json
+#   python -m bench compare bench-old.json bench-new.json
+#
+# Datasets are built once per scale under bench/.data and copied for every run, so write routes
+# never leak into the next measurement.
+
+import argparse, asyncio, json, math, os, platform, random, shutil, socket, subprocess, sys, tempfile, time
+from datetime import datetime
+from .scenarios import SCENARIOS as SCENARIO_TABLE
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVICE = os.path.dirname(HERE)
+DATA = os.path.join(HERE, ".data")
+
+def percentile(xs, q):
+    # Nearest-rank percentile of a sorted list
+    return xs[max(0, math.ceil(q * len(xs)) - 1)] if xs else None
+
+def summarize(latencies, errors, elapsed, statements):
+    xs = sorted(latencies)
+    ms = lambda v: round(v * 1000, 3) if v is not None else None
+    return {
+        "requests": len(xs), "errors": errors,
+        "throughput_rps": round(len(xs) / elapsed, 1) if elapsed else None,
+        "p50_ms": ms(percentile(xs, 0.50)), "p95_ms": ms(percentile(xs, 0.95)), "p99_ms": ms(percentile(xs, 0.99)),
+        "sql_per_request": round(statements / len(xs), 2) if statements is not None and xs else None,
+    }
+
+async def drive_scenario(client, make, ctx, concurrency, requests, seed, sql=None, warmup=5):
+    rng = random.Random(seed)
+    for _ in range(warmup):
+        method, url, kw = make(ctx, rng)
+        await client.request(method, url, **kw)
+    latencies, errors, remaining = [], 0, [requests]
+    before = sql[0] if sql else None
+
+    async def worker():
+        nonlocal errors
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            method, url, kw = make(ctx, rng)
+            t = time.perf_counter()
+            r = await client.request(method, url, **kw)
+            await r.aread()
+            latencies.append(time.perf_counter() - t)
+            if r.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return summarize(latencies, errors, elapsed, sql[0] - before if sql else None)
+
+def _count_statements():
+    # Every engine the app may execute on, sync and async
+    from sqlalchemy import event
+    from app import async_store, store
+    counter = [0]
+    engines = {e for shard in store.SHARDS for e in (shard.engine, shard.read_engine)}
+    if async_store.DB_MODE == "async":
+        engines |= {e.sync_engine for shard in async_store.ASYNC_SHARDS for e in (shard.engine, shard.read_engine)}
+    for e in engines:
+        event.listen(e, "before_cursor_execute", lambda *a: counter.__setitem__(0, counter[0] + 1))
+    return counter
+
+async def _drive(args, ctx, scenarios):
+    import httpx
+    out = []
+    if args.mode == "inprocess":
+        from app.main import app
+        from app.async_store import dispose
+        sql = _count_statements()
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+                for name in scenarios:
+                    for c in args.concurrency:
+                        out.append({"route": name, "concurrency": c, **await drive_scenario(
+                            client, SCENARIO_TABLE[name], ctx, c, args.requests, args.seed, sql)})
+        await dispose()
+    else:
+        limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+        async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+            for name in scenarios:
+                for c in args.concurrency:
+                    out.append({"route": name, "concurrency": c, **await drive_scenario(
+                        client, SCENARIO_TABLE[name], ctx, c, args.requests, args.seed)})
+    return out
+
+def cmd_drive(args):
+    # Child process: DB_URL already points at this run's copy of the dataset
+    from .scenarios import Context
+    ctx = Context.load(args.db)
+    results = asyncio.run(_drive(args, ctx, args.routes))
+    json.dump(results, sys.stdout)
+
+def dataset_path(scale, skew, seed):
+    return os.path.join(DATA, f"{scale}-zipf{skew}-seed{seed}.sqlite3")
+
+def cmd_dataset(args):
+    from .dataset import SCALES, build
+    path = args.out or dataset_path(args.scale, args.skew, args.seed)
+    if os.path.exists(path) and not args.force:
+        print(path)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    os.environ["DB_URL"] = f"sqlite:///{path}"
+    memories, creators = SCALES[args.scale]
+    took = build(memories, creators, skew=args.skew, seed=args.seed)
+    print(f"built {args.scale} ({memories} memories, {creators} creators) in {took:.1f}s -> {path}", file=sys.stderr)
+    print(path)
+
+def _child_env(db):
+    env = dict(os.environ, DB_URL=f"sqlite:///{db}", PYTHONPATH=SERVICE,
+               VECTOR_DIR=os.path.join(os.path.dirname(db), "vectors"))
+    return env
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _wait_ready(url, proc, timeout=60):
+    import httpx
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        try:
+            if httpx.get(url + "/healthz", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+def _run_one(args, scale, mode, routes):
+    base = subprocess.run([sys.executable, "-m", "bench", "dataset", "--scale", scale, "--skew", str(args.skew),
+                           "--seed", str(args.seed)], cwd=SERVICE, check=True, stdout=subprocess.PIPE,
+                          text=True).stdout.strip().splitlines()[-1]
+    with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+        db = os.path.join(tmp, "bench.sqlite3")
+        shutil.copyfile(base, db)
+        env = _child_env(db)
+        drive = [sys.executable, "-m", "bench", "drive", "--db", db, "--mode", mode, "--requests", str(args.requests),
+                 "--seed", str(args.seed), "--concurrency", ",".join(map(str, args.concurrency)), "--routes", *routes]
+        server = None
+        if mode == "http":
+            port = _free_port()
+            url = f"http://127.0.0.1:{port}"
+            server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+                                       "--log-level", "warning", "--no-access-log"], cwd=SERVICE, env=env)
+            drive += ["--base-url", url]
+        try:
+            if server:
+                _wait_ready(url, server)
+            out = subprocess.run(drive, cwd=SERVICE, env=env, check=True, stdout=subprocess.PIPE, text=True).stdout
+        finally:
+            if server:
+                server.terminate()
+                server.wait(30)
+    return [{"scale": scale, "mode": mode, **r} for r in json.loads(out)]
+
+def _meta(args):
+    def git(*cmd):
+        try:
+            return subprocess.run(["git", *cmd], cwd=SERVICE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                  text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return {
+        "commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--", ".")),
+        "timestamp": datetime.utcnow().isoformat() + "Z", "python": platform.python_version(),
+        "platform": platform.platform(), "cpus": os.cpu_count(),
+        "db_mode": os.getenv("DB_MODE", "sync"), "write_behind": os.getenv("WRITE_BEHIND", "0"),
+        "requests": args.requests, "seed": args.seed, "skew": args.skew,
+    }
+
+def cmd_run(args):
+    routes = [r for r in SCENARIO_TABLE if not args.routes or any(p in r for p in args.routes)]
+    results = []
+    for scale in args.scales:
+        for mode in args.modes:
+            print(f"== {scale} / {mode}: {len(routes)} route(s) x concurrency {args.concurrency}", file=sys.stderr)
+            rows = _run_one(args, scale, mode, routes)
+            for r in rows:
+                print(f"   {r['route']:<45} c={r['concurrency']:<4} {r['throughput_rps'] or 0:>9.1f} rps  "
+                      f"p50 {r['p50_ms']:>8.2f}  p95 {r['p95_ms']:>8.2f}  p99 {r['p99_ms']:>8.2f} ms  "
+                      f"sql/req {r['sql_per_request'] if r['sql_per_request'] is not None else '-'}  "
+                      f"errors {r['errors']}", file=sys.stderr)
+            results += rows
+    doc = {"meta": _meta(args), "results": results}
+    out = args.out or f"bench-{(doc['meta']['commit'] or 'local')[:10]}.json"
+    with open(out, "w") as f:
+        json.dump(doc, f, indent=2)
+    print(out)
+
+def cmd_compare(args):
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    key = lambda r: (r["scale"], r["mode"], r["route"], r["concurrency"])
+    before = {key(r): r for r in old["results"]}
+    pct = lambda a, b: (b - a) * 100.0 / a if a else 0.0
+    regressions = 0
+    print(f"{(old['meta'].get('commit') or '?')[:10]} -> {(new['meta'].get('commit') or '?')[:10]}")
+    print(f"{'scale':<6} {'mode':<10} {'route':<45} {'c':>4} {'rps':>16} {'p95 ms':>18} {'sql/req':>12}")
+    for r in new["results"]:
+        o = before.get(key(r))
+        if not o:
+            continue
+        d_rps, d_p95 = pct(o["throughput_rps"], r["throughput_rps"]), pct(o["p95_ms"], r["p95_ms"])
+        bad = d_rps < -args.threshold or d_p95 > args.threshold
+        regressions += bad
+        sql = (f"{o['sql_per_request']}->{r['sql_per_request']}" if r["sql_per_request"] is not None else "-")
+        print(f"{r['scale']:<6} {r['mode']:<10} {r['route']:<45} {r['concurrency']:>4} {d_rps:>+15.1f}% "
+              f"{d_p95:>+17.1f}% {sql:>12}{'  REGRESSION' if bad else ''}")
+    print(f"{regressions} regression(s) beyond {args.threshold}%")
+    return 1 if regressions and args.fail_on_regression else 0
+
+def _ints(value):
+    return [int(v) for v in value.split(",")]
+
+def _names(value):
+    return [v for v in value.split(",") if v]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Creator memory service benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="build datasets as needed and benchmark every route")
+    p.add_argument("--scales", type=_names, default=["1k"], help="comma-separated: 1k, 100k, 10m")
+    p.add_argument("--modes", type=_names, default=["inprocess"], help="comma-separated: inprocess, http")
+    p.add_argument("--concurrency", type=_ints, default=[1, 16], help="comma-separated concurrency levels")
+    p.add_argument("--requests", type=int, default=200, help="measured requests per route and concurrency level")
+    p.add_argument("--routes", nargs="*", help="only routes whose name contains one of these substrings")
+    p.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of creator sizes")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--out", help="results file (default bench-<commit>.json)")
+
+    p = sub.add_parser("dataset", help="build (or locate) the dataset for a scale")
+    p.add_argument("--scale", required=True)
+    p.add_argument("--skew", type=float, default=1.1)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--out")
+    p.add_argument("--force", action="store_true", help="rebuild even if the file exists")
+
+    p = sub.add_parser("drive", help=argparse.SUPPRESS)
+    p.add_argument("--db", required=True)
+    p.add_argument("--mode", choices=["inprocess", "http"], required=True)
+    p.add_argument("--base-url")
+    p.add_argument("--concurrency", type=_ints, required=True)
+    p.add_argument("--requests", type=int, required=True)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--routes", nargs="+", required=True)
+
+    p = sub.add_parser("compare", help="compare two results files")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.add_argument("--threshold", type=float, default=10.0, help="percent change in rps or p95 counted as a regression")
+    p.add_argument("--fail-on-regression", action="store_true", help="exit 1 when a regression is found")
+
+    args = parser.parse_args(argv)
+    return {"run": cmd_run, "dataset": cmd_dataset, "drive": cmd_drive, "compare": cmd_compare}[args.command](args)
+
+if __name__ == "__main__":
+    sys.exit(main())
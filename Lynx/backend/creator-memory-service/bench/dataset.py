@@ -0,0 +1,20 @@
+# Builds benchmark databases with app.generate_data. Run through `python -m bench dataset`, which
+# sets DB_URL before app.store is imported.
+
+from app.generate_data import WORDS, hashtag_vocabulary
+
+# name -> (memories, creators)
+SCALES = {"1k": (1_000, 20), "100k": (100_000, 1_000), "10m": (10_000_000, 50_000)}
+HASHTAGS = 240
+TAGS = hashtag_vocabulary(HASHTAGS)
+
+def build(memories, creators, skew=1.1, seed=42, days=90):
+    from app.generate_data import GenerateConfig, generate
+    from app.store import SHARDS
+    cfg = GenerateConfig(creators=creators, memories_per_creator=memories / creators, zipf=skew, hashtags=HASHTAGS,
+                         suggestion_ratio=0.1, feedback_ratio=0.75, days=days, seed=seed)
+    result = generate(cfg, log=lambda msg: None)
+    for shard in SHARDS:
+        shard.engine.dispose()
+        shard.read_engine.dispose()
+    return result["total_seconds"]
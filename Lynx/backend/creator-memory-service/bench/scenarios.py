@@ -0,0 +1,95 @@
+# One scenario per route in app/main.py. Each builder takes the run context and an RNG and
+# returns the request to send: (method, url, keyword arguments for httpx).
+
+import itertools, sqlite3, uuid
+from dataclasses import dataclass, field
+from typing import Iterator, List, Tuple
+
+from .dataset import TAGS, WORDS
+
+@dataclass
+class Context:
+    creators: List[str]
+    hot_creator: str
+    suggestions: List[Tuple[str, str]]  # (suggestion_id, creator_id) of pending suggestions
+    _cycle: Iterator = field(default=None, repr=False)
+
+    @classmethod
+    def load(cls, path, sample=1000):
+        # Read straight from the file so the HTTP driver does not need to import the app
+        with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as c:
+            creators = [r[0] for r in c.execute("SELECT id FROM creators ORDER BY random() LIMIT ?", (sample,))]
+            hot = c.execute("SELECT creator_id FROM creator_stats ORDER BY memories DESC LIMIT 1").fetchone()
+            suggestions = c.execute(
+                "SELECT suggestion_id, creator_id FROM suggestion_logs WHERE status = 'pending' LIMIT ?", (sample,)).fetchall()
+        ctx = cls(creators, hot[0] if hot else creators[0], suggestions)
+        ctx._cycle = itertools.cycle(suggestions)
+        return ctx
+
+    def creator(self, rng):
+        return rng.choice(self.creators)
+
+    def suggestion(self):
+        # Cycles through the pending suggestions; feedback on one already answered is an update
+        return next(self._cycle)
+
+def _caption(rng, k=8):
+    return " ".join(rng.choices(WORDS, k=k))
+
+def _memory(ctx, rng):
+    return {"creator_id": ctx.creator(rng), "platform": "tiktok", "caption": _caption(rng),
+            "hashtags": rng.sample(TAGS, 3), "performance": {"views": rng.randint(100, 9999), "likes": rng.randint(0, 999)}}
+
+def _generation(ctx, rng):
+    return {"creator_id": ctx.creator(rng), "suggestion_id": f"bench_{uuid.uuid4().hex}",
+            "suggested_caption": _caption(rng), "suggested_hashtags": rng.sample(TAGS, 3)}
+
+def _feedback(ctx, rng):
+    sid, cid = ctx.suggestion()
+    return "POST", "/feedback", {"json": {"creator_id": cid, "suggestion_id": sid, "action": rng.choice(["approved", "rejected"])}}
+
+SCENARIOS = {
+    "GET /healthz": lambda ctx, rng: ("GET", "/healthz", {}),
+    "PUT /creators/{creator_id}": lambda ctx, rng: (
+        "PUT", f"/creators/{ctx.creator(rng)}", {"json": {"id": "bench", "username": "@bench"}}),
+    "GET /creators/{creator_id}": lambda ctx, rng: ("GET", f"/creators/{ctx.creator(rng)}", {}),
+    "GET /creators/{creator_id}/preferences": lambda ctx, rng: (
+        "GET", f"/creators/{ctx.creator(rng)}/preferences", {}),
+    "PUT /creators/{creator_id}/preferences": lambda ctx, rng: (
+        "PUT", f"/creators/{ctx.creator(rng)}/preferences", {"json": {"tone": "friendly", "banned_words": ["spam"]}}),
+    "POST /memories/ingest": lambda ctx, rng: ("POST", "/memories/ingest", {"json": _memory(ctx, rng)}),
+    "POST /memories/ingest:batch": lambda ctx, rng: (
+        "POST", "/memories/ingest:batch", {"json": [_memory(ctx, rng) for _ in range(100)]}),
+    "GET /memories/{creator_id}": lambda ctx, rng: ("GET", f"/memories/{ctx.creator(rng)}", {}),
+    "GET /memories/{creator_id} (hot)": lambda ctx, rng: ("GET", f"/memories/{ctx.hot_creator}", {}),
+    "GET /memories/{creator_id}?format=ndjson": lambda ctx, rng: (
+        "GET", f"/memories/{ctx.hot_creator}", {"params": {"format": "ndjson", "limit": 1000}}),
+    "GET /memories/search": lambda ctx, rng: (
+        "GET", "/memories/search", {"params": {"creator_id": ctx.hot_creator, "q": rng.choice(WORDS)}}),
+    "POST /webhooks/generation": lambda ctx, rng: ("POST", "/webhooks/generation", {"json": _generation(ctx, rng)}),
+    "POST /webhooks/generation:batch": lambda ctx, rng: (
+        "POST", "/webhooks/generation:batch", {"json": {"suggestions": [_generation(ctx, rng) for _ in range(100)]}}),
+    "POST /feedback": _feedback,
+    "POST /personalize/suggestions": lambda ctx, rng: (
+        "POST", "/personalize/suggestions", {"json": {"creator_id": ctx.creator(rng)}}),
+    "POST /personalize/suggestions (top)": lambda ctx, rng: (
+        "POST", "/personalize/suggestions", {"json": {"creator_id": ctx.hot_creator, "examples": "top", "since_days": 30}}),
+    "POST /personalize/suggestions (draft)": lambda ctx, rng: (
+        "POST", "/personalize/suggestions", {"json": {"creator_id": ctx.hot_creator, "draft_caption": _caption(rng, 6)}}),
+    "POST /personalize/suggestions:batch": lambda ctx, rng: (
+        "POST", "/personalize/suggestions:batch", {"json": {"creator_ids": rng.sample(ctx.creators, min(100, len(ctx.creators)))}}),
+    "POST /guardrails/check": lambda ctx, rng: ("POST", "/guardrails/check", {"json": {
+        "creator_id": ctx.creator(rng), "candidates": [{"caption": _caption(rng), "hashtags": rng.sample(TAGS, 3)}
+                                                       for _ in range(20)]}}),
+    "GET /analytics/inline": lambda ctx, rng: ("GET", "/analytics/inline", {"params": {"creator_id": ctx.creator(rng)}}),
+    "GET /analytics/monthly": lambda ctx, rng: (
+        "GET", "/analytics/monthly", {"params": {"creator_id": ctx.hot_creator}}),
+    "GET /analytics/trending": lambda ctx, rng: (
+        "GET", "/analytics/trending", {"params": {"window": rng.choice(["1h", "24h", "7d"])}}),
+    "GET /hashtags/top": lambda ctx, rng: (
+        "GET", "/hashtags/top", {"params": {"creator_id": ctx.creator(rng), "rank": rng.choice(["uses", "recent"])}}),
+    "GET /hashtags/creators": lambda ctx, rng: ("GET", "/hashtags/creators", {"params": {"tag": rng.choice(TAGS)}}),
+    "GET /hashtags/related": lambda ctx, rng: ("GET", "/hashtags/related", {"params": {"tag": rng.choice(TAGS)}}),
+    "GET /archive/memories/{creator_id}": lambda ctx, rng: ("GET", f"/archive/memories/{ctx.hot_creator}", {}),
+    "GET /archive/suggestions/{creator_id}": lambda ctx, rng: ("GET", f"/archive/suggestions/{ctx.hot_creator}", {}),
+}
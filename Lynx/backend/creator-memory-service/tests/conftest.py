@@ -0,0 +1,68 @@
+# Run from the service directory:
+#
+#   pip install -r requirements.txt -r tests/requirements.txt
+#   python -m pytest -q tests
+#
+# Settings are read from the environment when app modules are imported, so the in-process tests
+# share one temporary database in the default configuration (sync DB, one shard, no write-behind)
+# and keep out of each other's way by using fresh creator ids. Behaviour that depends on other
+# settings (DB_MODE=async, DB_SHARDS, WRITE_BEHIND, ...) runs in a subprocess through `service`.
+
+import os, subprocess, sys, tempfile, textwrap, uuid
+import pytest
+
+SERVICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_TMP = tempfile.mkdtemp(prefix="creator-memory-tests-")
+for _k in ("DB_MODE", "DB_SHARDS", "WRITE_BEHIND", "ASYNC_DB_URL"):
+    os.environ.pop(_k, None)
+os.environ.update(DB_URL=f"sqlite:///{_TMP}/test.sqlite3", VECTOR_DIR=os.path.join(_TMP, "vectors"))
+sys.path.insert(0, SERVICE)
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from app.main import app
+    with TestClient(app) as c:
+        yield c
+
+@pytest.fixture
+def db(client):
+    from app.sharding import ShardedDB
+    d = ShardedDB()
+    yield d
+    d.close()
+
+def new_id(prefix="c"):
+    return f"{prefix}_{uuid.uuid4().hex[:12]}"
+
+@pytest.fixture
+def make_creator(client):
+    def make(**fields):
+        cid = new_id()
+        r = client.put(f"/creators/{cid}", json={"id": cid, "username": f"@{cid}", **fields})
+        assert r.status_code == 200, r.text
+        return cid
+    return make
+
+@pytest.fixture
+def creator(make_creator):
+    return make_creator()
+
+def memory(cid, caption="caption", hashtags=(), **performance):
+    return {"creator_id": cid, "platform": "tiktok", "caption": caption, "hashtags": list(hashtags),
+            "performance": performance}
+
+@pytest.fixture
+def service(tmp_path):
+    """Runs a script in a fresh interpreter against its own database, with extra settings.
+
+    The script's stdout is returned; a non-zero exit fails the test with its output.
+    """
+    def run(code, timeout=120, **env):
+        full = {**os.environ, "DB_URL": f"sqlite:///{tmp_path}/service.sqlite3",
+                "VECTOR_DIR": str(tmp_path / "vectors"), "PYTHONPATH": SERVICE, **env}
+        r = subprocess.run([sys.executable, "-c", textwrap.dedent(code)], cwd=SERVICE, env=full,
+                           capture_output=True, text=True, timeout=timeout)
+        assert r.returncode == 0, r.stdout + r.stderr
+        return r.stdout
+    return run
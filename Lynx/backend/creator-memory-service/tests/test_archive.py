@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from app.sharding import shard_for
+from app.store import SHARDS
+from conftest import memory
+
+def test_seed_clear_empties_archive_and_rollups(service):
+    out = service("""
+        from datetime import datetime, timedelta
+        from sqlalchemy import text
+        from app.seed_test_data import clear_database
+        from app.store import DB, init_db
+        init_db(); db = DB()
+        db.upsert_creator("c1", "@c1", "en", "UTC")
+        for i in range(3):
+            db.add_memory("c1", f"m{i}", ["#a"], {"views": 10})
+        db.log_suggestion("c1", "s1", "cap", ["#a"], "m", {})
+        db.save_feedback("s1", "approved", None, None, None)
+        print("moved", db.compact_history(datetime.utcnow() + timedelta(days=1)))
+        tables = ("memories_archive", "suggestion_logs_archive", "creator_monthly_rollups", "creator_monthly_hashtags")
+        count = lambda: [db.session.execute(text(f"SELECT count(*) FROM {t}")).scalar() for t in tables]
+        print("before", count()); db.session.rollback()
+        clear_database()
+        print("after", count(), db.inline_stats("c1")["memories"])
+    """)
+    moved, before, after = (next(l for l in out.splitlines() if l.startswith(k)) for k in ("moved", "before", "after"))
+    assert "'memories': 2" in moved and "0" not in before[8:-1].split(", ")
+    assert after == "after [0, 0, 0, 0] 0"
+
+def _backdate(cid, days):
+    with SHARDS[shard_for(cid)].engine.begin() as c:
+        ts = datetime.utcnow() - timedelta(days=days)
+        c.execute(text("UPDATE memories SET created_at = :ts WHERE creator_id = :c"), {"ts": ts, "c": cid})
+        c.execute(text("UPDATE suggestion_logs SET created_at = :ts, updated_at = :ts WHERE creator_id = :c"),
+                  {"ts": ts, "c": cid})
+
+def test_compaction_keeps_analytics_and_pages_the_archive(client, creator, db):
+    for i in range(5):
+        client.post("/memories/ingest", json=memory(creator, f"old {i}", ["#a"], views=100, likes=10))
+    for sid, action in (("s_keep", None), ("s_ok", "approved"), ("s_no", "rejected")):
+        sid = f"{sid}_{creator}"
+        client.post("/webhooks/generation", json={"creator_id": creator, "suggestion_id": sid,
+                                                  "suggested_caption": "x", "suggested_hashtags": []})
+        if action:
+            client.post("/feedback", json={"creator_id": creator, "suggestion_id": sid, "action": action})
+    _backdate(creator, 400)
+    client.post("/memories/ingest", json=memory(creator, "new", ["#a"], views=5))
+
+    reads = lambda: (client.get("/analytics/inline", params={"creator_id": creator}).json(),
+                     client.get("/analytics/monthly", params={"creator_id": creator, "months": 24}).json(),
+                     db.aggregate_stats(creator))
+    before = reads()
+    assert before[0]["memories"] == 7 and before[0]["feedback"]["approved"] == 1  # approving adds a memory
+    moved = db.compact_history(datetime.utcnow() - timedelta(days=200))
+    assert moved["memories"] >= 6 and moved["suggestions"] >= 2
+    assert reads() == before
+    assert [m["caption"] for m in client.get(f"/memories/{creator}").json()] == ["new"]
+
+    pages, cursor = [], None
+    while True:
+        r = client.get(f"/archive/memories/{creator}", params={"limit": 4, **({"cursor": cursor} if cursor else {})})
+        pages.append([m["caption"] for m in r.json()])
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert [len(p) for p in pages] == [4, 2]
+    # "" is the memory the approval added: the feedback carried no final caption
+    assert sorted(sum(pages, [])) == ["", "old 0", "old 1", "old 2", "old 3", "old 4"]
+    archived = client.get(f"/archive/suggestions/{creator}", params={"limit": 1})
+    rest = client.get(f"/archive/suggestions/{creator}", params={"cursor": archived.headers["X-Next-Cursor"]})
+    statuses = {s["suggestion_id"]: s["status"] for s in archived.json() + rest.json()}
+    assert statuses == {f"s_ok_{creator}": "approved", f"s_no_{creator}": "rejected"}
+    # The pending suggestion stays live and can still be answered
+    assert client.post("/feedback", json={"creator_id": creator, "suggestion_id": f"s_keep_{creator}",
+                                          "action": "rejected"}).status_code == 200
+    assert client.get(f"/archive/memories/{creator}", params={"cursor": "junk"}).status_code == 400
@@ -0,0 +1,36 @@
+def test_async_shard_layout_follows_its_own_url(service, tmp_path):
+    # Each async shard gets a writer/reader split when its own URL is a file, whatever DB_URL is
+    out = service(f"""
+        from app.async_store import AsyncShard
+        for url in ("sqlite+aiosqlite:///{tmp_path}/a.sqlite3", "sqlite+aiosqlite:///:memory:"):
+            s = AsyncShard(url)
+            print(s.engine is not s.read_engine)
+    """, DB_MODE="async", DB_URL="sqlite:///:memory:")
+    assert out.split() == ["True", "False"]
+
+def test_async_mode_serves_the_api(service):
+    # Concurrent requests on the aiosqlite engines: writes serialize on each shard's writer
+    out = service("""
+        from concurrent.futures import ThreadPoolExecutor
+        from fastapi.testclient import TestClient
+        from app.async_store import ASYNC_SHARDS
+        from app.main import app
+        print(ASYNC_SHARDS[0].engine.dialect.driver)
+        with TestClient(app) as c:
+            for i in range(4):
+                c.put(f"/creators/c{i}", json={"id": f"c{i}"})
+            def work(i):
+                cid = f"c{i % 4}"
+                c.post("/memories/ingest", json={"creator_id": cid, "platform": "tiktok", "caption": f"ramen {i}",
+                                                 "hashtags": ["#t"], "performance": {"likes": i}})
+                c.post("/webhooks/generation", json={"creator_id": cid, "suggestion_id": f"s{i}"})
+                c.post("/feedback", json={"creator_id": cid, "suggestion_id": f"s{i}", "action": "rejected"})
+                return c.post("/personalize/suggestions", json={"creator_id": cid, "examples": "top"}).status_code
+            with ThreadPoolExecutor(16) as pool:
+                print(set(pool.map(work, range(40))))
+            print([c.get("/analytics/inline", params={"creator_id": f"c{i}"}).json() for i in range(4)][0])
+            print(len(c.get("/memories/search", params={"creator_id": "c0", "q": "ramen"}).json()["results"]))
+    """, DB_MODE="async")
+    driver, codes, stats, hits = out.splitlines()[-4:]
+    assert driver == "aiosqlite" and codes == "{200}"
+    assert stats == "{'memories': 10, 'feedback': {'approved': 0, 'edited': 0, 'rejected': 10}}" and hits == "10"
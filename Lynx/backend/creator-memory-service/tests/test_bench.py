@@ -0,0 +1,23 @@
+import json
+from fastapi.routing import APIRoute
+
+def test_every_route_has_a_scenario():
+    from app.main import app
+    from bench.scenarios import SCENARIOS
+    covered = {name.split(" (")[0].split("?")[0] for name in SCENARIOS}
+    routes = {f"{m} {r.path}" for r in app.routes if isinstance(r, APIRoute) and r.include_in_schema for m in r.methods}
+    # The event stream stays open until the client leaves, so it has no per-request latency
+    assert routes - covered == {"GET /creators/{creator_id}/events"}
+
+def test_smoke_run_and_compare(service, tmp_path):
+    out = tmp_path / "bench.json"
+    service(f"""
+        from bench.__main__ import main
+        main(["run", "--scales", "1k", "--modes", "inprocess", "--concurrency", "1", "--requests", "2", "--out", "{out}"])
+    """, timeout=300)
+    results = json.loads(out.read_text())["results"]
+    assert results and all(r["errors"] == 0 for r in results), [r for r in results if r["errors"]]
+    service(f"""
+        from bench.__main__ import main
+        main(["compare", "{out}", "{out}"])
+    """)
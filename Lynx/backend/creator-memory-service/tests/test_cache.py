@@ -0,0 +1,40 @@
+from app.cache import CreatorCache
+from conftest import memory
+
+def test_lru_ttl_and_stale_puts(monkeypatch):
+    c = CreatorCache(maxsize=2, ttl=10)
+    v = c.version("a")
+    c.invalidate("a")
+    c.put("a", "k", 1, v)  # a writer invalidated after the read started
+    assert c.get("a", "k") is None
+    c.put("a", "k", 1, c.version("a")); c.put("b", "k", 2, 0); c.put("c", "k", 3, 0)
+    assert c.get("a", "k") is None and c.get("c", "k") == 3 and c.evictions == 1
+    now = [0.0]
+    monkeypatch.setattr("app.cache.time.monotonic", lambda: now[0])
+    c.put("b", "k", 2, 0); now[0] = 11
+    assert c.get("b", "k") is None and c.stale >= 1
+
+def _hints(client, cid):
+    return client.post("/personalize/suggestions", json={"creator_id": cid}).json()["hints"]
+
+def test_personalize_served_from_cache_until_a_write(client, creator):
+    client.post("/memories/ingest", json=memory(creator, hashtags=["#one"]))
+    assert _hints(client, creator)["preferred_hashtags"] == ["#one"]
+    hits = client.get("/stats/cache").json()["hits"]
+    assert _hints(client, creator)["preferred_hashtags"] == ["#one"]
+    assert client.get("/stats/cache").json()["hits"] == hits + 1
+
+    for write in (lambda: client.post("/memories/ingest", json=memory(creator, hashtags=["#two", "#two"])),
+                  lambda: client.put(f"/creators/{creator}/preferences", json={"niche": "travel"})):
+        write()
+    assert _hints(client, creator) == {"preferred_hashtags": ["#two", "#one"], "niche": "travel"}
+
+def test_batch_route_shares_the_cache(client, make_creator):
+    a, b = make_creator(), make_creator()
+    client.post("/memories/ingest", json=memory(a, hashtags=["#x"]))
+    single = client.post("/personalize/suggestions", json={"creator_id": a}).json()
+    batch = client.post("/personalize/suggestions:batch", json={"creator_ids": [a, b]}).json()
+    assert batch["results"][a] == single and batch["errors"] == {}
+    client.post("/memories/ingest", json=memory(a, hashtags=["#y", "#y"]))
+    batch = client.post("/personalize/suggestions:batch", json={"creator_ids": [a]}).json()
+    assert batch["results"][a]["hints"]["preferred_hashtags"] == ["#y", "#x"]
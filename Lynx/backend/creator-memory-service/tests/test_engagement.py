@@ -0,0 +1,49 @@
+from app.store import MAX_METRIC, engagement_columns
+from conftest import memory
+
+def test_metrics_extracted_and_scored():
+    cols = engagement_columns({"views": 1000, "likes": 5.0, "comments": 1, "shares": 2, "engagement": 0.25})
+    assert cols == {"views": 1000, "likes": 5, "comments": 1, "shares": 2, "engagement": 0.25,
+                    "score": 1000 * 0.01 + 5 + 2 + 6}
+
+def test_unusable_metrics_become_null():
+    cols = engagement_columns({"views": 1e20, "likes": 10 ** 20, "comments": float("nan"), "shares": -3,
+                               "engagement": float("inf")})
+    assert all(cols[k] is None for k in ("views", "likes", "comments", "shares", "engagement"))
+    assert cols["score"] == 0
+    assert engagement_columns({"views": MAX_METRIC})["views"] == MAX_METRIC
+    assert engagement_columns({"views": True, "likes": "12"})["views"] is None
+    assert engagement_columns(None)["score"] == 0
+
+def test_out_of_range_performance_is_accepted(client, creator, db):
+    # Used to fail with OverflowError / ValueError / integer overflow and a 500
+    raw = ['{"views": 1e20, "likes": 3}', '{"views": 100000000000000000000}',
+           '{"views": NaN, "engagement": Infinity}', '{"views": -5, "shares": 2}']
+    for perf in raw:
+        body = '{"creator_id": "%s", "platform": "tiktok", "caption": "x", "performance": %s}' % (creator, perf)
+        r = client.post("/memories/ingest", content=body, headers={"content-type": "application/json"})
+        assert r.status_code == 200, r.text
+    rows = client.get(f"/memories/{creator}").json()
+    assert {m["id"]: m["performance"] for m in rows}[rows[-1]["id"]] == {"views": 1e20, "likes": 3}
+    assert {"views": None, "engagement": None} in [m["performance"] for m in rows]  # NaN/Infinity read back as null
+    month = client.get("/analytics/monthly", params={"creator_id": creator}).json()["months"][0]
+    assert (month["views"], month["likes"], month["shares"], month["score"]) == (0, 3, 2, 9.0)
+
+def test_bad_row_does_not_fail_its_chunk(client, creator):
+    lines = ['{"creator_id": "%s", "platform": "tiktok", "caption": "b", "performance": %s}' % (creator, p)
+             for p in ('{"views": 1e20}', '{"views": NaN}', '{"views": 700}')]
+    r = client.post("/memories/ingest:batch", content="\n".join(lines), headers={"content-type": "application/x-ndjson"})
+    assert r.status_code == 200 and r.json()["inserted"] == 3
+
+def test_rebuild_applies_the_same_rules(client, creator, db):
+    for perf in ({"views": 10 ** 19}, {"views": 500, "likes": -1}, {"likes": 4}):
+        assert client.post("/memories/ingest", json=memory(creator, **perf)).status_code == 200
+    before = client.get("/analytics/monthly", params={"creator_id": creator}).json()
+    db.rebuild_engagement()
+    assert client.get("/analytics/monthly", params={"creator_id": creator}).json() == before
+
+def test_top_examples_rank_by_score(client, creator):
+    for views, likes in ((100, 0), (0, 50), (10 ** 30, 0), (0, 10)):
+        client.post("/memories/ingest", json=memory(creator, f"v{views} l{likes}", views=views, likes=likes))
+    r = client.post("/personalize/suggestions", json={"creator_id": creator, "examples": "top"})
+    assert [e["caption"] for e in r.json()["examples"]] == ["v0 l50", "v0 l10", "v100 l0"]
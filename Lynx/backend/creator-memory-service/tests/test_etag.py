@@ -0,0 +1,56 @@
+import re
+from conftest import memory
+
+def _queries(r):
+    return int(re.search(r'desc="(\d+) queries"', r.headers["Server-Timing"]).group(1))
+
+def _reads(client, cid):
+    get = lambda url: lambda **h: client.get(url, headers=h)
+    post = lambda url, body: lambda **h: client.post(url, json=body, headers=h)
+    return {
+        "creator": get(f"/creators/{cid}"),
+        "preferences": get(f"/creators/{cid}/preferences"),
+        "memories": get(f"/memories/{cid}"),
+        "personalize": post("/personalize/suggestions", {"creator_id": cid}),
+    }
+
+def test_conditional_gets_answer_304(client, creator):
+    client.post("/memories/ingest", json=memory(creator, hashtags=["#a"]))
+    for name, read in _reads(client, creator).items():
+        r = read()
+        etag = r.headers["ETag"]
+        assert r.status_code == 200 and re.fullmatch(r'"[\d-]+[\w-]*"', etag), name
+        assert r.headers["Cache-Control"] == "private, no-cache"
+        for header in (etag, f"W/{etag}", f'"nope", {etag}', "*"):
+            cached = read(**{"If-None-Match": header})
+            assert cached.status_code == 304 and cached.content == b"", (name, header)
+            assert cached.headers["ETag"] == etag
+            assert _queries(cached) <= 1, name
+        assert read(**{"If-None-Match": '"0"'}).status_code == 200
+
+def test_every_write_changes_the_etag(client, creator):
+    reads = _reads(client, creator)
+    writes = [
+        lambda: client.put(f"/creators/{creator}", json={"id": creator, "username": "@renamed"}),
+        lambda: client.put(f"/creators/{creator}/preferences", json={"tone": "edgy"}),
+        lambda: client.post("/memories/ingest", json=memory(creator)),
+        lambda: client.post("/memories/ingest:batch", json=[memory(creator)]),
+    ]
+    seen = set()
+    for write in writes:
+        etags = {name: read().headers["ETag"] for name, read in reads.items()}
+        assert not seen & set(etags.values())
+        seen |= set(etags.values())
+        assert write().status_code == 200
+        for name, read in reads.items():
+            assert read(**{"If-None-Match": etags[name]}).status_code == 200, name
+
+def test_variants_and_untagged_responses(client, creator):
+    personalize = lambda **q: client.post("/personalize/suggestions", json={"creator_id": creator, **q})
+    tags = {personalize().headers["ETag"], personalize(examples="top").headers["ETag"],
+            personalize(hashtags="recent").headers["ETag"]}
+    assert len(tags) == 3
+    # Results that move with the clock or the draft are never tagged
+    assert "ETag" not in personalize(draft_caption="ramen").headers
+    assert "ETag" not in client.get(f"/memories/{creator}", params={"format": "ndjson"}).headers
+    assert client.get("/creators/c_unknown_etag", headers={"If-None-Match": "*"}).status_code == 404
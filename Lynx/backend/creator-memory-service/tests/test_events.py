@@ -0,0 +1,100 @@
+import asyncio, json
+from app.events import KEEPALIVE, RESET, EventHub, hub
+from conftest import memory, new_id
+
+def _run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 5))
+
+def _frames(chunk):
+    # [(id, event, data)] from one or more SSE frames
+    out = []
+    for frame in chunk.decode().strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in frame.splitlines())
+        out.append((fields["id"], fields["event"], json.loads(fields["data"])))
+    return out
+
+def test_live_events_and_replay():
+    async def scenario():
+        h = EventHub(heartbeat=60)
+        h.start()
+        stream = h.stream("c1")
+        assert await stream.__anext__() == b"retry: 3000\n\n"
+        h.memory_added("c1", 7, "ramen", ["#a"])
+        h.memory_added("c2", 8, "other creator", [])
+        h.feedback_recorded("c1", "s1", "approved", "ramen", None)
+        events = _frames(await stream.__anext__())
+        assert [(e, d) for _, e, d in events] == [
+            ("memory-added", {"id": 7, "caption": "ramen", "hashtags": ["#a"]}),
+            ("feedback-recorded", {"suggestion_id": "s1", "status": "approved", "final_caption": "ramen",
+                                   "final_hashtags": []})]
+        await stream.aclose()
+        assert h.stats()["subscribers"] == 0
+
+        # Resuming after the first event replays only what came later
+        resumed = h.stream("c1", events[0][0])
+        await resumed.__anext__()
+        assert _frames(await resumed.__anext__()) == events[1:]
+        await resumed.aclose()
+        h.stop()
+    _run(scenario())
+
+def test_resume_outside_the_replay_buffer_resets():
+    async def scenario():
+        h = EventHub(replay=2, heartbeat=60)
+        h.start()
+        for i in range(4):
+            h.memory_added("c1", i, "x", [])
+        first = next(iter(h._channels["c1"].replay))[1].decode().split("\n")[0][4:]
+        epoch, seq = first.rsplit("-", 1)
+        for last_event_id in (f"{epoch}-{int(seq) - 2}", f"other-{seq}", "garbage"):
+            stream = h.stream("c1", last_event_id)
+            await stream.__anext__()
+            assert await stream.__anext__() == RESET, last_event_id
+            await stream.aclose()
+        stream = h.stream("c1", f"{epoch}-{int(seq) - 1}")  # everything after it is still buffered
+        await stream.__anext__()
+        assert [d["id"] for _, _, d in _frames(await stream.__anext__())] == [2, 3]
+        await stream.aclose()
+        assert h.stats()["resets"] == 3
+        h.stop()
+    _run(scenario())
+
+def test_heartbeat_eviction_and_stop():
+    async def scenario():
+        h = EventHub(heartbeat=0.01, max_pending=2)
+        h.start()
+        idle, slow = h.stream("idle"), h.stream("slow")
+        await idle.__anext__(), await slow.__anext__()
+        assert await idle.__anext__() == KEEPALIVE
+        for i in range(3):  # the slow stream never reads, so the third event drops it
+            h.memory_added("slow", i, "x", [])
+        assert h.stats()["evicted"] == 1
+        assert [chunk async for chunk in slow] == []
+        h.stop()
+        assert [chunk async for chunk in idle] == []
+        assert h.stats()["subscribers"] == 0
+    _run(scenario())
+
+def test_idle_channels_are_dropped_but_live_ones_kept():
+    async def scenario():
+        h = EventHub(channels=2, heartbeat=60)
+        h.start()
+        live = h.stream("live")
+        await live.__anext__()
+        for cid in ("a", "b", "c"):
+            h.memory_added(cid, 1, "x", [])
+        assert set(h._channels) == {"live", "c"}
+        h.stop()
+        await live.aclose()
+    _run(scenario())
+
+def test_routes_publish_lifecycle_events(client, creator):
+    sid = new_id("s")
+    client.post("/webhooks/generation", json={"creator_id": creator, "suggestion_id": sid,
+                                              "suggested_caption": "ramen", "suggested_hashtags": ["#a"]})
+    client.post("/feedback", json={"creator_id": creator, "suggestion_id": sid, "action": "approved"})
+    client.post("/memories/ingest", json=memory(creator, "noodles"))
+    frames = b"".join(frame for _, frame in hub._channels[creator].replay)
+    assert [e for _, e, _ in _frames(frames)] == ["suggestion-logged", "feedback-recorded", "memory-added",
+                                                  "memory-added"]
+    assert client.get(f"/creators/{new_id('c')}/events").status_code == 404
@@ -0,0 +1,46 @@
+import json, random
+from app.generate_data import hashtag_vocabulary, zipf_sizes
+
+def test_zipf_sizes():
+    sizes = zipf_sizes(1000, 10, 1.1, random.Random(1))
+    assert sum(sizes) == 1000 and max(sizes) > 3 * min(sizes)
+    assert zipf_sizes(100, 4, 0, random.Random(1)) == [25] * 4
+    assert hashtag_vocabulary(3) == ["#ramen", "#laksa", "#budget"] and hashtag_vocabulary(100)[-1] == "#tag59"
+
+GENERATE = """
+    import json, sqlite3
+    from app.generate_data import GenerateConfig, generate
+    from app import store
+    counts = generate(GenerateConfig(creators=40, memories_per_creator=25, hashtags=30, seed=7, batch=300),
+                      log=lambda *a: None)
+    c = sqlite3.connect(store.SHARDS[0].engine.url.database)
+    q = lambda sql: c.execute(sql).fetchall()
+    print(json.dumps({
+        "counts": {k: counts[k] for k in ("creators", "memories", "suggestions")},
+        "tables": {t: q(f"SELECT count(*) FROM {t}")[0][0]
+                   for t in ("creators", "preferences", "memories", "suggestion_logs")},
+        "rows": q("SELECT creator_id, caption, hashtags, views, score FROM memories ORDER BY id LIMIT 50"),
+        "stats": q("SELECT sum(memories) FROM creator_stats")[0][0],
+        "tagged": q("SELECT count(*) FROM memory_hashtags")[0][0],
+        "expected_tagged": q("SELECT count(*) FROM memories, json_each(memories.hashtags)")[0][0],
+        "uses": q("SELECT sum(uses) FROM creator_hashtags")[0][0],
+        "search": q("SELECT count(*) FROM memories_fts WHERE memories_fts MATCH 'ramen'")[0][0],
+        "indexes": sorted(r[0] for r in q("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'memories'")),
+        "triggers": sorted(r[0] for r in q("SELECT name FROM sqlite_master WHERE type = 'trigger'")),
+        "statuses": dict(q("SELECT status, count(*) FROM suggestion_logs GROUP BY status")),
+    }))
+"""
+
+def test_generate_is_reproducible_and_rebuilds_derived_tables(service, tmp_path):
+    runs = [json.loads(service(GENERATE, DB_URL=f"sqlite:///{tmp_path}/gen{i}.sqlite3")) for i in range(2)]
+    first = runs[0]
+    assert runs[1] == first
+    assert first["counts"] == {"creators": 40, "memories": 1000, "suggestions": first["tables"]["suggestion_logs"]}
+    assert first["tables"]["creators"] == first["tables"]["preferences"] == 40
+    assert first["tables"]["memories"] == first["stats"] == 1000
+    assert 200 < first["counts"]["suggestions"] < 400  # suggestion_ratio 0.3
+    assert first["statuses"]["pending"] < first["counts"]["suggestions"] / 2  # feedback_ratio 0.7
+    assert first["tagged"] == first["expected_tagged"] == first["uses"]
+    assert first["search"] > 0
+    # Indexes and full-text triggers dropped for the load are back
+    assert len(first["indexes"]) > 2 and first["triggers"]
@@ -0,0 +1,24 @@
+from app.guardrails import matcher
+
+def test_whole_words_case_folded_multiword():
+    m = matcher(["Spam", "get rich", "c++"])
+    assert m.find("SPAM! buy now") == ["Spam"] and m.find("spammer #spam") == ["Spam"]
+    assert m.find("how to GET   rich quick") == ["get rich"] and m.find("learn c++ today") == ["c++"]
+    assert m.find("nothing here") == [] and matcher([]).find("spam") == []
+    assert m.check("fine", ["#ok", "#spam"]) == {"caption": [], "hashtags": ["#spam"]}
+    assert matcher(["spam", "Spam"]) is matcher(["spam", "Spam"])  # compiled once per word list
+
+def test_batch_check_uses_current_preferences(client, creator):
+    client.put(f"/creators/{creator}/preferences", json={"banned_words": ["scam"]})
+    body = {"creator_id": creator, "candidates": [{"caption": "no scam here"}, {"caption": "clean", "hashtags": ["#scam"]},
+                                                  {"caption": "clean"}]}
+    r = client.post("/guardrails/check", json=body).json()
+    assert r["ok"] is False and [x["ok"] for x in r["results"]] == [False, False, True]
+    client.put(f"/creators/{creator}/preferences", json={"banned_words": []})
+    assert client.post("/guardrails/check", json=body).json()["ok"] is True
+
+def test_generation_webhook_reports_violations(client, creator):
+    client.put(f"/creators/{creator}/preferences", json={"banned_words": ["spam"]})
+    r = client.post("/webhooks/generation", json={"creator_id": creator, "suggestion_id": f"{creator}-g",
+                                                  "suggested_caption": "Spam deal", "suggested_hashtags": ["#spam"]})
+    assert r.json()["violations"] == {"caption": ["spam"], "hashtags": ["#spam"]}
@@ -0,0 +1,19 @@
+from conftest import memory, new_id
+
+def test_usage_creators_and_related(client, make_creator, db):
+    a, b = make_creator(), make_creator()
+    tag, other = "#" + new_id("t"), "#" + new_id("o")
+    client.post("/memories/ingest:batch", json=[memory(a, hashtags=[tag, other]), memory(a, hashtags=[tag]),
+                                               memory(b, hashtags=[tag, other, other])])
+    creators = client.get("/hashtags/creators", params={"tag": tag}).json()
+    assert [(r["creator_id"], r["uses"]) for r in creators] == [(a, 2), (b, 1)]
+    assert client.get("/hashtags/related", params={"tag": tag}).json() == [{"hashtag": other, "uses": 2}]
+    assert client.get("/hashtags/related", params={"tag": tag, "creator_id": b}).json() == [{"hashtag": other, "uses": 1}]
+    # memory_hashtags counts a tag once per memory; creator_hashtags counts every occurrence
+    assert {r["hashtag"]: r["uses"] for r in db.hashtag_usage(b)} == {tag: 1, other: 1}
+
+def test_rebuild_matches_incremental(client, creator, db):
+    client.post("/memories/ingest", json=memory(creator, hashtags=["#r1", "#r2"]))
+    before = db.hashtag_usage(creator)
+    db.rebuild_memory_hashtags()
+    assert db.hashtag_usage(creator) == before
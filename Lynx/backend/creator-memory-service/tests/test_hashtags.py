@@ -0,0 +1,98 @@
+import math, sqlite3
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from app.sharding import shard_for
+from app.store import DB, SHARDS, Shard, hashtag_log_weight, init_shard, log2_add
+from conftest import memory
+
+def test_log2_add():
+    assert log2_add(3.0, 3.0) == 4.0
+    assert math.isclose(log2_add(math.log2(3), math.log2(5)), 3.0)
+    assert log2_add(None, 7.5) == 7.5 and log2_add(7.5, None) == 7.5
+    assert log2_add(5000.0, 1.0) == 5000.0  # 2**5000 is not a float; its log is
+
+def test_counters_track_uses_and_decayed_score(client, creator, db):
+    client.post("/memories/ingest", json=memory(creator, hashtags=["#a", "#a", "#b"]))
+    client.post("/memories/ingest:batch", json=[memory(creator, hashtags=["#a"]), memory(creator, hashtags=["#b"])])
+    with SHARDS[shard_for(creator)].engine.connect() as c:
+        rows = dict(c.execute(text("SELECT hashtag, uses FROM creator_hashtags WHERE creator_id = :c"), {"c": creator}).all())
+        scores = dict(c.execute(text("SELECT hashtag, log_score FROM creator_hashtags WHERE creator_id = :c"), {"c": creator}).all())
+    assert rows == {"#a": 3, "#b": 2}
+    now = hashtag_log_weight(datetime.utcnow())
+    assert abs(scores["#a"] - (now + math.log2(3))) < 0.01 and abs(scores["#b"] - (now + 1)) < 0.01
+
+def test_recent_ranking_favours_recent_uses(client, creator, db):
+    # #old: three uses 60 days ago (decayed to 3 * 2**(-60/14) ~ 0.15); #new: one use today
+    for _ in range(3):
+        client.post("/memories/ingest", json=memory(creator, hashtags=["#old"]))
+    with SHARDS[shard_for(creator)].engine.begin() as c:
+        c.execute(text("UPDATE memories SET created_at = :ts WHERE creator_id = :c"),
+                  {"ts": datetime.utcnow() - timedelta(days=60), "c": creator})
+    db.rebuild_hashtag_counts(creator)
+    client.post("/memories/ingest", json=memory(creator, hashtags=["#new"]))
+
+    top = lambda rank: client.get("/hashtags/top", params={"creator_id": creator, "rank": rank}).json()["hashtags"]
+    assert top("uses") == ["#old", "#new"] and top("recent") == ["#new", "#old"]
+    hints = lambda **q: client.post("/personalize/suggestions", json={"creator_id": creator, **q}).json()["hints"]
+    assert hints()["preferred_hashtags"] == ["#old", "#new"]
+    assert hints(hashtags="recent")["preferred_hashtags"] == ["#new", "#old"]
+    batch = client.post("/personalize/suggestions:batch", json={"creator_ids": [creator], "hashtags": "recent"}).json()
+    assert batch["results"][creator]["hints"]["preferred_hashtags"] == ["#new", "#old"]
+
+    # Archiving the old memories keeps their decayed weight in the monthly rollups
+    before = {r: top(r) for r in ("uses", "recent")}
+    db.compact_history(datetime.utcnow() - timedelta(days=30))
+    db.rebuild_hashtag_counts(creator)
+    assert {r: top(r) for r in ("uses", "recent")} == before
+
+def test_hashtags_top_unknown_creator(client):
+    assert client.get("/hashtags/top", params={"creator_id": "c_missing"}).status_code == 404
+
+def test_short_half_life_does_not_overflow(service):
+    # 2**(days since 2020 / 2) overflowed a float, failing every ingest with a hashtag
+    out = service("""
+        from fastapi.testclient import TestClient
+        from app.main import app
+        with TestClient(app) as c:
+            c.put("/creators/c1", json={"id": "c1", "username": "@c1"})
+            r = c.post("/memories/ingest", json={"creator_id": "c1", "platform": "tiktok", "caption": "x",
+                                                 "hashtags": ["#a", "#b"], "performance": {}})
+            assert r.status_code == 200, r.text
+            c.post("/memories/ingest", json={"creator_id": "c1", "platform": "tiktok", "caption": "y",
+                                             "hashtags": ["#b"], "performance": {}})
+            print(c.get("/hashtags/top", params={"creator_id": "c1", "rank": "recent"}).json()["hashtags"])
+    """, HASHTAG_HALF_LIFE_DAYS="0.5")
+    assert out.strip() == "['#b', '#a']"
+
+def test_linear_scores_migrated(tmp_path):
+    path = tmp_path / "old.sqlite3"
+    init_shard(Shard(0, f"sqlite:///{path}"))
+    # Recreate the schema from before scores moved to log space
+    c = sqlite3.connect(path)
+    c.executescript("""
+        DROP INDEX ix_creator_hashtags_log_score;
+        ALTER TABLE creator_hashtags DROP COLUMN log_score;
+        ALTER TABLE creator_hashtags ADD COLUMN score FLOAT NOT NULL DEFAULT 0;
+        CREATE INDEX ix_creator_hashtags_score ON creator_hashtags (creator_id, score);
+        ALTER TABLE creator_monthly_hashtags DROP COLUMN log_score;
+        ALTER TABLE creator_monthly_hashtags ADD COLUMN score FLOAT NOT NULL DEFAULT 0;
+        INSERT INTO creators (id) VALUES ('c1');
+        INSERT INTO creator_hashtags (creator_id, hashtag, uses, score) VALUES ('c1', '#a', 2, 64.0);
+        INSERT INTO creator_monthly_hashtags (creator_id, month, hashtag, uses, memories, score, last_used_at)
+        VALUES ('c1', '2021-01', '#a', 2, 2, 64.0, '2021-01-31 00:00:00');
+    """)
+    c.commit(); c.close()
+
+    shard = Shard(0, f"sqlite:///{path}")
+    init_shard(shard)
+    c = sqlite3.connect(path)
+    assert c.execute("SELECT log_score FROM creator_monthly_hashtags").fetchall() == [(6.0,)]
+    assert c.execute("SELECT uses, log_score FROM creator_hashtags").fetchall() == [(2, 6.0)]  # rebuilt from the rollup
+    assert "score" not in {r[1] for r in c.execute("PRAGMA table_info(creator_hashtags)")}
+    c.close()
+    db = DB(shard=shard)
+    try:
+        db.add_memory("c1", "x", ["#a"], {})
+        assert db.top_hashtags("c1", decayed=True) == ["#a"]
+    finally:
+        db.session.close()
@@ -0,0 +1,27 @@
+import json
+from conftest import memory
+
+def test_batch_reports_each_row_in_order(client, creator):
+    rows = [memory(creator, "ok 1", ["#a"]), memory("c_nobody"), {"creator_id": creator}, "not an object",
+            memory(creator, "ok 2", ["#a"])]
+    body = client.post("/memories/ingest:batch", json=rows).json()
+    assert (body["inserted"], body["failed"]) == (2, 3)
+    r = body["results"]
+    assert [x["index"] for x in r] == [0, 1, 2, 3, 4]
+    assert r[1]["error"] == "Creator not found" and "caption" in r[2]["error"] and not r[3]["ok"]
+    assert r[4]["id"] > r[0]["id"]
+    stored = {m["id"]: m["caption"] for m in client.get(f"/memories/{creator}").json()}
+    assert stored == {r[0]["id"]: "ok 1", r[4]["id"]: "ok 2"}
+    assert client.get("/analytics/inline", params={"creator_id": creator}).json()["memories"] == 2
+
+def test_ndjson_stream_in_chunks(client, creator, monkeypatch):
+    monkeypatch.setattr("app.main.INGEST_CHUNK_SIZE", 3)
+    lines = "\n".join(json.dumps(memory(creator, f"n{i}", ["#nd"])) for i in range(10)) + "\n\n{broken"
+    body = client.post("/memories/ingest:batch", content=lines.encode(),
+                       headers={"content-type": "application/x-ndjson"}).json()
+    assert (body["inserted"], body["failed"]) == (10, 1)
+    assert len({x["id"] for x in body["results"] if x["ok"]}) == 10
+    assert client.get("/hashtags/top", params={"creator_id": creator}).json()["hashtags"] == ["#nd"]
+
+def test_rejects_non_array_body(client):
+    assert client.post("/memories/ingest:batch", json={"creator_id": "x"}).status_code == 400
@@ -0,0 +1,46 @@
+import re
+from app.metrics import Histogram, Metrics
+
+def _sample(text, name, **labels):
+    want = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    m = re.search(rf"^{re.escape(name)}{{{re.escape(want)}}} (\S+)$", text, re.M)
+    return float(m.group(1)) if m else 0.0
+
+def test_histogram_buckets_are_cumulative():
+    reg = Metrics()
+    for s in (0.0003, 0.004, 0.004, 20.0):
+        reg.observe_request("GET", "/x", 200, s, statements=[0.0002, 0.002])
+    text = reg.render()
+    bucket = lambda le: _sample(text, "http_request_duration_seconds_bucket", method="GET", route="/x", le=le)
+    assert (bucket("0.0005"), bucket("0.005"), bucket("10.0"), bucket("+Inf")) == (1, 3, 3, 4)
+    assert _sample(text, "http_requests_total", method="GET", route="/x", status="200") == 4
+    assert _sample(text, "db_statements_total", route="/x") == 8
+    assert _sample(text, "db_statement_duration_seconds_count", route="/x") == 8
+
+def test_labels_are_escaped():
+    reg = Metrics()
+    reg.observe_request("GET", 'a"b\\c', 200, 0.1)
+    assert 'route="a\\"b\\\\c"' in reg.render()
+
+def test_server_timing_header(client, creator):
+    r = client.get(f"/creators/{creator}")
+    parts = dict(p.strip().split(";", 1) for p in r.headers["Server-Timing"].split(","))
+    assert set(parts) == {"db", "serialize", "total"}
+    assert re.fullmatch(r'dur=[\d.]+;desc="[1-9]\d* queries"', parts["db"])
+
+def test_metrics_endpoint_counts_routes_and_sql(client, creator):
+    before = client.get("/metrics").text
+    for _ in range(3):
+        client.get(f"/creators/{creator}")
+    client.get("/no/such/path")
+    text = client.get("/metrics").text
+    assert text.startswith("# HELP ")
+    count = lambda t, name, **labels: _sample(t, name, **labels)
+    route = "/creators/{creator_id}"
+    assert count(text, "http_requests_total", method="GET", route=route, status="200") \
+        - count(before, "http_requests_total", method="GET", route=route, status="200") == 3
+    assert count(text, "db_statements_total", route=route) - count(before, "db_statements_total", route=route) >= 3
+    # Unknown paths share one label instead of one series each
+    assert count(text, "http_requests_total", method="GET", route="unmatched", status="404") >= 1
+    assert "/no/such/path" not in text
+    assert re.search(r'^db_pool_checkout_wait_seconds_count\{pool="[^"]+"\} [1-9]', text, re.M)
@@ -0,0 +1,42 @@
+import json
+from conftest import memory
+
+def _pages(client, cid, limit):
+    seen, cursor = [], None
+    while True:
+        r = client.get(f"/memories/{cid}", params={"limit": limit, **({"cursor": cursor} if cursor else {})})
+        seen.append([m["caption"] for m in r.json()])
+        cursor = r.headers.get("x-next-cursor")
+        if not cursor:
+            return seen
+
+def test_keyset_pages_cover_every_row_once(client, creator):
+    # Batch rows share created_at, so pages must break ties on id
+    client.post("/memories/ingest", json=memory(creator, "first"))
+    client.post("/memories/ingest:batch", json=[memory(creator, f"b{i}") for i in range(7)])
+    everything = [m["caption"] for m in client.get(f"/memories/{creator}", params={"limit": 100}).json()]
+    assert everything[-1] == "first" and len(everything) == 8
+    pages = _pages(client, creator, 3)
+    assert [len(p) for p in pages] == [3, 3, 2] and sum(pages, []) == everything
+
+def test_rows_added_between_pages_are_not_repeated(client, creator):
+    client.post("/memories/ingest:batch", json=[memory(creator, f"old{i}") for i in range(4)])
+    r = client.get(f"/memories/{creator}", params={"limit": 2})
+    first, cursor = [m["caption"] for m in r.json()], r.headers["x-next-cursor"]
+    client.post("/memories/ingest", json=memory(creator, "new"))
+    rest = [m["caption"] for m in client.get(f"/memories/{creator}", params={"limit": 10, "cursor": cursor}).json()]
+    assert sorted(first + rest) == [f"old{i}" for i in range(4)]
+
+def test_ndjson_stream_and_cursor_line(client, creator):
+    client.post("/memories/ingest:batch", json=[memory(creator, f"s{i}") for i in range(5)])
+    r = client.get(f"/memories/{creator}", params={"limit": 3, "format": "ndjson"})
+    lines = [json.loads(l) for l in r.text.splitlines()]
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    assert len(lines) == 4 and "next_cursor" in lines[-1]
+    rest = client.get(f"/memories/{creator}", params={"limit": 10, "format": "ndjson", "cursor": lines[-1]["next_cursor"]})
+    assert [json.loads(l)["caption"] for l in rest.text.splitlines()] == ["s3", "s4"]  # ties on created_at go by id
+
+def test_bad_requests(client, creator):
+    assert client.get(f"/memories/{creator}", params={"cursor": "garbage"}).status_code == 400
+    assert client.get(f"/memories/{creator}", params={"limit": 10 ** 6}).status_code == 400
+    assert client.get("/memories/c_nobody").status_code == 404
@@ -0,0 +1,34 @@
+from app.cache import cache
+from conftest import memory, new_id
+
+def test_snapshot_combines_preferences_examples_and_hashtags(client, creator):
+    client.put(f"/creators/{creator}/preferences", json={"tone": "edgy", "niche": "Food", "banned_words": ["spam"]})
+    for i, tags in enumerate((["#a", "#b"], ["#a", "#spam"], ["#a", "#c"], ["#b"])):
+        client.post("/memories/ingest", json=memory(creator, f"m{i}", tags))
+    body = client.post("/personalize/suggestions", json={"creator_id": creator}).json()
+    assert body["guardrails"] == {"tone": "edgy", "caption_length": "short", "banned_words": ["spam"]}
+    assert body["hints"] == {"preferred_hashtags": ["#a", "#b", "#c"], "niche": "Food"}  # #spam is banned
+    assert [e["caption"] for e in body["examples"]] == ["m3", "m2", "m1"]
+
+def test_unknown_creator_gets_defaults(client):
+    body = client.post("/personalize/suggestions", json={"creator_id": "c_nobody"}).json()
+    assert body["examples"] == [] and body["hints"]["preferred_hashtags"] == []
+    assert body["guardrails"]["tone"] == "friendly"
+
+def test_batch_matches_single_requests(client, make_creator):
+    cids = [make_creator() for _ in range(3)]
+    for n, cid in enumerate(cids):
+        client.put(f"/creators/{cid}/preferences", json={"tone": "playful", "banned_words": ["#b"]})
+        client.post("/memories/ingest:batch", json=[memory(cid, f"{cid} m{i}", ["#a", "#b", f"#n{n}"], likes=i * (n + 1))
+                                                   for i in range(5)])
+    for examples in ("recent", "top"):
+        missing = new_id()
+        batch = client.post("/personalize/suggestions:batch",
+                            json={"creator_ids": cids + [missing, cids[0]], "examples": examples}).json()
+        assert batch["errors"] == {missing: "Creator not found"} and set(batch["results"]) == set(cids)
+        for cid in cids:
+            cache.invalidate(cid)  # computed afresh, not the entry the batch just cached
+            single = client.post("/personalize/suggestions", json={"creator_id": cid, "examples": examples}).json()
+            assert batch["results"][cid] == single
+    too_many = client.post("/personalize/suggestions:batch", json={"creator_ids": ["x"] * 1001})
+    assert too_many.status_code == 422
@@ -0,0 +1,48 @@
+import json
+from datetime import datetime
+from typing import List
+from pydantic import parse_obj_as
+from app import responses
+from app.main import CreatorDTO, MemoryDTO, PersonalizeResultDTO, PreferenceDTO, app
+from conftest import memory
+
+def test_dumps_matches_stdlib_encoder(monkeypatch):
+    content = {"caption": "Budget ramen 🍜 \"hack\"", "n": [1, 2.5, None, True],
+               "at": datetime(2024, 5, 1, 12, 30, 0, 123456), "nested": {"tags": ["#a"]}}
+    fast = responses.dumps(content)
+    monkeypatch.setattr(responses, "orjson", None)
+    assert responses.dumps(content) == fast
+    assert json.loads(fast)["at"] == "2024-05-01T12:30:00.123456"
+
+def test_payloads_match_response_models(client, creator):
+    # Routes bypass response_model validation, so check the documented models still accept them
+    client.put(f"/creators/{creator}/preferences", json={"tone": "edgy", "banned_words": ["spam"]})
+    for i in range(3):
+        client.post("/memories/ingest", json=memory(creator, f"caption {i}", ["#a"], views=100 * i))
+    checks = [(f"/creators/{creator}", CreatorDTO), (f"/creators/{creator}/preferences", PreferenceDTO),
+              (f"/memories/{creator}", List[MemoryDTO])]
+    for url, model in checks:
+        body = client.get(url).json()
+        validated = parse_obj_as(model, body)
+        dump = lambda v: json.loads(v.json()) if hasattr(v, "json") else [json.loads(m.json()) for m in v]
+        assert dump(validated) == body, url
+    body = client.post("/personalize/suggestions", json={"creator_id": creator}).json()
+    assert json.loads(PersonalizeResultDTO(**body).json()) == body
+
+def test_openapi_documents_response_models():
+    paths = app.openapi()["paths"]
+    schema = lambda path, method: paths[path][method]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert schema("/creators/{creator_id}", "get") == {"$ref": "#/components/schemas/CreatorDTO"}
+    assert schema("/memories/{creator_id}", "get")["items"] == {"$ref": "#/components/schemas/MemoryDTO"}
+    assert schema("/personalize/suggestions", "post") == {"$ref": "#/components/schemas/PersonalizeResultDTO"}
+
+def test_out_of_range_performance_still_lists(client, creator):
+    # NaN sends the row down the stdlib parser, which used to hand orjson an int it cannot write
+    r = client.post("/memories/ingest", content=b'{"creator_id": "%s", "platform": "tiktok", "caption": "odd", '
+                    b'"performance": {"views": NaN, "likes": 100000000000000000000, "shares": 3}}' % creator.encode(),
+                    headers={"Content-Type": "application/json"})
+    assert r.status_code == 200
+    listed = client.get(f"/memories/{creator}")
+    assert listed.status_code == 200
+    assert listed.json()[0]["performance"] == {"views": None, "likes": 1e20, "shares": 3}
+    assert client.post("/personalize/suggestions", json={"creator_id": creator}).status_code == 200
@@ -0,0 +1,29 @@
+from conftest import memory
+
+def _search(client, cid, q, **params):
+    return client.get("/memories/search", params={"creator_id": cid, "q": q, **params})
+
+def test_all_words_last_as_prefix_scoped_to_creator(client, make_creator):
+    a, b = make_creator(), make_creator()
+    client.post("/memories/ingest:batch", json=[memory(a, "Budget ramen hack"), memory(a, "Ramen review downtown"),
+                                               memory(a, "Budget flights"), memory(b, "Budget ramen too")])
+    hits = _search(client, a, "budget ram").json()
+    assert [h["caption"] for h in hits["results"]] == ["Budget ramen hack"] and hits["next_offset"] is None
+    assert "<mark>" in hits["results"][0]["snippet"]
+    assert {h["caption"] for h in _search(client, a, "ramen").json()["results"]} == {"Budget ramen hack", "Ramen review downtown"}
+
+def test_paging_and_sources(client, creator):
+    client.post("/memories/ingest:batch", json=[memory(creator, f"taco night {i}") for i in range(5)])
+    client.post("/webhooks/generation", json={"creator_id": creator, "suggestion_id": f"{creator}-s", "suggested_caption": "x"})
+    client.post("/feedback", json={"creator_id": creator, "suggestion_id": f"{creator}-s", "action": "rejected",
+                                   "final_caption": "taco tuesday"})
+    first = _search(client, creator, "taco", limit=3).json()
+    rest = _search(client, creator, "taco", limit=3, offset=first["next_offset"]).json()
+    assert len(first["results"]) == 3 and len(rest["results"]) == 2 and rest["next_offset"] is None
+    assert [h["caption"] for h in _search(client, creator, "tuesday", source="suggestions").json()["results"]] == ["taco tuesday"]
+    assert len(_search(client, creator, "taco", source="all").json()["results"]) == 6
+
+def test_bad_queries(client, creator):
+    assert _search(client, creator, "!!!").status_code == 400
+    assert _search(client, creator, 'taco" OR creator_id : "x').status_code == 200  # quotes are not syntax
+    assert _search(client, "c_nobody", "taco").status_code == 404
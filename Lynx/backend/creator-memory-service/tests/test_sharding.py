@@ -0,0 +1,86 @@
+import json
+from collections import Counter
+from app.sharding import HashRing
+
+def test_ring_spreads_creators_and_moves_few():
+    cids = [f"creator_{i}" for i in range(3000)]
+    three, four = HashRing(3), HashRing(4)
+    assert {HashRing(1).shard(c) for c in cids} == {0}
+    assert min(Counter(map(three.shard, cids)).values()) > 700
+    moved = [c for c in cids if three.shard(c) != four.shard(c)]
+    assert {four.shard(c) for c in moved} == {3} and len(moved) < 1000
+
+# Writes through the API on a sharded deployment, then prints what each creator reads back
+# (memory ids are left out: resharding renumbers them)
+WRITE = """
+    from fastapi.testclient import TestClient
+    from app.main import app
+    with TestClient(app) as c:
+        for i in range(12):
+            cid = f"c{i}"
+            c.put(f"/creators/{cid}", json={"id": cid, "username": f"@{cid}"})
+            c.put(f"/creators/{cid}/preferences", json={"tone": "edgy", "banned_words": [f"w{i}"]})
+            c.post("/memories/ingest:batch", json=[
+                {"creator_id": cid, "platform": "tiktok", "caption": f"ramen {i} {k}", "hashtags": ["#shared", f"#t{i}"],
+                 "performance": {"views": 100 * k, "likes": k}} for k in range(3)])
+            c.post("/webhooks/generation", json={"creator_id": cid, "suggestion_id": f"s{i}", "suggested_caption": "x"})
+            c.post("/feedback", json={"creator_id": cid, "suggestion_id": f"s{i}", "action": "rejected"})
+"""
+READ = """
+    import json, sqlite3
+    from fastapi.testclient import TestClient
+    from app import store
+    from app.main import app
+    from app.sharding import shard_for
+    cids = [f"c{i}" for i in range(12)]
+    with TestClient(app) as c:
+        per = {cid: {
+            "creator": c.get(f"/creators/{cid}").json(),
+            "preferences": c.get(f"/creators/{cid}/preferences").json(),
+            "memories": [(m["caption"], m["hashtags"]) for m in c.get(f"/memories/{cid}").json()],
+            "stats": c.get("/analytics/inline", params={"creator_id": cid}).json(),
+            "hashtags": c.get("/hashtags/top", params={"creator_id": cid}).json(),
+            "search": len(c.get("/memories/search", params={"creator_id": cid, "q": "ramen"}).json()["results"]),
+            "etag": c.get(f"/creators/{cid}").headers["ETag"],
+        } for cid in cids}
+        shared = sorted((r["creator_id"], r["uses"]) for r in c.get("/hashtags/creators", params={"tag": "#shared", "limit": 100}).json())
+        trending = {r["hashtag"]: r["uses"] for r in c.get("/analytics/trending", params={"window": "24h"}).json()["hashtags"]}
+        r = c.post("/memories/ingest", json={"creator_id": "c0", "platform": "tiktok", "caption": "after", "performance": {}})
+        assert r.status_code == 200, r.text
+    homes = {}
+    for shard in store.SHARDS:
+        db = sqlite3.connect(shard.engine.url.database)
+        for (cid,) in db.execute("SELECT creator_id FROM memories UNION SELECT id FROM creators"):
+            homes.setdefault(cid, []).append(shard.index)
+    print(json.dumps({"per": per, "shared": shared, "trending": trending["#shared"],
+                      "misplaced": [cid for cid, h in homes.items() if h != [shard_for(cid)]],
+                      "used": len({h[0] for h in homes.values()})}))
+"""
+
+def test_sharded_flow_and_reshard(service):
+    service(WRITE, DB_SHARDS="3")
+    before = json.loads(service(READ, DB_SHARDS="3"))
+    assert before["misplaced"] == [] and before["used"] == 3
+    assert before["shared"] == [[f"c{i}", 3] for i in (0, 1, 10, 11, *range(2, 10))]
+    assert before["trending"] == 36
+    c0 = before["per"]["c0"]
+    assert c0["stats"] == {"memories": 3, "feedback": {"approved": 0, "edited": 0, "rejected": 1}}
+    assert c0["search"] == 3 and c0["preferences"]["banned_words"] == ["w0"]
+
+    out = service("""
+        from app.reshard import main
+        main(["--to", "4"])
+    """, DB_SHARDS="3")
+    assert "restart the service with DB_SHARDS=4" in out
+    after = json.loads(service(READ, DB_SHARDS="4"))
+    assert after["misplaced"] == [] and after["used"] == 4
+    assert after["shared"] == before["shared"] and after["trending"] == before["trending"]
+    strip = lambda read: {k: v for k, v in read.items() if k != "etag"}
+    for cid, read in before["per"].items():
+        if cid == "c0":  # READ added a memory after its reads
+            read = {**read, "memories": [["after", []]] + read["memories"],
+                    "stats": {**read["stats"], "memories": 4}}
+        assert strip(after["per"][cid]) == strip(read), cid
+    # Moved creators get a new version, so ETags from the old shard stop matching
+    moved = [cid for cid in before["per"] if HashRing(3).shard(cid) != HashRing(4).shard(cid)]
+    assert moved and all(before["per"][cid]["etag"] != after["per"][cid]["etag"] for cid in moved)
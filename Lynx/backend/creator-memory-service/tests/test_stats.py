@@ -0,0 +1,28 @@
+from sqlalchemy import text
+from conftest import memory
+
+def _feedback(client, cid, sid, action):
+    r = client.post("/feedback", json={"creator_id": cid, "suggestion_id": sid, "action": action})
+    assert r.status_code == 200, r.text
+
+def test_counters_follow_memories_and_feedback(client, creator, db):
+    client.post("/memories/ingest", json=memory(creator))
+    client.post("/memories/ingest:batch", json=[memory(creator), memory(creator)])
+    for sid in ("s1", "s2", "s3"):
+        client.post("/webhooks/generation", json={"creator_id": creator, "suggestion_id": f"{creator}-{sid}"})
+    _feedback(client, creator, f"{creator}-s1", "approved")
+    _feedback(client, creator, f"{creator}-s2", "edited")
+    _feedback(client, creator, f"{creator}-s2", "rejected")  # changes its mind: moves between counters
+    # Approved and edited captions are kept as memories too
+    expected = {"memories": 5, "feedback": {"approved": 1, "edited": 0, "rejected": 1}}
+    assert client.get("/analytics/inline", params={"creator_id": creator}).json() == expected
+    assert db.aggregate_stats(creator) == expected
+    assert creator not in {cid for cid, _, _ in db.check_stats()}
+
+def test_drift_detected_and_rebuilt(client, creator, db):
+    client.post("/memories/ingest", json=memory(creator))
+    db.shard(0).session.execute(text("UPDATE creator_stats SET memories = 7 WHERE creator_id = :c"), {"c": creator})
+    db.shard(0).session.commit()
+    assert (creator, (7, 0, 0, 0), (1, 0, 0, 0)) in db.check_stats()
+    db.rebuild_stats()
+    assert creator not in {cid for cid, _, _ in db.check_stats()}
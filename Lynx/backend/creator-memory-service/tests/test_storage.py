@@ -0,0 +1,25 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app.store import SHARDS
+
+def test_healthz_reports_the_effective_profile(client):
+    storage = client.get("/healthz").json()["storage"]
+    assert storage["split"] is True and storage["read_pool_size"] == 8
+    effective = storage["effective"]
+    assert (effective["journal_mode"], effective["synchronous"], effective["busy_timeout"]) == ("wal", 1, 5000)
+
+def test_readers_cannot_write():
+    with SHARDS[0].read_engine.connect() as c:
+        assert c.execute(text("SELECT count(*) FROM creators")).scalar() >= 0
+        with pytest.raises(OperationalError):
+            c.execute(text("INSERT INTO creators (id) VALUES ('c_reader')"))
+
+def test_profile_from_environment(service):
+    out = service("""
+        from app.store import init_db, storage_report
+        init_db()
+        r = storage_report()
+        print(r["effective"]["journal_mode"], r["effective"]["synchronous"], r["read_pool_size"])
+    """, SQLITE_JOURNAL_MODE="DELETE", SQLITE_SYNCHRONOUS="FULL", SQLITE_READ_POOL_SIZE="3")
+    assert out.split()[-3:] == ["delete", "2", "3"]
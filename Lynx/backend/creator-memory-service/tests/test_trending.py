@@ -0,0 +1,56 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from app.sharding import shard_for
+from app.store import DB, SHARDS
+from conftest import memory, new_id
+
+def _use(creator, tag, times):
+    db = DB(shard=SHARDS[shard_for(creator)])
+    try:
+        for ts in times:
+            db._bucket_hashtags(Counter({(creator, tag): 1}), ts)
+        db.session.commit()
+    finally:
+        db.session.close()
+
+def test_steady_use_is_not_trending_mid_bucket(db, creator):
+    # Two uses an hour, at :15 and :45, for two days; asked half way through an hour
+    tag, start = "#" + new_id("steady"), datetime(2021, 3, 1)
+    now = start + timedelta(hours=47, minutes=30)
+    _use(creator, tag, [t for h in range(48) for m in (15, 45) if (t := start + timedelta(hours=h, minutes=m)) < now])
+    assert db.trending_counts("24h", now=now)[tag] == (47, 47.0)  # was (47, 48): a full previous window
+    ranked = {r["hashtag"]: r for r in db.trending_hashtags("24h", now=now, limit=500)}
+    assert ranked[tag]["growth_pct"] == 0.0
+
+def test_growth_against_the_window_before(client, creator, db):
+    tag = "#" + new_id("viral")
+    now = datetime.utcnow()
+    _use(creator, tag, [now - timedelta(hours=30)] * 2)
+    for _ in range(6):
+        client.post("/memories/ingest", json=memory(creator, hashtags=[tag]))
+    rows = {r["hashtag"]: r for r in client.get("/analytics/trending", params={"window": "24h", "limit": 200}).json()["hashtags"]}
+    assert rows[tag]["uses"] == 6 and rows[tag]["previous_uses"] == 2.0 and rows[tag]["growth_pct"] == 200.0
+
+def test_old_buckets_pruned(creator, db):
+    tag = "#" + new_id("old")
+    _use(creator, tag, [datetime(2021, 1, 1)])
+    assert db.trending_counts("7d", now=datetime(2021, 1, 1, 12))[tag] == (1, 0)
+    assert db.prune_hashtag_buckets() >= 3  # one bucket per window width
+    assert tag not in db.trending_counts("7d", now=datetime(2021, 1, 1, 12))
+
+def test_service_prunes_on_a_schedule(service):
+    out = service("""
+        import time
+        from collections import Counter
+        from datetime import datetime
+        from fastapi.testclient import TestClient
+        from app.main import app
+        from app.store import DB
+        with TestClient(app):
+            db = DB()
+            db._bucket_hashtags(Counter({("c1", "#old"): 1}), datetime(2021, 1, 1)); db.session.commit()
+            time.sleep(1.5)
+            print(db.session.execute("SELECT count(*) FROM hashtag_buckets").scalar())
+            db.session.close()
+    """, TRENDING_PRUNE_INTERVAL="1")
+    assert out.split()[-1] == "0"
@@ -0,0 +1,101 @@
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import text
+from app.events import hub
+from app.sharding import shard_for
+from app.store import SHARDS
+from conftest import new_id
+
+def _events(cid):
+    channel = hub._channels.get(cid)
+    return len(channel.replay) if channel else 0
+
+def _suggestion(cid, sid):
+    with SHARDS[shard_for(cid)].engine.connect() as c:
+        return c.execute(text("SELECT suggested_caption, status, updated_at FROM suggestion_logs WHERE suggestion_id = :s"),
+                         {"s": sid}).one()
+
+def test_repeated_creator_upsert_keeps_the_etag(client):
+    cid = new_id("c")
+    profile = {"id": cid, "username": "@same", "locale": "en", "timezone": "UTC"}
+    client.put(f"/creators/{cid}", json=profile)
+    etag = client.get(f"/creators/{cid}").headers["ETag"]
+    assert client.put(f"/creators/{cid}", json=profile).json() == profile
+    assert client.get(f"/creators/{cid}").headers["ETag"] == etag
+    client.put(f"/creators/{cid}", json={**profile, "username": "@new"})
+    assert client.get(f"/creators/{cid}", headers={"If-None-Match": etag}).status_code == 200
+
+def test_retried_webhook_is_a_no_op(client, creator, db):
+    sid = new_id("s")
+    webhook = {"creator_id": creator, "suggestion_id": sid, "suggested_caption": "ramen", "suggested_hashtags": ["#a"]}
+    client.post("/webhooks/generation", json=webhook)
+    version, events, row = db.creator_version(creator), _events(creator), _suggestion(creator, sid)
+    with ThreadPoolExecutor(8) as pool:
+        codes = set(pool.map(lambda _: client.post("/webhooks/generation", json=webhook).status_code, range(16)))
+    assert codes == {200}
+    assert (db.creator_version(creator), _events(creator), _suggestion(creator, sid)) == (version, events, row)
+
+    # Feedback survives a retry that changes the payload
+    client.post("/feedback", json={"creator_id": creator, "suggestion_id": sid, "action": "rejected"})
+    client.post("/webhooks/generation", json={**webhook, "suggested_caption": "ramen v2"})
+    assert _suggestion(creator, sid)[:2] == ("ramen v2", "rejected")
+    assert db.creator_version(creator) > version
+
+def test_batch_webhook(client, make_creator, db):
+    a, b, missing = make_creator(), make_creator(), new_id("c")
+    client.put(f"/creators/{b}/preferences", json={"banned_words": ["spam"]})
+    s1, s2 = new_id("s"), new_id("s")
+    batch = [
+        {"creator_id": a, "suggestion_id": s1, "suggested_caption": "first"},
+        {"creator_id": missing, "suggestion_id": new_id("s"), "suggested_caption": "x"},
+        {"creator_id": b, "suggestion_id": s2, "suggested_caption": "no spam here", "suggested_hashtags": ["#spam"]},
+        {"creator_id": a, "suggestion_id": s1, "suggested_caption": "second"},  # the last repeat wins
+    ]
+    body = client.post("/webhooks/generation:batch", json={"suggestions": batch}).json()
+    assert (body["logged"], body["failed"]) == (3, 1)
+    assert [(r["index"], r["ok"]) for r in body["results"]] == [(0, True), (1, False), (2, True), (3, True)]
+    assert body["results"][1]["error"] == "Creator not found"
+    assert body["results"][2]["violations"] == {"caption": ["spam"], "hashtags": ["#spam"]}
+    assert _suggestion(a, s1)[0] == "second" and _suggestion(b, s2)[1] == "pending"
+
+    versions, events = [db.creator_version(c) for c in (a, b)], [_events(c) for c in (a, b)]
+    assert client.post("/webhooks/generation:batch", json={"suggestions": batch}).json()["logged"] == 3
+    assert [db.creator_version(c) for c in (a, b)] == versions and [_events(c) for c in (a, b)] == events
+    assert client.post("/webhooks/generation:batch", json={"suggestions": batch * 300}).status_code == 422
+
+def test_suggestion_id_of_another_creator_conflicts(client, make_creator, db):
+    a, b = make_creator(), make_creator()
+    sid = new_id("s")
+    client.post("/webhooks/generation", json={"creator_id": a, "suggestion_id": sid, "suggested_caption": "mine"})
+    versions, events = [db.creator_version(c) for c in (a, b)], [_events(c) for c in (a, b)]
+    r = client.post("/webhooks/generation", json={"creator_id": b, "suggestion_id": sid, "suggested_caption": "theirs"})
+    assert r.status_code == 409
+    fresh = new_id("s")
+    body = client.post("/webhooks/generation:batch", json={"suggestions": [
+        {"creator_id": b, "suggestion_id": sid, "suggested_caption": "theirs"},
+        {"creator_id": b, "suggestion_id": fresh, "suggested_caption": "b first"},
+        {"creator_id": a, "suggestion_id": fresh, "suggested_caption": "a later"},  # b claimed it earlier in the batch
+    ]}).json()
+    assert (body["logged"], body["failed"]) == (1, 2)
+    assert [r.get("error") for r in body["results"]] == [
+        "suggestion_id is already logged for another creator", None, "suggestion_id is already logged for another creator"]
+    assert _suggestion(a, sid)[0] == "mine" and _suggestion(b, fresh)[0] == "b first"
+    assert db.creator_version(a) == versions[0] and _events(a) == events[0]
+    assert db.get_suggestion(sid, a).creator_id == a and db.get_suggestion(sid, b) is None
+
+def test_suggestion_conflicts_under_write_behind(service):
+    out = service("""
+        from fastapi.testclient import TestClient
+        from app.main import app
+        from app.writebehind import writer
+        with TestClient(app) as c:
+            for cid in ("a", "b"):
+                c.put(f"/creators/{cid}", json={"id": cid})
+            hook = lambda cid, sid, cap: {"creator_id": cid, "suggestion_id": sid, "suggested_caption": cap}
+            print(c.post("/webhooks/generation", json=hook("a", "s1", "mine")).status_code,
+                  c.post("/webhooks/generation", json=hook("b", "s1", "queued")).status_code)  # still in the queue
+            writer.stop(); writer.start()
+            print(c.post("/webhooks/generation", json=hook("b", "s1", "stored")).status_code)
+            body = c.post("/webhooks/generation:batch", json={"suggestions": [hook("b", "s1", "x"), hook("b", "s2", "ok")]}).json()
+            print(body["logged"], [r.get("error", "") for r in body["results"]])
+    """, WRITE_BEHIND="1")
+    assert out.splitlines()[-3:] == ["200 409", "409", "1 ['suggestion_id is already logged for another creator', '']"]
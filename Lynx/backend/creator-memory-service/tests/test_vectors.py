@@ -0,0 +1,119 @@
+import pytest
+from sqlalchemy import text
+from app import store
+from app.sharding import shard_for
+from app.store import DB, SHARDS
+
+@pytest.fixture
+def added(monkeypatch):
+    calls = []
+    monkeypatch.setattr(store.vector_index, "add", lambda cid, rows: calls.append((cid, rows)))
+    return calls
+
+def test_vectors_added_only_after_commit(creator, added):
+    db = DB(shard=SHARDS[shard_for(creator)])
+    try:
+        with pytest.raises(RuntimeError):
+            with db.transaction():
+                db.add_memory(creator, "rolled back", [], {})
+                db.add_memories([{"creator_id": creator, "caption": "rolled back too"}])
+                raise RuntimeError
+        assert added == []
+        with db.transaction():
+            m = db.add_memory(creator, "kept", [], {})
+            ids = db.add_memories([{"creator_id": creator, "caption": "kept too"}])
+            assert added == []
+        assert added == [(creator, [(m.id, "kept")]), (creator, [(ids[0], "kept too")])]
+        db.add_memory(creator, "outside a transaction", [], {})
+        assert added[-1][1][0][1] == "outside a transaction"
+    finally:
+        db.session.close()
+
+def test_batch_ids_are_the_stored_ones(creator, added):
+    db = DB(shard=SHARDS[shard_for(creator)])
+    try:
+        # An archived id above every live one is never handed out again
+        top = db.session.execute(text("SELECT max(id) FROM memories")).scalar() or 0
+        db.session.execute(text("INSERT INTO memories_archive (id, creator_id, caption, hashtags, performance, created_at,"
+                                " score, archived_at) VALUES (:id, :c, 'old', '[]', '{}', '2020-01-01', 0, '2020-02-01')"),
+                           {"id": top + 50, "c": creator})
+        db.session.commit()
+        ids = db.add_memories([{"creator_id": creator, "caption": f"m{i}"} for i in range(3)])
+        assert ids == [top + 51, top + 52, top + 53]
+        stored = dict(db.session.execute(text("SELECT id, caption FROM memories WHERE id IN (:a, :b, :c)"),
+                                         dict(zip("abc", ids))).all())
+        assert stored == {ids[0]: "m0", ids[1]: "m1", ids[2]: "m2"}
+        assert added[-1] == (creator, [(ids[0], "m0"), (ids[1], "m1"), (ids[2], "m2")])
+    finally:
+        db.session.close()
+
+def test_draft_caption_picks_similar_examples(client, creator):
+    captions = ["spicy ramen challenge", "budget flights to tokyo", "homemade ramen broth", "morning yoga flow"]
+    client.post("/memories/ingest:batch", json=[{"creator_id": creator, "platform": "tiktok", "caption": c} for c in captions])
+    r = client.post("/personalize/suggestions", json={"creator_id": creator, "draft_caption": "ramen"})
+    assert [e["caption"] for e in r.json()["examples"][:2]] in (
+        ["spicy ramen challenge", "homemade ramen broth"], ["homemade ramen broth", "spicy ramen challenge"])
+    assert "etag" not in r.headers
+
+def test_first_build_does_not_deadlock_in_async_mode(service):
+    # Concurrent first queries used to wait on a lock held by a build that needed the event loop
+    out = service("""
+        import asyncio, httpx
+        from app.main import app
+        from app.sharding import ShardedDB
+        from app.store import init_db
+        init_db(); db = ShardedDB(); db.upsert_creator("c", "@c", "en", "UTC")
+        db.add_memories([{"creator_id": "c", "caption": f"caption {i} word{i % 97}"} for i in range(5000)]); db.close()
+        async def main():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as c:
+                rs = await asyncio.gather(*(c.post("/personalize/suggestions", json={"creator_id": "c", "draft_caption": f"word{i}"})
+                                            for i in range(4)))
+                print([r.status_code for r in rs], [len(r.json()["examples"]) for r in rs])
+        asyncio.run(main())
+        from app.async_store import dispose
+        asyncio.run(dispose())
+    """, timeout=60, DB_MODE="async")
+    assert out.splitlines()[-1] == "[200, 200, 200, 200] [3, 3, 3, 3]"
+
+def test_appends_from_several_processes(service):
+    out = service("""
+        import multiprocessing as mp, os
+        from app.vectors import VectorIndex
+        root = os.environ["VECTOR_DIR"]
+        def writer(start):
+            idx = VectorIndex(root)
+            for i in range(start, start + 300):
+                idx.add("c", [(i, f"caption number {i} unique{i}")])
+        a = VectorIndex(root)
+        a.build("c", [(i, f"caption number {i} unique{i}") for i in range(100)])
+        ps = [mp.get_context("fork").Process(target=writer, args=(s,)) for s in (100, 400)]
+        [p.start() for p in ps]; [p.join() for p in ps]
+        print(a._shard("c").count if a.search("c", ["x"], 1, None) else None, a._shard("c").trained > 0)
+        print([hits[0][0] for hits in a.search("c", ["unique650", "unique399", "unique42"], 1, None)])
+    """, VECTOR_IVF_MIN_ROWS="500")
+    assert out.splitlines()[-2:] == ["700 True", "[650, 399, 42]"]
+
+def test_first_build_keeps_rows_another_process_commits_while_loading(service):
+    # A's load reads the database before B commits; B's add used to be dropped (no index yet)
+    out = service("""
+        import multiprocessing as mp, os
+        from app.vectors import VectorIndex
+        root = os.environ["VECTOR_DIR"]
+        ctx = mp.get_context("fork")
+        loading, added = ctx.Event(), ctx.Event()
+        def other_worker():
+            loading.wait(10)
+            VectorIndex(root).add("c", [(100, "late caption uniquelate")])
+            added.set()
+        def load():
+            rows = [(i, f"caption {i} unique{i}") for i in range(100)]  # the snapshot, taken before B's commit
+            loading.set()
+            added.wait(10)
+            return rows
+        p = ctx.Process(target=other_worker); p.start()
+        a = VectorIndex(root)
+        print(a.search("c", ["uniquelate"], 1, load)[0][0][0])
+        p.join()
+        print(a._shard("c").count, sorted(n for n in os.listdir(root) if n.endswith((".building", ".pending"))))
+    """)
+    assert out.splitlines()[-2:] == ["100", "101 []"]
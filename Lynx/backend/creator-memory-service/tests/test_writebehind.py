@@ -0,0 +1,41 @@
+from app import store
+from app.writebehind import WriteBehindQueue
+
+def test_groups_commit_atomically_and_bad_ones_are_isolated(creator, db, monkeypatch):
+    added = []
+    monkeypatch.setattr(store.vector_index, "add", lambda cid, rows: added.append(rows))
+    q = WriteBehindQueue(max_delay=5)
+    q.start()
+    try:
+        q.log_suggestion(creator, f"{creator}-s", "cap", ["#x"], "m", {})
+        view = q.get_suggestion(f"{creator}-s")
+        assert view.status == "pending" and db.get_suggestion(f"{creator}-s") is None  # read-your-writes
+        q.save_feedback(view, "approved", "final", ["#x"], None, (creator, "final", ["#x"], {}))
+        assert q.get_suggestion(f"{creator}-s").status == "approved"
+        q._submit(creator, f"{creator}-bad", view, [("no_such_operation", ())])
+    finally:
+        q.stop()
+    assert (q.flushed, q.failed) == (2, 1)
+    assert q.get_suggestion(f"{creator}-s") is None  # overlay dropped once committed
+    assert db.get_suggestion(f"{creator}-s").status == "approved"
+    memories = db.list_memories(creator)
+    assert [m.caption for m in memories] == ["final"]
+    assert added == [[(memories[0].id, "final")]]  # not appended by the failed first attempt
+
+def test_routes_read_their_own_writes(service):
+    out = service("""
+        from fastapi.testclient import TestClient
+        from app.main import app
+        from app.store import DB
+        with TestClient(app) as c:
+            c.put("/creators/c1", json={"id": "c1"})
+            for i in range(20):
+                assert c.post("/webhooks/generation", json={"creator_id": "c1", "suggestion_id": f"s{i}"}).status_code == 200
+                r = c.post("/feedback", json={"creator_id": "c1", "suggestion_id": f"s{i}", "action": "edited",
+                                              "final_caption": f"f{i}"})
+                assert r.status_code == 200, r.text
+            assert c.post("/feedback", json={"creator_id": "c2", "suggestion_id": "s0", "action": "rejected"}).status_code == 404
+        db = DB()
+        print(db.inline_stats("c1"), len(db.list_memories("c1")))
+    """, WRITE_BEHIND="1", WRITE_BEHIND_MAX_DELAY_MS="200")
+    assert out.splitlines()[-1] == "{'memories': 20, 'feedback': {'approved': 0, 'edited': 20, 'rejected': 0}} 20"